@@ -0,0 +1,67 @@
+import os
+import sys
+import random
+import argparse
+import tempfile
+from time import perf_counter
+
+# Benchmark: cargar una biblioteca resuelta desde los CSV por playlist (pandas), desde la caché SQLite
+# (playlist_results) y desde el almacén columnar. Mide tiempo y memoria del DataFrame resultante.
+# Uso: python benchmarks/bench_columnar.py --rows 200000 --playlists 50
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import pandas as pd  # noqa: E402
+
+from cache import ResultCache, make_key  # noqa: E402
+from columnar import ColumnStore  # noqa: E402
+
+def fill_cache(cache, rows, playlists, seed=0):
+    rng = random.Random(seed)
+    with cache.conn:
+        for i in range(rows):
+            artist, title = f"artist {i % 5000}", f"track {i}"
+            key = make_key(artist, title)
+            cache.conn.execute("""
+                INSERT OR IGNORE INTO results (query_key, artist, title, video_id, video_title, uploader, duration,
+                                               not_found, looked_up_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 0, 0)
+            """, (key, artist, title, f"{i:011d}", f"{artist} - {title} (Official Audio)", f"{artist} - Topic",
+                  rng.randint(120, 360)))
+            cache.conn.execute("INSERT INTO playlist_tracks VALUES (?, ?, ?)", (f"Playlist{i % playlists}", key, i))
+
+def timed(fn):
+    start = perf_counter()
+    df = fn()
+    return df, perf_counter() - start, df.memory_usage(deep=True).sum() / 2**20
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--playlists', type=int, default=50)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix='spotify-dl-columnar-'))
+    cache = ResultCache('cache.sqlite3')
+    fill_cache(cache, args.rows, args.playlists)
+
+    start = perf_counter()
+    store = ColumnStore('columns')
+    store.sync(cache)
+    print(f"Construcción del almacén: {perf_counter() - start:.2f}s")
+    os.makedirs('csv')
+    store.export_csvs('csv')
+
+    def from_csvs():
+        return pd.concat([pd.read_csv(os.path.join('csv', f)) for f in sorted(os.listdir('csv'))], ignore_index=True)
+
+    def from_sqlite():
+        return pd.DataFrame([r for p in cache.playlists() for r in cache.playlist_results(p)])
+
+    for name, fn in [('CSV (pandas)', from_csvs), ('SQLite', from_sqlite), ('columnar', store.load)]:
+        df, seconds, mb = timed(fn)
+        print(f"{name:<13} {len(df):>8} filas | {seconds:6.3f}s | {mb:7.1f} MB")
+
+if __name__ == '__main__':
+    main()
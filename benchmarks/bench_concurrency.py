@@ -0,0 +1,82 @@
+import os
+import sys
+import random
+import argparse
+
+# Controlador de concurrencia frente a un número fijo de descargas: simula hosts con distinto punto
+# óptimo (ancho de banda que se satura en N descargas, servidor que responde 429 por encima de M) y alimenta
+# Controller.step con una muestra por ventana, sin esperar tiempo real. Muestra el nivel al que llega, las
+# ventanas que tarda, las tareas completadas, las ventanas con 429 y los cambios (para ver que no oscila).
+# Uso: python benchmarks/bench_concurrency.py [--windows 240] [--fixed 5] [--seed 0]
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import logqueue  # noqa: E402
+from concurrency import DOWNLOAD, TRANSCODE, Controller, Gate  # noqa: E402
+from config import CONTROL_SECONDS  # noqa: E402
+
+# nombre: (descargas a las que se satura el ancho de banda, descargas a partir de las que hay 429)
+SCENARIOS = {
+    'fibra': (9, None),
+    'tor': (3, None),
+    '429 > 6': (10, 6),
+}
+PER_WORKER = 0.5  # tareas/s de una descarga sola
+
+def throughput(n, knee, rng):
+    """Ritmo con n descargas: lineal hasta knee, y a partir de ahí algo peor por la contención"""
+    rate = PER_WORKER * (n if n <= knee else knee * (1 - 0.03 * (n - knee)))
+    return rate * rng.uniform(0.97, 1.03)
+
+def simulate(knee, limit_429, windows, fixed, rng):
+    gate = Gate()
+    controller = Controller(gate, None) if fixed is None else None
+    if fixed is not None:
+        gate.set_limit(DOWNLOAD, fixed)
+    done = limited = 0
+    history = []
+    backoff = 0.0
+    for w in range(windows):
+        n = gate.limit(DOWNLOAD)
+        history.append(n)
+        rate_limited = limit_429 is not None and n > limit_429
+        tp = throughput(n, knee, rng) * (0.5 if rate_limited or backoff else 1)
+        done += tp * CONTROL_SECONDS
+        limited += rate_limited
+        if controller:
+            controller.step({
+                'now': w * CONTROL_SECONDS,
+                'throughput': {DOWNLOAD: tp, TRANSCODE: 0.0},
+                'busy': {DOWNLOAD: True, TRANSCODE: False},
+                'rate_limited': int(rate_limited),
+                'backoff': backoff,
+                'cpu': None,
+                'disk': 0.5,
+                'backlog': 0,
+            })
+        backoff = CONTROL_SECONDS if rate_limited else 0.0
+    # Estable: desde ahí solo se aleja un nivel del final (las pruebas periódicas)
+    settled = next((i for i in range(len(history)) if all(abs(n - history[-1]) <= 1 for n in history[i:])), len(history))
+    changes = sum(a != b for a, b in zip(history, history[1:]))
+    return {'final': history[-1], 'settled': settled, 'done': done, 'limited': limited, 'changes': changes}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--windows', type=int, default=240)
+    parser.add_argument('--fixed', type=int, default=5, help="descargas del modo fijo con el que se compara")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    logqueue.start(console=False)
+
+    print(f"{args.windows} ventanas de {CONTROL_SECONDS}s; fijo = {args.fixed} descargas")
+    for name, (knee, limit_429) in SCENARIOS.items():
+        adaptive = simulate(knee, limit_429, args.windows, None, random.Random(args.seed))
+        fixed = simulate(knee, limit_429, args.windows, args.fixed, random.Random(args.seed))
+        print(f"{name:<8} adaptativo: nivel {adaptive['final']:>2} (estable desde la ventana {adaptive['settled']:>3}, "
+              f"{adaptive['changes']:>2} cambios) | {adaptive['done']:7.0f} tareas | {adaptive['limited']:>2} ventanas con 429")
+        print(f"{'':<8} fijo:       nivel {args.fixed:>2}{'':<37}| {fixed['done']:7.0f} tareas | {fixed['limited']:>2} ventanas con 429"
+              f" ({adaptive['done'] / fixed['done']:.2f}x)")
+
+if __name__ == '__main__':
+    main()
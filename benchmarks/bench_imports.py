@@ -0,0 +1,57 @@
+import os
+import sys
+import argparse
+import tempfile
+import subprocess
+from time import perf_counter
+
+# Benchmark de arranque: tiempo de `cli.py status`, `cli.py list` y `cli.py --help` descontando el arranque
+# del intérprete, y comprobación de que no cargan módulos pesados. Sale con código 1 si algún comando
+# supera el presupuesto, para usarlo como guarda contra regresiones.
+# Uso: python benchmarks/bench_imports.py [--budget-ms 100] [--workdir dir_con_cache]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(ROOT, 'cli.py')
+HEAVY = ('pandas', 'numpy', 'yt_dlp', 'tqdm', 'stem', 'mutagen')
+
+def best_of(cmd, runs, cwd):
+    times = []
+    for _ in range(runs):
+        start = perf_counter()
+        subprocess.run(cmd, cwd=cwd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(perf_counter() - start)
+    return min(times)
+
+def heavy_modules(args, cwd):
+    code = (f"import sys; sys.path.insert(0, {ROOT!r}); sys.argv = ['cli.py'] + {args!r}\n"
+            "import cli\n"
+            "try:\n    cli.main(sys.argv[1:])\nexcept SystemExit:\n    pass\n"
+            f"print('HEAVY:' + ','.join(m for m in {HEAVY!r} if m in sys.modules))")
+    out = subprocess.run([sys.executable, '-c', code], cwd=cwd, check=True, capture_output=True, text=True).stdout
+    return [m for m in out.rsplit('HEAVY:', 1)[1].strip().split(',') if m]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget-ms', type=float, default=100)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workdir', help="directorio con exportify/ y cache/ (por defecto, uno vacío)")
+    args = parser.parse_args()
+
+    cwd = args.workdir or tempfile.mkdtemp(prefix='spotify-dl-imports-')
+    baseline = best_of([sys.executable, '-c', 'pass'], args.runs, cwd)
+    print(f"Arranque del intérprete: {baseline * 1000:.0f} ms (se descuenta)")
+
+    failed = False
+    for command in (['status'], ['list'], ['--help']):
+        total = best_of([sys.executable, CLI] + command, args.runs, cwd)
+        overhead = (total - baseline) * 1000
+        heavy = heavy_modules(command, cwd)
+        ok = overhead <= args.budget_ms and not heavy
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} cli.py {' '.join(command):<8} {overhead:6.1f} ms"
+              + (f" | módulos pesados: {', '.join(heavy)}" if heavy else ""))
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import os
+import sys
+import argparse
+import tempfile
+import subprocess
+
+# Memoria de la ingesta de exports: para varias cantidades de playlists (mismas filas por playlist) mide
+# el pico de RSS de indexar los CSV (InputIndex.sync, por bloques), de recorrer las pendientes por
+# bloques (iter_pending, lo que consume la búsqueda) y de materializarlas en un único DataFrame
+# (pending). Cada medida va en un proceso nuevo para que el pico no arrastre el de la anterior.
+# Uso: python benchmarks/bench_ingest.py [--rows-per-playlist 1000] [--playlists 10 100 300]
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+from synthetic import write_exports  # noqa: E402
+
+STAGES = {
+    'sync': "index.sync(EXPORT_DIR, normalize_export); n = index.pending_total()",
+    'stream': "n = sum(len(chunk) for chunk in index.iter_pending())",
+    'full': "n = len(index.pending())",
+}
+
+def measure(workdir, stage):
+    code = (f"import sys, resource; sys.path.insert(0, {ROOT!r})\n"
+            "from cache import ResultCache\n"
+            "from inputs import InputIndex\n"
+            "from finder import normalize_export\n"
+            "from config import EXPORT_DIR\n"
+            "index = InputIndex(ResultCache())\n"
+            f"{STAGES[stage]}\n"
+            "print(n, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024)")
+    out = subprocess.run([sys.executable, '-c', code], cwd=workdir, check=True, capture_output=True, text=True)
+    rows, rss = out.stdout.split()[-2:]
+    return int(rows), int(rss)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows-per-playlist', type=int, default=1000)
+    parser.add_argument('--playlists', type=int, nargs='+', default=[10, 100, 300])
+    args = parser.parse_args()
+
+    print(f"{'playlists':>9} {'filas':>8} | " + " | ".join(f"{stage:>10}" for stage in STAGES))
+    for playlists in args.playlists:
+        workdir = tempfile.mkdtemp(prefix='spotify-dl-ingest-')
+        os.makedirs(os.path.join(workdir, 'cache'))
+        write_exports(os.path.join(workdir, 'exportify'), args.rows_per_playlist * playlists, playlists,
+                      overlap=0)
+        results = {stage: measure(workdir, stage) for stage in STAGES}
+        rows = results['stream'][0]
+        print(f"{playlists:>9} {rows:>8} | " + " | ".join(f"{rss:>7} MB" for _, rss in results.values()))
+
+if __name__ == '__main__':
+    main()
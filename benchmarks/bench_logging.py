@@ -0,0 +1,86 @@
+import os
+import sys
+import argparse
+import tempfile
+import multiprocessing
+from time import perf_counter
+
+# Coste de registrar desde procesos de trabajo: cada proceso escribe --lines mensajes en su playlist.
+# "tee" reproduce el esquema anterior (stdout y un fichero sin buffer por proceso, en síncrono); "cola"
+# usa logqueue (el proceso solo encola y un listener escribe por lotes). Se mide la latencia de cada
+# llamada dentro del bucle del worker, que es lo que frena las descargas y búsquedas. La consola de "tee" es
+# /dev/null, su mejor caso: con un terminal real cada write espera al tty y las líneas de procesos distintos
+# se mezclan.
+# Uso: python benchmarks/bench_logging.py [--procs 8] [--lines 5000]
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import logqueue  # noqa: E402
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def tee_worker(directory, idx, lines, results):
+    terminal = open(os.devnull, 'w')
+    log = open(os.path.join(directory, f"tee_{idx}.log"), 'a', encoding='utf-8', buffering=1)
+    times = []
+    for i in range(lines):
+        start = perf_counter()
+        message = f"[{i}] ⬇️ Descargando: Artist {idx} - Track {i}\n"
+        terminal.write(message)
+        log.write(message)
+        terminal.flush()
+        log.flush()
+        times.append(perf_counter() - start)
+    results.put(times)
+
+def queue_worker(log_q, idx, lines, results):
+    logqueue.attach(log_q)
+    log = logqueue.get_logger(f"Queue{idx}")
+    times = []
+    for i in range(lines):
+        start = perf_counter()
+        log.info(f"[{i}] ⬇️ Descargando: Artist {idx} - Track {i}")
+        times.append(perf_counter() - start)
+    results.put(times)
+
+def run(target, args, procs, lines):
+    results = multiprocessing.Queue()
+    start = perf_counter()
+    workers = [multiprocessing.Process(target=target, args=args + (i, lines, results)) for i in range(procs)]
+    for p in workers:
+        p.start()
+    times = [t for _ in workers for t in results.get()]
+    for p in workers:
+        p.join()
+    return times, perf_counter() - start
+
+def report(label, times, elapsed):
+    print(f"{label:<5} p50 {percentile(times, 0.5) * 1e6:7.1f} µs | p99 {percentile(times, 0.99) * 1e6:7.1f} µs"
+          f" | {len(times) / elapsed:9.0f} líneas/s")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--procs', type=int, default=8)
+    parser.add_argument('--lines', type=int, default=5000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='spotify-dl-logging-')
+    os.chdir(directory)  # logs/ del listener dentro del directorio temporal
+
+    times, elapsed = run(tee_worker, (directory,), args.procs, args.lines)
+    report('tee', times, elapsed)
+
+    log_q = logqueue.start(console=False)
+    start = perf_counter()
+    times, _ = run(queue_worker, (log_q,), args.procs, args.lines)
+    logqueue.stop()  # vacía la cola: el total cuenta hasta que todo está en disco
+    report('cola', times, perf_counter() - start)
+
+    written = sum(1 for name in os.listdir('logs') for _ in open(os.path.join('logs', name), encoding='utf-8'))
+    print(f"Líneas en logs/: {written} de {args.procs * args.lines}")
+
+if __name__ == '__main__':
+    main()
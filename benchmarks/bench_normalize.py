@@ -0,0 +1,54 @@
+import os
+import sys
+import argparse
+from time import perf_counter
+
+# Benchmark: normalización + anti-join por fila (df.apply) frente a la versión vectorizada de finder
+# Uso: python benchmarks/bench_normalize.py --rows 100000
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from finder import infer_artist, infer_artist_series, drop_done  # noqa: E402
+from synthetic import synthetic_export  # noqa: E402
+
+def normalize_rowwise(df, done):
+    df = df.copy()
+    df['Artist'] = df.apply(infer_artist, axis=1)
+    df['Artist'] = df['Artist'].fillna('').str.strip().str.lower()
+    df['Track Name'] = df['Track Name'].fillna('').str.strip().str.lower()
+    return df[~df.apply(lambda r: (r['Artist'], r['Track Name']) in done, axis=1)]
+
+def normalize_vectorized(df, done):
+    df = df.copy()
+    df['Artist'] = infer_artist_series(df)
+    df['Artist'] = df['Artist'].fillna('').str.strip().str.lower()
+    df['Track Name'] = df['Track Name'].fillna('').str.strip().str.lower()
+    return drop_done(df, done)
+
+def timed(fn, *args):
+    start = perf_counter()
+    result = fn(*args)
+    return result, perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        df = synthetic_export(rows)
+
+        # Marcar como ya resueltas ~la mitad de las canciones
+        sample = normalize_vectorized(df, set()).sample(frac=0.5, random_state=0)
+        done = set(zip(sample['Artist'], sample['Track Name']))
+
+        slow, t_slow = timed(normalize_rowwise, df, done)
+        fast, t_fast = timed(normalize_vectorized, df, done)
+
+        identical = slow.to_csv(index=False) == fast.to_csv(index=False)
+        print(f"{rows:>8} filas | apply: {t_slow:7.3f}s | vectorizado: {t_fast:7.3f}s | "
+              f"x{t_slow / t_fast:6.1f} | pendientes: {len(fast)} | idénticos: {identical}")
+        if not identical:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import urllib.request
+from multiprocessing import Process
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Prueba del limitador compartido contra un endpoint local que devuelve 429 por encima de un ritmo dado.
+# Varios procesos cliente comparten un RateLimiter; se comprueba que convergen por debajo del límite
+# y que cada evento de rate limit provoca una sola rotación de IP (simulada con /rotate).
+# Uso: python benchmarks/bench_ratelimit.py --capacity 20 --workers 5 --requests 60
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ratelimit import RateLimiter  # noqa: E402
+
+class FakeRateLimitedServer(ThreadingHTTPServer):
+    """Acepta como mucho `capacity` peticiones/s (token bucket en servidor); el resto recibe 429"""
+    daemon_threads = True
+
+    def __init__(self, capacity):
+        super().__init__(('127.0.0.1', 0), FakeHandler)
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.time()
+        self.lock = threading.Lock()
+        self.stats = {'ok': 0, '429': 0, 'rotations': 0}
+
+    def take(self):
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.capacity)
+            self.last = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.stats['ok'] += 1
+                return True
+            self.stats['429'] += 1
+            return False
+
+class FakeHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/rotate':
+            self.server.stats['rotations'] += 1
+            status = 200
+        elif self.path == '/stats':
+            body = repr(self.server.stats).encode()
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        else:
+            status = 200 if self.server.take() else 429
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+BASE_URL = None
+
+def fake_rotate():
+    urllib.request.urlopen(f"{BASE_URL}/rotate").read()
+
+def client(base_url, limiter, requests):
+    global BASE_URL
+    BASE_URL = base_url
+    for _ in range(requests):
+        try:
+            limiter.run(lambda: urllib.request.urlopen(f"{base_url}/track").read(), max_retries=10, log=lambda m: None)
+        except Exception as e:
+            print(f"❌ {e}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--capacity', type=float, default=20)
+    parser.add_argument('--workers', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=60)
+    parser.add_argument('--initial-rate', type=float, default=40)
+    args = parser.parse_args()
+
+    server = FakeRateLimitedServer(args.capacity)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    global BASE_URL
+    BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+
+    limiter = RateLimiter(rate=args.initial_rate, max_rate=args.capacity * 2, increase=0.5,
+                          backoff_base=0.2, backoff_max=2, rotate=fake_rotate)
+
+    start = time.time()
+    procs = [Process(target=client, args=(BASE_URL, limiter, args.requests)) for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    elapsed = time.time() - start
+
+    snap = limiter.snapshot()
+    stats = server.stats
+    print(f"peticiones OK: {stats['ok']} en {elapsed:.1f}s ({stats['ok'] / elapsed:.1f}/s, capacidad {args.capacity}/s)")
+    print(f"429 servidos: {stats['429']} | eventos en limitador: {snap['rate_limited_events']}")
+    print(f"rotaciones: {stats['rotations']} (limitador: {snap['ip_rotations']}) | ritmo final: {snap['rate']:.1f}/s")
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
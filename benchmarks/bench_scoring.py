@@ -0,0 +1,76 @@
+import os
+import sys
+import random
+import argparse
+from time import perf_counter
+
+# Benchmark: elección de vídeo con la heurística original (primer resultado oficial) frente a scoring.best_many,
+# sobre listas de candidatos sintéticas con trampas (directos, remixes, duraciones que no cuadran).
+# Mide tiempo por canción y aciertos, contando también cuántas canciones se resuelven con solo 3 resultados.
+# Uso: python benchmarks/bench_scoring.py --tracks 10000
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scoring  # noqa: E402
+
+def choose_first_official(results, expected_duration=None):
+    """Heurística anterior de finder.choose_best_video, como referencia"""
+    best = None
+    for entry in results:
+        title = entry.get('title', '').lower()
+        channel = entry.get('uploader', '').lower()
+        duration = entry.get('duration')
+        if not duration:
+            continue
+        if any(skip in title for skip in ['live', 'lyric', 'cover', 'remix', 'nightcore', 'sped up']):
+            continue
+        is_official = any(kw in title for kw in ['official', 'audio', 'video']) or 'vevo' in channel or 'topic' in channel
+        is_duration_ok = expected_duration is None or abs(duration - expected_duration) <= 3
+        if is_official and is_duration_ok:
+            return entry
+        if not best and is_duration_ok:
+            best = entry
+    return best or results[0]
+
+def synthetic_candidates(n, seed=0):
+    """(entries, artist, title, duration) con el vídeo correcto marcado con 'correct'"""
+    rng = random.Random(seed)
+    for i in range(n):
+        artist, title = f"artist {i % 997}", f"song number {i}"
+        duration = rng.randint(120, 360)
+        decoys = [
+            {'title': f"{artist} - {title} (Live at Wembley)", 'uploader': 'Fan', 'duration': duration + 40},
+            {'title': f"{artist} - {title} [Official Video]", 'uploader': 'Otro', 'duration': duration + 60},
+            {'title': f"{artist} - Another Song (Official Audio)", 'uploader': f"{artist}VEVO", 'duration': duration + 1},
+            {'title': f"{title} (sped up)", 'uploader': 'Edits', 'duration': duration - 30},
+            {'title': f"{artist} - {title} (Lyrics)", 'uploader': 'Lyrics Channel', 'duration': duration},
+        ]
+        correct = {'title': title, 'uploader': f"{artist} - Topic", 'duration': duration + rng.randint(-2, 2), 'correct': True}
+        entries = decoys + [correct]
+        rng.shuffle(entries)
+        yield entries, artist, title, duration
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tracks', type=int, default=10_000)
+    args = parser.parse_args()
+
+    items = list(synthetic_candidates(args.tracks))
+
+    start = perf_counter()
+    old = [choose_first_official(entries, duration) for entries, _, _, duration in items]
+    t_old = perf_counter() - start
+
+    start = perf_counter()
+    new = [entry for entry, _ in scoring.best_many(items)]
+    t_new = perf_counter() - start
+
+    # ¿Cuántas se habrían aceptado con la primera búsqueda estrecha?
+    narrow = sum(acceptable for _, acceptable in scoring.best_many((e[:3], a, t, d) for e, a, t, d in items))
+
+    n = len(items)
+    print(f"{n} canciones | original: {t_old / n * 1e6:6.1f} µs/canción, aciertos {sum('correct' in e for e in old) / n:6.1%}")
+    print(f"{n} canciones | scoring:  {t_new / n * 1e6:6.1f} µs/canción, aciertos {sum('correct' in e for e in new) / n:6.1%}")
+    print(f"Aceptadas con ytsearch3: {narrow / n:.1%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import urllib.error
+
+# Descargas por tramos contra FakeMediaServer con el ancho de banda limitado por conexión (como una
+# conexión TCP larga por Tor): compara 1 tramo con 2/4/8, y luego repite con 429 aleatorios reanudando
+# tras cada corte para comprobar que los bytes transferidos se quedan cerca del tamaño del fichero.
+# Uso: python benchmarks/bench_segmented.py [--bandwidth-kbps 8000] [--seconds 200] [--p429 0.15]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import segmented  # noqa: E402
+from fakes import FakeMediaServer  # noqa: E402
+
+def fixture_url(server, seconds):
+    # El servidor deduce la duración del audio de los 3 últimos caracteres del id
+    return f"{server.url}/audio/benchseg{seconds:03d}.mp3"
+
+def timed_download(url, dst, segments):
+    start = time.perf_counter()
+    assert segmented.download(url, dst, segments=segments), "el servidor no aceptó rangos"
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bandwidth-kbps', type=float, default=8000, help="límite por conexión")
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--seconds', type=int, default=200, help="duración del audio de prueba")
+    parser.add_argument('--p429', type=float, default=0.15)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='spotify-dl-segmented-')
+    server = FakeMediaServer(args.latency_ms, args.bandwidth_kbps, seed=args.seed).start()
+    url = fixture_url(server, args.seconds)
+    expected = server.fixture(args.seconds)
+    print(f"📦 Fichero de {len(expected) / 1024 / 1024:.1f} MB, {args.bandwidth_kbps:.0f} kbps por conexión")
+
+    baseline = None
+    for segments in (1, 2, 4, 8):
+        dst = os.path.join(workdir, f"seg{segments}.mp3")
+        seconds = timed_download(url, dst, segments)
+        with open(dst, 'rb') as f:
+            assert f.read() == expected, f"contenido distinto con {segments} tramos"
+        baseline = baseline or seconds
+        print(f"   {segments} tramo(s): {seconds:5.2f} s  ({baseline / seconds:.1f}x)")
+
+    # Reanudación: cada 429 corta el intento; el siguiente sigue desde el estado guardado
+    server.p429 = args.p429
+    server.stats.update({'429': 0, 'bytes_sent': 0})
+    dst = os.path.join(workdir, 'resume.mp3')
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            if segmented.download(url, dst, segments=4):
+                break
+        except urllib.error.HTTPError as e:
+            if e.code != 429:
+                raise
+    with open(dst, 'rb') as f:
+        assert f.read() == expected, "contenido distinto tras reanudar"
+    ratio = server.stats['bytes_sent'] / len(expected)
+    print(f"🔁 Con p429={args.p429}: {attempts} intentos, {server.stats['429']} 429, "
+          f"{ratio:.2f}x el tamaño transferido")
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import random
+import argparse
+import tempfile
+
+# Clave canónica frente a clave exacta: genera playlists que comparten canciones escritas de distintas
+# formas (feat. en el título o como artista, "- Remastered 2011", acentos, ancho completo, artistas en
+# otro orden) y cuenta las búsquedas que lanza finder contra FakeMediaServer. Una segunda tanda de
+# playlists nuevas con otras grafías de las mismas canciones mide la pasada repetida.
+# Uso: python benchmarks/bench_trackkey.py [--songs 300] [--playlists 10] [--per-playlist 100]
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import pandas as pd  # noqa: E402
+
+FULLWIDTH = {ord(c): ord(c) + 0xFEE0 for c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'}
+
+def variant(rng, artists, guest, title):
+    """Una grafía al azar de la misma canción: (Artist Name(s), Track Name)"""
+    kind = rng.randrange(6)
+    if kind == 0:
+        return ', '.join(artists + [guest]), title
+    if kind == 1:
+        return ', '.join(artists), f"{title} (feat. {guest})"
+    if kind == 2:
+        return ', '.join([guest] + artists[::-1]), f"{title} - Remastered 2011"
+    if kind == 3:
+        return ', '.join(a.replace('e', 'é') for a in artists + [guest]), title
+    if kind == 4:
+        return ', '.join(artists + [guest]).translate(FULLWIDTH), title.translate(FULLWIDTH)
+    return ', '.join(artists + [guest]), f"{title} (Remastered)"
+
+def write_playlists(directory, songs, playlists, per_playlist, prefix, rng):
+    rows_total = []
+    for p in range(playlists):
+        rows = []
+        for song in rng.sample(songs, per_playlist):
+            artists, title = variant(rng, *song)
+            rows.append({'Artist Name(s)': artists, 'Track Name': title, 'Duration (ms)': 200_000})
+        pd.DataFrame(rows).to_csv(os.path.join(directory, f"{prefix}{p}.csv"), index=False)
+        rows_total += rows
+    return rows_total
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--songs', type=int, default=300)
+    parser.add_argument('--playlists', type=int, default=10)
+    parser.add_argument('--per-playlist', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix='spotify-dl-trackkey-'))
+    import config
+    config.ensure_dirs()
+    from fakes import FakeMediaServer, FakeYoutubeDL
+    import finder
+    from cache import ResultCache, make_key
+    from trackkey import canonical_key
+
+    FakeMediaServer().start()
+    finder.YoutubeDL = FakeYoutubeDL
+    searches = []
+    search_worker = finder.search_worker
+    finder.search_worker = lambda *a, **kw: searches.append(a[1]) or search_worker(*a, **kw)
+
+    rng = random.Random(args.seed)
+    songs = [([f"Artist {i}"] + ([f"Band {i}"] if i % 3 == 0 else []), f"Guest {i}", f"Song {i}")
+             for i in range(args.songs)]
+    cache = ResultCache()
+
+    for label, prefix in (("Primera pasada", "Mix"), ("Pasada repetida (playlists nuevas)", "More")):
+        rows = write_playlists(config.EXPORT_DIR, songs, args.playlists, args.per_playlist, prefix, rng)
+        exact = {make_key(finder.infer_artist(pd.Series(r)), r['Track Name'].strip().lower()) for r in rows}
+        canonical = {canonical_key(r['Artist Name(s)'], r['Track Name']) for r in rows}
+        del searches[:]
+        chunks, total = finder.pending_exports(cache)
+        finder.process(chunks, cache, name_override='bench', total=total)
+        print(f"📊 {label}: {len(rows)} filas | {len(exact)} claves exactas | {len(canonical)} canónicas "
+              f"| {len(searches)} búsquedas")
+
+if __name__ == '__main__':
+    main()
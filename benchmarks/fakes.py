@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import threading
+import urllib.parse
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from synthetic import fixture_duration, silent_mp3
+
+# Backend falso para medir finder y download_v2 sin tocar YouTube:
+#  - FakeMediaServer: servidor HTTP local con búsqueda (/search) y audio generado (/audio/<id>.mp3),
+#    con latencia, ancho de banda (por conexión) y 429 configurables. /audio acepta Range como un CDN.
+#  - FakeYoutubeDL: sustituto de yt_dlp.YoutubeDL que habla con ese servidor. Se instala asignándolo a
+#    finder.YoutubeDL / download_v2.YoutubeDL.
+
+# Variables de entorno: así las ven también los procesos hijos de download_v2
+SERVER_ENV = 'SPOTIFY_DL_FAKE_SERVER'
+
+def video_id_for(query):
+    """Id de 11 caracteres que lleva la duración del vídeo codificada (el servidor no guarda estado)"""
+    return hashlib.md5(query.encode('utf-8')).hexdigest()[:8] + f"{fixture_duration(query):03d}"
+
+class FakeMediaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency_ms=0, bandwidth_kbps=0, p429=0.0, seed=0):
+        super().__init__(('127.0.0.1', 0), FakeMediaHandler)
+        self.latency = latency_ms / 1000
+        self.bandwidth = bandwidth_kbps * 1024 / 8  # bytes/s, 0 = sin límite
+        self.p429 = p429
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'search': 0, 'audio': 0, '429': 0, 'bytes_sent': 0}
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        os.environ[SERVER_ENV] = self.url
+        return self
+
+    def inject_429(self):
+        with self.lock:
+            hit = self.rng.random() < self.p429
+            if hit:
+                self.stats['429'] += 1
+            return hit
+
+    def handle_error(self, request, client_address):
+        # Un cliente que corta a mitad (tramos parados tras un 429) no es un error del servidor
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def fixture(self, seconds):
+        # Se genera en cada petición: cachearlos inflaría el RSS medido del proceso principal
+        return silent_mp3(seconds)
+
+class FakeMediaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.latency)
+        if server.inject_429():
+            return self.reply(429, b'Too Many Requests')
+
+        parsed = urllib.parse.urlparse(self.path)
+        if parsed.path == '/search':
+            server.stats['search'] += 1
+            query = urllib.parse.parse_qs(parsed.query)['q'][0]
+            entries = [{
+                'id': video_id_for(query),
+                'title': f"{query} (Official Audio)",
+                'uploader': 'Fake - Topic',
+                'duration': fixture_duration(query),
+            }]
+            return self.reply(200, json.dumps({'entries': entries}).encode('utf-8'), 'application/json')
+
+        if parsed.path.startswith('/audio/'):
+            video_id = os.path.splitext(os.path.basename(parsed.path))[0]
+            body = server.fixture(int(video_id[-3:]))
+            ranged = self.headers.get('Range', '').startswith('bytes=')
+            start, end = 0, len(body) - 1
+            if ranged:
+                first, _, last = self.headers['Range'][6:].partition('-')
+                start, end = int(first), min(int(last), end) if last else end
+            # Se cuenta una descarga por fichero: el primer tramo (no la sonda de 1 byte) o la petición entera
+            if start == 0 and end > 0:
+                with server.lock:
+                    server.stats['audio'] += 1
+            if not ranged:
+                return self.reply(200, body, 'audio/mpeg')
+            return self.reply(206, body[start:end + 1], 'audio/mpeg',
+                              {'Content-Range': f"bytes {start}-{end}/{len(body)}"})
+
+        self.reply(404, b'')
+
+    def reply(self, status, body, content_type='text/plain', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        # Limitar ancho de banda enviando por bloques
+        chunk = max(1024, int(self.server.bandwidth / 20)) if self.server.bandwidth else len(body) or 1
+        for i in range(0, len(body), chunk):
+            self.wfile.write(body[i:i + chunk])
+            with self.server.lock:
+                self.server.stats['bytes_sent'] += len(body[i:i + chunk])
+            if self.server.bandwidth:
+                time.sleep(chunk / self.server.bandwidth)
+
+    def log_message(self, *args):
+        pass
+
+class FakeYoutubeDL:
+    """Lo justo de la interfaz de YoutubeDL que usan finder y download_v2"""
+
+    def __init__(self, params=None):
+        self.params = dict(params or {})
+        outtmpl = self.params.get('outtmpl')
+        self.params['outtmpl'] = outtmpl if isinstance(outtmpl, dict) else {'default': outtmpl or '%(id)s.%(ext)s'}
+        self.base_url = os.environ[SERVER_ENV]
+
+    def extract_info(self, url, download=False):
+        if not download and 'watch?v=' in url:
+            # Formato directo por HTTP, como los de audio de YouTube: download_v2 puede bajarlo por tramos
+            video_id = urllib.parse.parse_qs(urllib.parse.urlparse(url).query)['v'][0]
+            return {'id': video_id, 'title': video_id, 'ext': 'mp3', 'protocol': 'http',
+                    'url': f"{self.base_url}/audio/{video_id}.mp3", 'http_headers': {}}
+        if not download:
+            query = url.split(':', 1)[1] if url.startswith('ytsearch') else url
+            with urllib.request.urlopen(f"{self.base_url}/search?q={urllib.parse.quote(query)}") as resp:
+                return json.loads(resp.read())
+
+        return self._fetch(urllib.parse.parse_qs(urllib.parse.urlparse(url).query)['v'][0])
+
+    def process_ie_result(self, ie_result, download=True):
+        """Descarga a partir de una info ya extraída (sin volver a pedir el vídeo)"""
+        return self._fetch(ie_result['id'])
+
+    def _fetch(self, video_id):
+        info = {'id': video_id, 'title': video_id, 'ext': 'mp3'}
+        path = self.prepare_filename(info)
+        with urllib.request.urlopen(f"{self.base_url}/audio/{video_id}.mp3") as resp, open(path, 'wb') as f:
+            f.write(resp.read())
+        info['requested_downloads'] = [{'filepath': path}]
+        return info
+
+    def prepare_filename(self, info):
+        return self.params['outtmpl']['default'] % info
+
+    def download(self, urls):
+        for url in urls:
+            self.extract_info(url, download=True)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
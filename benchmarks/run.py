@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import argparse
+import resource
+import tempfile
+from time import perf_counter
+
+# Benchmark offline de extremo a extremo: genera exports sintéticos, levanta el servidor de medios falso,
+# ejecuta finder + download_v2 (o el pipeline) contra él y muestra pistas/s, latencias p50/p99 por etapa
+# y pico de memoria. Deterministas con la misma semilla, para comparar un cambio contra otro.
+# Uso: python benchmarks/run.py --rows 1000 --playlists 10 --latency-ms 20 --report out.json [--baseline prev.json]
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+from fakes import FakeMediaServer, FakeYoutubeDL  # noqa: E402
+from synthetic import write_exports  # noqa: E402
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+def stage_latencies(path, offset=0):
+    """p50/p99 por etapa a partir de los span() del JSONL de métricas, desde offset (lo que escribió esta
+    ejecución si se reutiliza el workdir)"""
+    stages = {}
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                event = json.loads(line)
+                if event['type'] == 'span':
+                    stages.setdefault(event['stage'], []).append(event['seconds'])
+    return {
+        stage: {'count': len(v), 'p50_ms': percentile(v, 50) * 1000, 'p99_ms': percentile(v, 99) * 1000}
+        for stage, v in sorted(stages.items())
+    }
+
+def peak_rss_mb():
+    # ru_maxrss está en KB en Linux (en bytes en macOS)
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'main': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000, help="canciones en total (100 a 100k)")
+    parser.add_argument('--playlists', type=int, default=10)
+    parser.add_argument('--overlap', type=float, default=0.3, help="fracción de canciones compartidas entre playlists")
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--bandwidth-kbps', type=float, default=0, help="0 = sin límite")
+    parser.add_argument('--p429', type=float, default=0.0, help="probabilidad de responder 429")
+    parser.add_argument('--rate', type=float, default=1000, help="peticiones/s iniciales y máximas del limitador")
+    parser.add_argument('--mode', choices=['batch', 'pipeline'], default='batch')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', help="por defecto, un directorio temporal nuevo")
+    parser.add_argument('--report', help="guardar el resultado en JSON")
+    parser.add_argument('--baseline', help="JSON de una ejecución anterior para comparar")
+    args = parser.parse_args()
+
+    # Rutas relativas al directorio desde el que se lanza, antes del chdir
+    report_path = args.report and os.path.abspath(args.report)
+    baseline_path = args.baseline and os.path.abspath(args.baseline)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='spotify-dl-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+    server = FakeMediaServer(args.latency_ms, args.bandwidth_kbps, args.p429, args.seed).start()
+    write_exports('exportify', args.rows, args.playlists, args.overlap, args.seed)
+
+    # Ajustes antes de importar el resto de módulos (copian los valores de config al importarse)
+    import config
+    config.ensure_dirs()
+    config.RATE_LIMIT_INITIAL = config.RATE_LIMIT_MAX = args.rate
+    config.RATE_LIMIT_BACKOFF_BASE = 0.1
+    config.RATE_LIMIT_BACKOFF_MAX = 1
+    # Las latencias por etapa salen de las métricas (metrics.span)
+    config.METRICS_ENABLED = True
+    metrics_offset = os.path.getsize(config.METRICS_EVENTS) if os.path.exists(config.METRICS_EVENTS) else 0
+
+    import finder
+    import download_v2
+    import metrics
+    from cache import ResultCache
+    finder.YoutubeDL = download_v2.YoutubeDL = FakeYoutubeDL
+
+    start = perf_counter()
+    cache = ResultCache()
+    cache.sync_csvs(config.EXPORT_RESULT_DIR)
+    chunks, pending = finder.pending_exports(cache)
+    load_done = perf_counter()
+
+    if args.mode == 'pipeline':
+        import pipeline
+        pipeline.run(chunks, cache, pending)
+        search_done = download_done = perf_counter()
+    else:
+        finder.process(chunks, cache, name_override="combined", total=pending)
+        search_done = perf_counter()
+        download_v2.main()
+        download_done = perf_counter()
+
+    total = download_done - start
+    metrics.flush()
+    report = {
+        'args': vars(args),
+        'pending_rows': pending,
+        'searches': server.stats['search'],
+        'downloads': server.stats['audio'],
+        'injected_429': server.stats['429'],
+        'seconds': {
+            'load': load_done - start,
+            'search': search_done - load_done,
+            'download': download_done - search_done,
+            'total': total,
+        },
+        'tracks_per_sec': pending / total if total else 0.0,
+        'stages': stage_latencies(config.METRICS_EVENTS, metrics_offset),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    server.shutdown()
+
+    print(f"\n📊 {pending} canciones pendientes | {report['searches']} búsquedas | {report['downloads']} descargas | "
+          f"{report['injected_429']} 429")
+    print("⏱️ " + " | ".join(f"{k}: {v:.2f}s" for k, v in report['seconds'].items()))
+    print(f"🚀 {report['tracks_per_sec']:.1f} canciones/s")
+    for stage, s in report['stages'].items():
+        print(f"   {stage:<17} n={s['count']:<6} p50={s['p50_ms']:.1f}ms p99={s['p99_ms']:.1f}ms")
+    rss = report['peak_rss_mb']
+    print(f"💾 RSS pico: {rss['main']:.0f} MB (proceso principal), {rss['children']:.0f} MB (mayor hijo)")
+
+    if baseline_path:
+        with open(baseline_path, encoding='utf-8') as f:
+            base = json.load(f)
+        ratio = report['tracks_per_sec'] / base['tracks_per_sec'] if base['tracks_per_sec'] else float('inf')
+        print(f"📈 Frente a la referencia: x{ratio:.2f} canciones/s "
+              f"({base['tracks_per_sec']:.1f} -> {report['tracks_per_sec']:.1f})")
+
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import os
+import random
+import hashlib
+
+import pandas as pd
+
+# Generadores deterministas de datos de prueba: exports de Exportify y ficheros MP3 de relleno
+
+def fixture_duration(key):
+    """Duración (s) determinista para una canción o vídeo; la comparten el generador de CSV y el servidor
+    de medios para que la validación de ±3 s pase"""
+    return 120 + int(hashlib.md5(key.encode('utf-8')).hexdigest()[:8], 16) % 180
+
+def synthetic_export(rows, seed=0):
+    """DataFrame con la forma de un CSV de Exportify, incluyendo artistas vacíos y títulos con '-'"""
+    rng = random.Random(seed)
+    artists, tracks = [], []
+    for i in range(rows):
+        r = rng.random()
+        if r < 0.05:
+            artists.append(None)
+        elif r < 0.08:
+            artists.append('   ')
+        else:
+            artists.append(', '.join(f" Artist {rng.randrange(rows // 4 + 1)} " for _ in range(rng.randint(1, 3))))
+        title = f"Track {rng.randrange(rows)}"
+        if rng.random() < 0.3:
+            title = f"Prefix {i} - {title}"
+        tracks.append(title if rng.random() > 0.01 else None)
+    return pd.DataFrame({
+        'Artist Name(s)': artists,
+        'Track Name': tracks,
+        'Duration (ms)': [rng.randint(60_000, 400_000) for _ in range(rows)],
+    })
+
+def write_exports(directory, rows, playlists=10, overlap=0.3, seed=0):
+    """Escribe `playlists` CSV de Exportify con `rows` canciones en total. Una fracción `overlap` de cada
+    playlist son canciones compartidas con las demás (para medir dedup y caché)"""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    shared = [(f"Shared Artist {i}", f"Shared Track {i}") for i in range(max(1, int(rows * overlap / playlists)))]
+    per_playlist = max(1, rows // playlists)
+
+    for p in range(playlists):
+        records = []
+        for i in range(per_playlist):
+            if rng.random() < overlap:
+                artist, title = rng.choice(shared)
+            else:
+                artist, title = f"Artist {p}-{i}", f"Track {p}-{i}"
+            key = f"{artist.lower()} - {title.lower()}"
+            records.append({
+                'Track Name': title,
+                'Artist Name(s)': f"{artist}, Featured {i % 7}",
+                'Album Name': f"Album {p}",
+                'Track Number': i + 1,
+                'Release Date': f"{2000 + p % 25}-01-01",
+                'ISRC': f"XX{p:03d}{i:07d}",
+                'Duration (ms)': fixture_duration(key) * 1000,
+            })
+        pd.DataFrame(records).to_csv(os.path.join(directory, f"BenchPlaylist{p}.csv"), index=False)
+
+# --- MP3 de relleno ---
+# Cabecera de trama MPEG-1 Layer III, 128 kbps, 44.1 kHz, estéreo, sin CRC ni padding
+MP3_FRAME_HEADER = b'\xff\xfb\x90\x00'
+MP3_FRAME_SIZE = 144 * 128000 // 44100  # 417 bytes
+MP3_FRAME_SECONDS = 1152 / 44100
+
+def silent_mp3(seconds):
+    """MP3 válido (tramas vacías) de la duración pedida; mutagen lo lee sin problemas"""
+    frame = MP3_FRAME_HEADER + b'\x00' * (MP3_FRAME_SIZE - len(MP3_FRAME_HEADER))
+    return frame * int(round(seconds / MP3_FRAME_SECONDS))
@@ -0,0 +1,323 @@
+import os
+import re
+import csv
+import sqlite3
+import time
+from threading import Lock
+
+from trackkey import canonical_key
+from config import CACHE_DB, NOT_FOUND_TTL
+
+# cache.py
+# Caché persistente de resultados de búsqueda (SQLite) compartida por finder y los downloaders.
+# Sustituye el re-escaneo de todos los CSV de exports/ por consultas indexadas. Cada resultado guarda
+# además su clave canónica (trackkey.py) para reutilizarlo con otras grafías de la misma canción.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    query_key    TEXT PRIMARY KEY,
+    artist       TEXT NOT NULL,
+    title        TEXT NOT NULL,
+    video_id     TEXT,
+    video_title  TEXT,
+    uploader     TEXT,
+    duration     REAL,
+    not_found    INTEGER NOT NULL DEFAULT 0,
+    looked_up_at REAL NOT NULL,
+    canonical_key TEXT
+);
+
+-- Qué canciones se han escrito ya en el CSV de cada playlist
+CREATE TABLE IF NOT EXISTS playlist_tracks (
+    source_file TEXT NOT NULL,
+    query_key   TEXT NOT NULL,
+    position    INTEGER NOT NULL,
+    PRIMARY KEY (source_file, query_key)
+);
+
+CREATE INDEX IF NOT EXISTS playlist_tracks_key ON playlist_tracks (query_key);
+
+-- Registro de cambios (playlist, canción) para actualizar el almacén columnar de forma incremental
+CREATE TABLE IF NOT EXISTS result_changes (
+    seq         INTEGER PRIMARY KEY AUTOINCREMENT,
+    source_file TEXT NOT NULL,
+    query_key   TEXT NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS playlist_tracks_changed AFTER INSERT ON playlist_tracks BEGIN
+    INSERT INTO result_changes (source_file, query_key) VALUES (NEW.source_file, NEW.query_key);
+END;
+
+CREATE TRIGGER IF NOT EXISTS results_inserted AFTER INSERT ON results BEGIN
+    INSERT INTO result_changes (source_file, query_key)
+    SELECT source_file, query_key FROM playlist_tracks WHERE query_key = NEW.query_key;
+END;
+
+CREATE TRIGGER IF NOT EXISTS results_updated AFTER UPDATE ON results BEGIN
+    INSERT INTO result_changes (source_file, query_key)
+    SELECT source_file, query_key FROM playlist_tracks WHERE query_key = NEW.query_key;
+END;
+
+-- Estado de los CSV importados, para re-importar solo los que cambian
+CREATE TABLE IF NOT EXISTS csv_files (
+    name  TEXT PRIMARY KEY,
+    size  INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+"""
+
+VIDEO_ID_RE = re.compile(r'[?&]v=([^&#]+)')
+
+def make_key(artist, title):
+    """Clave normalizada de búsqueda: la misma query que se lanza contra YouTube"""
+    return f"{str(artist).strip().lower()} - {str(title).strip().lower()}"
+
+def video_link(video_id):
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+def video_id_from_link(link):
+    match = VIDEO_ID_RE.search(link or '')
+    return match.group(1) if match else None
+
+class ResultCache:
+    def __init__(self, path=CACHE_DB, not_found_ttl=NOT_FOUND_TTL):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.not_found_ttl = not_found_ttl
+        self.lock = Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._add_canonical_keys()
+
+    def _add_canonical_keys(self):
+        """Cachés anteriores a la clave canónica: se añade la columna y se calcula para lo ya guardado"""
+        # BEGIN IMMEDIATE: varios procesos pueden abrir la caché a la vez y solo uno debe migrarla
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(results)")}
+            if 'canonical_key' not in columns:
+                self.conn.execute("ALTER TABLE results ADD COLUMN canonical_key TEXT")
+                rows = self.conn.execute("SELECT query_key, artist, title FROM results").fetchall()
+                artists = self._index_artists()
+                self.conn.executemany("UPDATE results SET canonical_key = ? WHERE query_key = ?",
+                                      [(canonical_key(artists.get(r['query_key']) or r['artist'], r['title']),
+                                        r['query_key']) for r in rows])
+            self.conn.execute("CREATE INDEX IF NOT EXISTS results_canonical ON results (canonical_key)")
+            self.conn.execute("COMMIT")
+        except:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def _index_artists(self, source_file=None):
+        """{query_key: 'Artist Name(s)'} del índice de exports (inputs.py), si existe. La clave canónica se
+        calcula con todos los artistas, como en finder; results solo guarda el inferido"""
+        if not self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'input_rows'").fetchone():
+            return {}
+        query, params = "SELECT query_key, artists FROM input_rows WHERE artists != ''", ()
+        if source_file is not None:
+            query += " AND source_file = ?"
+            params = (source_file,)
+        return {r[0]: r[1] for r in self.conn.execute(query, params)}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _expired_before(self):
+        return time.time() - self.not_found_ttl
+
+    # --- Lecturas ---
+
+    def get(self, artist, title):
+        """Devuelve el resultado cacheado o None. Los NOT FOUND caducados cuentan como fallo de caché"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM results WHERE query_key = ?", (make_key(artist, title),)
+            ).fetchone()
+        if row is None:
+            return None
+        if row['not_found'] and row['looked_up_at'] < self._expired_before():
+            return None
+        return dict(row)
+
+    def find_canonical(self, canonical):
+        """Último resultado encontrado con esa clave canónica, o None. Los NOT FOUND no cuentan: otra
+        grafía de la misma canción puede dar con el vídeo"""
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT * FROM results WHERE canonical_key = ? AND not_found = 0
+                ORDER BY looked_up_at DESC LIMIT 1
+            """, (canonical,)).fetchone()
+        return dict(row) if row else None
+
+    def playlist_keys(self, source_file):
+        """Set de (artist, title) ya escritos en el CSV de source_file, sin contar NOT FOUND caducados"""
+        with self.lock:
+            rows = self.conn.execute("""
+                SELECT r.artist, r.title FROM playlist_tracks p
+                JOIN results r ON r.query_key = p.query_key
+                WHERE p.source_file = ? AND NOT (r.not_found = 1 AND r.looked_up_at < ?)
+            """, (source_file, self._expired_before())).fetchall()
+        return {(r['artist'], r['title']) for r in rows}
+
+    def playlists(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT DISTINCT source_file FROM playlist_tracks ORDER BY source_file").fetchall()
+        return [r['source_file'] for r in rows]
+
+    def playlist_results(self, source_file):
+        """Canciones encontradas de una playlist, en el orden en que se resolvieron"""
+        with self.lock:
+            rows = self.conn.execute("""
+                SELECT r.* FROM playlist_tracks p
+                JOIN results r ON r.query_key = p.query_key
+                WHERE p.source_file = ? AND r.not_found = 0
+                ORDER BY p.position
+            """, (source_file,)).fetchall()
+        return [dict(r) for r in rows]
+
+    def library_rows(self, after_seq=None):
+        """Filas playlist + resultado para el almacén columnar, y el último seq de result_changes que cubren.
+        Con after_seq, solo las (playlist, canción) que han cambiado desde entonces"""
+        columns = """p.source_file, p.position, r.artist, r.title, r.video_id, r.video_title, r.uploader,
+                     r.duration, r.not_found, r.query_key"""
+        with self.lock:
+            # Misma transacción de lectura para el seq y las filas (otro proceso puede estar escribiendo)
+            self.conn.execute("BEGIN")
+            try:
+                seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM result_changes").fetchone()[0]
+                if after_seq is None:
+                    rows = self.conn.execute(f"""
+                        SELECT {columns} FROM playlist_tracks p JOIN results r ON r.query_key = p.query_key
+                    """).fetchall()
+                else:
+                    rows = self.conn.execute(f"""
+                        SELECT {columns} FROM (
+                            SELECT DISTINCT source_file, query_key FROM result_changes WHERE seq > ? AND seq <= ?
+                        ) c
+                        JOIN playlist_tracks p ON p.source_file = c.source_file AND p.query_key = c.query_key
+                        JOIN results r ON r.query_key = p.query_key
+                    """, (after_seq, seq)).fetchall()
+            finally:
+                self.conn.commit()
+        return [tuple(r) for r in rows], seq
+
+    def stats(self):
+        with self.lock:
+            found, not_found = self.conn.execute(
+                "SELECT COUNT(*) - COALESCE(SUM(not_found), 0), COALESCE(SUM(not_found), 0) FROM results"
+            ).fetchone()
+            playlists, tracks = self.conn.execute(
+                "SELECT COUNT(DISTINCT source_file), COUNT(*) FROM playlist_tracks"
+            ).fetchone()
+        return {'found': found, 'not_found': not_found, 'playlists': playlists, 'playlist_tracks': tracks}
+
+    # --- Escrituras ---
+
+    def trim_changes(self, upto_seq):
+        """Olvida los cambios ya volcados al almacén columnar"""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM result_changes WHERE seq <= ?", (upto_seq,))
+
+    def put(self, artist, title, video, looked_up_at=None, canonical=None):
+        """Guarda un resultado encontrado (video: dict con id/title/uploader/duration) o NOT FOUND si video es None.
+        canonical: clave canónica si se conoce algo más que artista y título (p. ej. todos los artistas)"""
+        looked_up_at = looked_up_at or time.time()
+        key = make_key(artist, title)
+        canonical = canonical or canonical_key(artist, title)
+        with self.lock, self.conn:
+            if video is None:
+                self.conn.execute("""
+                    INSERT OR REPLACE INTO results (query_key, artist, title, not_found, looked_up_at, canonical_key)
+                    VALUES (?, ?, ?, 1, ?, ?)
+                """, (key, artist, title, looked_up_at, canonical))
+            else:
+                self.conn.execute("""
+                    INSERT OR REPLACE INTO results
+                        (query_key, artist, title, video_id, video_title, uploader, duration, not_found, looked_up_at,
+                         canonical_key)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
+                """, (key, artist, title, video['id'], video.get('title', ''), video.get('uploader', ''),
+                      video.get('duration') or None, looked_up_at, canonical))
+
+    def add_to_playlist(self, source_file, tracks):
+        """Marca como escritas en el CSV de source_file las canciones [(artist, title)]"""
+        with self.lock, self.conn:
+            self.conn.executemany("""
+                INSERT OR IGNORE INTO playlist_tracks (source_file, query_key, position)
+                VALUES (?, ?, (SELECT COUNT(*) FROM playlist_tracks WHERE source_file = ?))
+            """, [(source_file, make_key(artist, title), source_file) for artist, title in tracks])
+
+    # --- Sincronización con los CSV de exports/ ---
+
+    def sync_csvs(self, directory):
+        """Importa los CSV de resultados nuevos o modificados desde la última sincronización (solo hace stat del resto)"""
+        imported = 0
+        for f in os.listdir(directory):
+            if not f.endswith('.csv') or f.startswith("_"):
+                continue
+            path = os.path.join(directory, f)
+            st = os.stat(path)
+            with self.lock:
+                known = self.conn.execute("SELECT size, mtime FROM csv_files WHERE name = ?", (f,)).fetchone()
+            if known and known['size'] == st.st_size and known['mtime'] == st.st_mtime:
+                continue
+            self.import_csv(path, looked_up_at=st.st_mtime)
+            with self.lock, self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO csv_files (name, size, mtime) VALUES (?, ?, ?)",
+                                  (f, st.st_size, st.st_mtime))
+            imported += 1
+        return imported
+
+    def import_csv(self, path, looked_up_at):
+        source_file = os.path.splitext(os.path.basename(path))[0]
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            if not reader.fieldnames or 'Artist' not in reader.fieldnames or 'Title' not in reader.fieldnames:
+                return  # Saltar si no es un CSV de resultados válidos
+            rows = list(reader)
+
+        with self.lock, self.conn:
+            position = self.conn.execute(
+                "SELECT COUNT(*) FROM playlist_tracks WHERE source_file = ?", (source_file,)
+            ).fetchone()[0]
+            artists = self._index_artists(source_file)
+            for row in rows:
+                artist = (row['Artist'] or '').strip().lower()
+                title = (row['Title'] or '').strip().lower()
+                key = make_key(artist, title)
+                canonical = canonical_key(artists.get(key) or artist, title)
+                video_id = video_id_from_link(row.get('YouTube Link'))
+
+                if video_id:
+                    # Un resultado encontrado sustituye a un NOT FOUND previo, nunca al revés
+                    self.conn.execute("""
+                        INSERT INTO results
+                            (query_key, artist, title, video_id, video_title, uploader, duration, not_found, looked_up_at,
+                             canonical_key)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
+                        ON CONFLICT(query_key) DO UPDATE SET
+                            video_id = excluded.video_id, video_title = excluded.video_title,
+                            uploader = excluded.uploader, duration = excluded.duration,
+                            not_found = 0, looked_up_at = excluded.looked_up_at
+                        WHERE results.not_found = 1
+                    """, (key, artist, title, video_id, row.get('Video Title', ''), row.get('Uploader', ''),
+                          _to_float(row.get('Duration (s)')), looked_up_at, canonical))
+                else:
+                    self.conn.execute("""
+                        INSERT OR IGNORE INTO results (query_key, artist, title, not_found, looked_up_at, canonical_key)
+                        VALUES (?, ?, ?, 1, ?, ?)
+                    """, (key, artist, title, looked_up_at, canonical))
+
+                cur = self.conn.execute("""
+                    INSERT OR IGNORE INTO playlist_tracks (source_file, query_key, position) VALUES (?, ?, ?)
+                """, (source_file, key, position))
+                position += cur.rowcount
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
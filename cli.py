@@ -0,0 +1,151 @@
+import os
+import sys
+import argparse
+
+from config import CACHE_DB, DAEMON_PORT, EXPORT_DIR, QUEUE_DB, VERIFY_CONCURRENCY, ensure_dirs
+
+# cli.py
+# Punto de entrada único: python cli.py <subcomando>. Cada subcomando importa sus módulos dentro de
+# la función, así que status/list no cargan pandas, numpy, yt_dlp ni tqdm y arrancan en milisegundos
+# (benchmarks/bench_imports.py lo vigila). Los scripts de siempre (finder.py, download_v2.py...) siguen
+# funcionando igual.
+
+def cmd_find(args):
+    """Busca en YouTube las canciones de los exports"""
+    import finder
+    from cache import ResultCache
+
+    ensure_dirs()
+    if args.watch:
+        from inputs import InputIndex
+        cache = ResultCache()
+        InputIndex(cache).watch(EXPORT_DIR, finder.normalize_export,
+                                lambda chunks, total: finder.process(chunks, cache, name_override="combined",
+                                                                     total=total))
+    elif args.playlist:
+        finder.process(os.path.join(EXPORT_DIR, f"{args.playlist}.csv"), ResultCache())
+    elif args.all:
+        cache = ResultCache()
+        chunks, total = finder.pending_exports(cache)
+        if not total:
+            print("✅ Todo ya está procesado según la caché.")
+            return
+        finder.process(chunks, cache, name_override="combined", total=total)
+    else:
+        finder.main()  # menú interactivo
+
+def cmd_download(args):
+    """Descarga lo ya resuelto (download_v2)"""
+    import download_v2
+    download_v2.main()
+
+def cmd_pipeline(args):
+    """Busca y descarga en un único pase encadenado"""
+    import pipeline
+    pipeline.main()
+
+def cmd_serve(args):
+    """Arranca el modo servicio (API HTTP local)"""
+    import daemon
+    daemon.serve(port=args.port)
+
+def cmd_verify(args):
+    """Comprueba los ficheros descargados y prepara su reparación"""
+    import verify
+
+    ensure_dirs()
+    verify.verify(playlist=args.playlist, repair_files=args.repair, prune=args.prune, workers=args.workers)
+
+def _open_cache():
+    # Solo lectura de estado: no se crea la caché si todavía no existe
+    if not os.path.exists(CACHE_DB):
+        return None
+    from cache import ResultCache
+    return ResultCache()
+
+def cmd_status(args):
+    """Resumen de exports, caché y cola de descargas"""
+    from inputs import InputIndex
+
+    cache = _open_cache()
+    exports = [f for f in os.listdir(EXPORT_DIR) if f.endswith('.csv') and not f.startswith('_')] \
+        if os.path.isdir(EXPORT_DIR) else []
+    print(f"📁 {EXPORT_DIR}/: {len(exports)} CSV")
+    if cache is None:
+        print("🗃️ Sin caché todavía (ejecuta find)")
+        return
+
+    index = InputIndex(cache)
+    stale = index.stale_files(EXPORT_DIR) if exports else []
+    pending = sum(index.pending_counts().values())
+    stats = cache.stats()
+    print(f"⏳ Pendientes de buscar: {pending}" + (f" (+{len(stale)} CSV cambiados sin indexar)" if stale else ""))
+    print(f"✅ Encontradas: {stats['found']} | ❌ NOT FOUND: {stats['not_found']} | "
+          f"🎶 {stats['playlist_tracks']} canciones en {stats['playlists']} playlists")
+
+    if os.path.exists(QUEUE_DB):
+        from workqueue import WorkQueue
+        wq = WorkQueue()
+        counts = wq.counts()
+        wq.close()
+        print("⬇️ Cola de descargas: " + " | ".join(f"{state}: {n}" for state, n in sorted(counts.items())))
+    cache.close()
+
+def cmd_list(args):
+    """Exports de exportify/ con sus canciones pendientes"""
+    from inputs import InputIndex
+
+    if not os.path.isdir(EXPORT_DIR):
+        print(f"❌ No existe la carpeta '{EXPORT_DIR}/'.")
+        return
+    cache = _open_cache()
+    counts, stale = {}, set()
+    if cache is not None:
+        index = InputIndex(cache)
+        counts = index.pending_counts()
+        stale = set(index.stale_files(EXPORT_DIR))
+    for f in sorted(os.listdir(EXPORT_DIR)):
+        if not f.endswith('.csv') or f.startswith('_'):
+            continue
+        name = os.path.splitext(f)[0]
+        note = " (cambiado, sin indexar)" if f in stale else ""
+        print(f"{name}: {counts.get(name, 0)} pendientes{note}")
+    if cache is not None:
+        cache.close()
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='spotify-dl', description="Exportify -> YouTube -> MP3")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    find = sub.add_parser('find', help=cmd_find.__doc__)
+    group = find.add_mutually_exclusive_group()
+    group.add_argument('--playlist', help="nombre del export (sin .csv)")
+    group.add_argument('--all', action='store_true', help="todos los exports")
+    group.add_argument('--watch', action='store_true', help="vigilar exportify/ y procesar lo nuevo")
+    find.set_defaults(func=cmd_find)
+
+    sub.add_parser('download', help=cmd_download.__doc__).set_defaults(func=cmd_download)
+    sub.add_parser('pipeline', help=cmd_pipeline.__doc__).set_defaults(func=cmd_pipeline)
+
+    verify = sub.add_parser('verify', help=cmd_verify.__doc__)
+    verify.add_argument('--playlist', help="solo la carpeta de esta playlist (nombre del export, sin .csv)")
+    verify.add_argument('--repair', action='store_true',
+                        help="borrar los ficheros malos y encolar su descarga (se baja con `download`)")
+    verify.add_argument('--prune', action='store_true', help="borrar ficheros huérfanos y duplicados")
+    verify.add_argument('--workers', type=int, default=VERIFY_CONCURRENCY, help="procesos decodificando a la vez")
+    verify.set_defaults(func=cmd_verify)
+
+    serve = sub.add_parser('serve', help=cmd_serve.__doc__)
+    serve.add_argument('--port', type=int, default=DAEMON_PORT)
+    serve.set_defaults(func=cmd_serve)
+
+    sub.add_parser('status', help=cmd_status.__doc__).set_defaults(func=cmd_status)
+    sub.add_parser('list', help=cmd_list.__doc__).set_defaults(func=cmd_list)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,303 @@
+import os
+import json
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+from writer import RESULT_HEADER
+from config import COLUMNS_DIR, EXPORT_RESULT_DIR
+
+# columnar.py
+# Almacén columnar de la biblioteca resuelta (playlist + resultado por canción), derivado de la caché
+# SQLite. Cada columna es un fichero binario que se puede mapear en memoria y al que solo se añade:
+#   - enteros de ancho fijo: <col>.bin
+#   - categóricas (playlist, artista, canal): códigos int32 en <col>.codes + categorías en <col>.cats
+#   - texto libre (títulos y video_id, que no siempre tiene 11 caracteres): UTF-8 terminado en NUL en <col>.data + offset final de cada fila en <col>.offsets
+#     (el terminador permite decodificar toda la columna de una vez con un split)
+# meta.json dice cuántas filas son válidas: se escribe al final y por rename, así que un corte a mitad
+# de un append deja bytes de más que se recortan al abrir. Las filas que cambian se añaden de nuevo y
+# al cargar gana la última versión de cada (playlist, canción). Un almacén con otro FORMAT_VERSION se
+# borra al abrirlo y sync() lo rehace desde la caché.
+# Abrir, sync() y clear() toman un flock exclusivo sobre LOCK_FILE: el recorte de lo que pasa de meta.json
+# nunca corta el append en curso de otro proceso (daemon y download_v2 pueden sincronizar a la vez).
+
+FORMAT_VERSION = 2  # 2: video_id como texto libre (antes S11, que recortaba los ids más largos)
+FIXED_COLUMNS = {'position': 'int32', 'duration': 'int32', 'not_found': 'uint8', 'key': 'uint64'}
+CATEGORY_COLUMNS = ('source_file', 'artist', 'uploader')
+STRING_COLUMNS = ('title', 'video_title', 'video_id')
+LOCK_FILE = 'lock'  # no se borra nunca: otro proceso puede estar esperándolo
+
+# Orden de las tuplas que devuelve ResultCache.library_rows
+ROW_FIELDS = ('source_file', 'position', 'artist', 'title', 'video_id', 'video_title', 'uploader',
+              'duration', 'not_found', 'query_key')
+
+class ColumnStore:
+    def __init__(self, path=COLUMNS_DIR):
+        self.path = path
+        os.makedirs(self.path, exist_ok=True)
+        with self._locked():
+            self._open()
+
+    @contextmanager
+    def _locked(self):
+        """Exclusión entre procesos sobre el almacén (no reentrante: se toma una vez por operación)"""
+        with open(self._file(LOCK_FILE), 'a') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _open(self):
+        """(Re)lee meta.json y las categorías. Solo con el lock tomado"""
+        self.meta = self._read_meta()
+        if self.meta.get('version') != FORMAT_VERSION:
+            self._remove_files()
+            self.meta = self._read_meta()
+        self._truncate_torn()
+        self.categories = {col: self._read_categories(col) for col in CATEGORY_COLUMNS}
+        self.codes = {col: {value: i for i, value in enumerate(cats)} for col, cats in self.categories.items()}
+
+    def _remove_files(self):
+        for name in os.listdir(self.path):
+            if name != LOCK_FILE:
+                os.remove(self._file(name))
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._file('meta.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'version': FORMAT_VERSION, 'rows': 0, 'seq': 0, 'categories': {col: 0 for col in CATEGORY_COLUMNS},
+                    'string_bytes': {col: 0 for col in STRING_COLUMNS}}
+
+    def _write_meta(self):
+        tmp = self._file('meta.json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._file('meta.json'))
+
+    def _expected_sizes(self):
+        rows = self.meta['rows']
+        sizes = {f"{col}.bin": rows * np.dtype(dtype).itemsize for col, dtype in FIXED_COLUMNS.items()}
+        sizes.update({f"{col}.codes": rows * 4 for col in CATEGORY_COLUMNS})
+        sizes.update({f"{col}.offsets": rows * 8 for col in STRING_COLUMNS})
+        sizes.update({f"{col}.data": self.meta['string_bytes'][col] for col in STRING_COLUMNS})
+        return sizes
+
+    def _truncate_torn(self):
+        """Recorta lo escrito después del último meta.json válido"""
+        for name, size in self._expected_sizes().items():
+            path = self._file(name)
+            if not os.path.exists(path):
+                open(path, 'wb').close()
+            if os.path.getsize(path) != size:
+                os.truncate(path, size)
+
+    def _read_categories(self, col):
+        count = self.meta['categories'][col]
+        path = self._file(f"{col}.cats")
+        if not count:
+            open(path, 'w').close()
+            return []
+        with open(path, encoding='utf-8') as f:
+            cats = [json.loads(line) for _, line in zip(range(count), f)]
+        # Líneas de más (corte a mitad de un append): se reescribe solo lo válido
+        if os.path.getsize(path) != sum(len((json.dumps(c, ensure_ascii=False) + '\n').encode('utf-8')) for c in cats):
+            with open(path, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(c, ensure_ascii=False) + '\n' for c in cats)
+        return cats
+
+    def __len__(self):
+        return self.meta['rows']
+
+    # --- Escritura ---
+
+    def append(self, rows):
+        """Añade filas con el formato de ROW_FIELDS. Solo con el lock tomado (lo hace sync)"""
+        if not rows:
+            return
+        columns = dict(zip(ROW_FIELDS, zip(*rows)))
+
+        for col in CATEGORY_COLUMNS:
+            codes = self.codes[col]
+            added = []
+            values = []
+            for value in columns[col]:
+                value = value or ''
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(self.categories[col])
+                    self.categories[col].append(value)
+                    added.append(value)
+                values.append(code)
+            self._append_bytes(f"{col}.codes", np.asarray(values, dtype='int32').tobytes())
+            if added:
+                with open(self._file(f"{col}.cats"), 'a', encoding='utf-8') as f:
+                    f.writelines(json.dumps(c, ensure_ascii=False) + '\n' for c in added)
+
+        fixed = {
+            'position': columns['position'],
+            'duration': [-1 if d is None else round(d) for d in columns['duration']],
+            'not_found': columns['not_found'],
+            'key': row_keys(columns['source_file'], columns['query_key']),
+        }
+        for col, dtype in FIXED_COLUMNS.items():
+            self._append_bytes(f"{col}.bin", np.asarray(fixed[col], dtype=dtype).tobytes())
+
+        string_bytes = dict(self.meta['string_bytes'])
+        for col in STRING_COLUMNS:
+            encoded = [(v or '').replace('\0', '').encode('utf-8') + b'\0' for v in columns[col]]
+            ends = string_bytes[col] + np.cumsum([len(b) for b in encoded], dtype='int64')
+            self._append_bytes(f"{col}.data", b''.join(encoded))
+            self._append_bytes(f"{col}.offsets", ends.tobytes())
+            string_bytes[col] = int(ends[-1])
+
+        # Los datos ya están en disco: ahora se publican las filas nuevas
+        self.meta['rows'] += len(rows)
+        self.meta['string_bytes'] = string_bytes
+        self.meta['categories'] = {col: len(self.categories[col]) for col in CATEGORY_COLUMNS}
+        self._write_meta()
+
+    def _append_bytes(self, name, data):
+        with open(self._file(name), 'ab') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def sync(self, cache):
+        """Trae de la caché lo que ha cambiado desde la última vez (todo, si el almacén está vacío).
+        Si más de la mitad de las filas son versiones antiguas, se reconstruye desde cero"""
+        with self._locked():
+            # Otro proceso puede haber añadido filas desde que se abrió: se parte de su meta.json
+            self._open()
+            if self.meta['rows'] > 2 * len(self.latest()):
+                self._clear()
+            rows, seq = cache.library_rows(None if not self.meta['rows'] else self.meta['seq'])
+            self.append(rows)
+            self.meta['seq'] = seq
+            self._write_meta()
+            cache.trim_changes(seq)
+        return len(rows)
+
+    def clear(self):
+        with self._locked():
+            self._clear()
+
+    def _clear(self):
+        self._remove_files()
+        self._open()
+
+    # --- Lectura ---
+
+    def _map(self, name, dtype, count):
+        if not count:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._file(name), dtype=dtype, mode='r', shape=(count,))
+
+    def column(self, col):
+        """Columna completa (todas las versiones) mapeada en memoria, sin copiar"""
+        rows = self.meta['rows']
+        if col in FIXED_COLUMNS:
+            return self._map(f"{col}.bin", FIXED_COLUMNS[col], rows)
+        if col in CATEGORY_COLUMNS:
+            return pd.Categorical.from_codes(self._map(f"{col}.codes", 'int32', rows), self.categories[col])
+        if col in STRING_COLUMNS:
+            return self._strings(col, rows)
+        raise KeyError(col)
+
+    def _strings(self, col, rows, index=None):
+        if not rows:
+            return []
+        data = self._map(f"{col}.data", 'uint8', self.meta['string_bytes'][col])
+        values = data.tobytes().decode('utf-8').split('\0')[:-1]
+        if index is None:
+            return values
+        return np.array(values, dtype=object)[index]
+
+    def string(self, col, i):
+        """Un solo valor de texto sin decodificar la columna entera"""
+        ends = self._map(f"{col}.offsets", 'int64', self.meta['rows'])
+        start = int(ends[i - 1]) if i else 0
+        with open(self._file(f"{col}.data"), 'rb') as f:
+            f.seek(start)
+            return f.read(int(ends[i]) - start - 1).decode('utf-8')
+
+    def latest(self):
+        """Índices de la última versión de cada (playlist, canción), en orden de escritura"""
+        keys = self.column('key')
+        if not len(keys):
+            return np.empty(0, dtype='int64')
+        # np.unique sobre el array invertido da la primera aparición desde el final = la última versión
+        _, first_from_end = np.unique(keys[::-1], return_index=True)
+        return np.sort(len(keys) - 1 - first_from_end)
+
+    def load(self, columns=None, found_only=True):
+        """DataFrame con la última versión de cada fila, ordenado por playlist y posición.
+        Las categóricas se quedan como Categorical; el resto se copia solo para las filas elegidas"""
+        columns = columns or [c for c in ROW_FIELDS if c != 'query_key']
+        index = self.latest()
+        if found_only and len(index):
+            index = index[self.column('not_found')[index] == 0]
+
+        # Orden: playlist (alfabético) y posición dentro de ella
+        if len(index):
+            source = self.column('source_file')
+            source_rank = np.argsort(np.argsort(np.asarray(source.categories)))[source.codes[index]]
+            index = index[np.lexsort((self.column('position')[index], source_rank))]
+
+        data = {}
+        for col in columns:
+            if col in STRING_COLUMNS:
+                data[col] = self._strings(col, self.meta['rows'], index)
+            elif col in CATEGORY_COLUMNS:
+                data[col] = self.column(col)[index]
+            else:
+                data[col] = np.asarray(self.column(col)[index])
+        return pd.DataFrame(data)
+
+    def export_csvs(self, directory=EXPORT_RESULT_DIR):
+        """Regenera la vista CSV por playlist (mismo formato que escribe finder)"""
+        df = self.load(['source_file', 'artist', 'title', 'video_id', 'video_title', 'uploader', 'duration',
+                        'not_found'], found_only=False)
+        for source_file, group in df.groupby('source_file', observed=True, sort=False):
+            found = group['not_found'] == 0
+            out = pd.DataFrame({
+                RESULT_HEADER[0]: group['artist'].astype(str),
+                RESULT_HEADER[1]: group['title'],
+                RESULT_HEADER[2]: np.where(found, 'https://www.youtube.com/watch?v=' + group['video_id'], 'NOT FOUND'),
+                RESULT_HEADER[3]: group['video_title'].where(found, ''),
+                RESULT_HEADER[4]: group['uploader'].astype(str).where(found, ''),
+                RESULT_HEADER[5]: group['duration'].astype(object).where(found & (group['duration'] >= 0), ''),
+            })
+            out.to_csv(os.path.join(directory, f"{source_file}.csv"), index=False)
+        return df['source_file'].nunique()
+
+def row_keys(source_files, query_keys):
+    """Hash de 64 bits de (playlist, canción) para deduplicar versiones sin comparar strings"""
+    joined = np.array([f"{s}\x1f{k}" for s, k in zip(source_files, query_keys)], dtype=object)
+    return pd.util.hash_array(joined)
+
+if __name__ == '__main__':
+    # Regenera el almacén desde la caché y vuelca la vista CSV
+    from cache import ResultCache
+    from config import ensure_dirs
+
+    ensure_dirs()
+    cache = ResultCache()
+    store = ColumnStore()
+    print(f"🗃️ {store.sync(cache)} filas nuevas en el almacén columnar ({len(store)} en total)")
+    print(f"📄 {store.export_csvs()} CSV de playlist regenerados en {EXPORT_RESULT_DIR}")
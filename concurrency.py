@@ -0,0 +1,290 @@
+import os
+import time
+import multiprocessing
+from contextlib import contextmanager
+from threading import Event, Thread
+
+from logqueue import get_logger
+from metrics import incr
+from config import (DOWNLOAD_WORKERS_MIN, DOWNLOAD_WORKERS_INITIAL, DOWNLOAD_WORKERS_MAX, TRANSCODE_WORKERS_MIN,
+                    TRANSCODE_CONCURRENCY, CONTROL_SECONDS, CONTROL_PATIENCE, CONTROL_MIN_GAIN, CONTROL_HOLD,
+                    CONTROL_COOLDOWN_SECONDS, CPU_HIGH, CPU_LOW, DISK_QUEUE_HIGH)
+
+# concurrency.py
+# Concurrencia adaptativa de descargas y conversiones. Se lanzan tantos workers como el máximo, pero solo
+# trabajan a la vez los que permite Gate (plazas en memoria compartida, como el limitador); el resto
+# espera plaza. Controller mide cada CONTROL_SECONDS el ritmo de tareas, los 429 del limitador, la CPU
+# y la cola del disco, y mueve las plazas de uno en uno:
+#   - descargas: sube mientras cada paso mejore el ritmo al menos CONTROL_MIN_GAIN y baja mientras no lo
+#     empeore; si un paso falla, vuelve al nivel anterior y espera CONTROL_HOLD ventanas (el doble tras
+#     cada fallo seguido) antes de probar en el otro sentido. Un 429 recorta a la mitad y deja un techo
+#     por debajo del nivel que lo provocó durante CONTROL_COOLDOWN_SECONDS (más largo si se repite), así
+#     que las subidas siguientes se quedan antes del límite en lugar de volver a chocar con él.
+#   - conversiones: baja con la CPU por encima de CPU_HIGH y sube por debajo de CPU_LOW si hay cola.
+# Las decisiones tienen que repetirse CONTROL_PATIENCE ventanas seguidas (histéresis), salvo los 429.
+
+DOWNLOAD, TRANSCODE = range(2)
+POOL_NAMES = ('Descargas', 'Conversiones')
+BOUNDS = {
+    DOWNLOAD: (DOWNLOAD_WORKERS_MIN, DOWNLOAD_WORKERS_MAX),
+    TRANSCODE: (TRANSCODE_WORKERS_MIN, TRANSCODE_CONCURRENCY),
+}
+
+# Posiciones por pool en el array compartido
+LIMIT, ACTIVE, DONE = range(3)
+GATE_POLL_SECONDS = 0.2
+
+class Gate:
+    """Plazas activas por pool. Se pasa a los Process como argumento (memoria compartida)"""
+
+    def __init__(self, download=DOWNLOAD_WORKERS_INITIAL, transcode=TRANSCODE_CONCURRENCY):
+        self.lock = multiprocessing.Lock()
+        self.state = multiprocessing.RawArray('d', 3 * len(POOL_NAMES))
+        self.state[DOWNLOAD * 3 + LIMIT] = download
+        self.state[TRANSCODE * 3 + LIMIT] = transcode
+
+    def enter(self, pool):
+        base = pool * 3
+        while True:
+            with self.lock:
+                if self.state[base + ACTIVE] < self.state[base + LIMIT]:
+                    self.state[base + ACTIVE] += 1
+                    return
+            time.sleep(GATE_POLL_SECONDS)
+
+    def leave(self, pool):
+        with self.lock:
+            self.state[pool * 3 + ACTIVE] -= 1
+
+    def done(self, pool):
+        """Cuenta una tarea hecha de verdad (descarga o conversión terminada) para el ritmo del controlador.
+        No cuenta al salir de slot(): los saltos ("ya existe") y enlaces del almacén son instantáneos y
+        harían que el ritmo midiera cuántos se saltan, no cuánto se descarga"""
+        with self.lock:
+            self.state[pool * 3 + DONE] += 1
+
+    @contextmanager
+    def slot(self, pool):
+        """Espera plaza en el pool y la ocupa durante el bloque (una tarea)"""
+        self.enter(pool)
+        try:
+            yield
+        finally:
+            self.leave(pool)
+
+    def limit(self, pool):
+        return int(self.state[pool * 3 + LIMIT])
+
+    def set_limit(self, pool, n):
+        with self.lock:
+            self.state[pool * 3 + LIMIT] = n
+
+    def counts(self, pool):
+        """(activas, tareas hechas desde el inicio, ver done())"""
+        with self.lock:
+            return int(self.state[pool * 3 + ACTIVE]), int(self.state[pool * 3 + DONE])
+
+# --- Señales del sistema (None si no se pueden leer en esta plataforma) ---
+
+def cpu_times():
+    """(ocupado, total) acumulados de /proc/stat"""
+    try:
+        with open('/proc/stat') as f:
+            fields = [int(x) for x in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)  # idle + iowait
+    return sum(fields) - idle, sum(fields)
+
+def disk_weighted_ms():
+    """Tiempo ponderado en cola (ms) acumulado de los discos de /proc/diskstats. Su incremento entre dos
+    lecturas dividido por el tiempo transcurrido es la profundidad media de la cola"""
+    try:
+        with open('/proc/diskstats') as f:
+            rows = [line.split() for line in f]
+    except OSError:
+        return None
+    return sum(int(row[13]) for row in rows
+               if len(row) > 13 and os.path.exists(f"/sys/block/{row[2]}")
+               and not row[2].startswith(('loop', 'ram', 'zram')))
+
+class Controller:
+    """Ajusta las plazas de gate cada CONTROL_SECONDS. backlog(): tareas esperando conversión, o None"""
+
+    def __init__(self, gate, limiter, backlog=None, interval=CONTROL_SECONDS):
+        self.gate = gate
+        self.limiter = limiter
+        self.backlog = backlog
+        self.interval = interval
+        self.stop_event = Event()
+        self.thread = None
+        self.last = None
+        self.votes = {pool: [] for pool in BOUNDS}
+        # Búsqueda del nivel de descargas
+        self.window = []        # ritmos medidos desde el último cambio
+        self.probe = None       # (nivel anterior, su ritmo) mientras se prueba un paso
+        self.direction = 1
+        self.hold = 0           # ventanas que faltan para volver a probar
+        self.fails = 0          # pruebas fallidas seguidas
+        # Techo por 429: no se pasa de él hasta ceiling_until; cada 429 alarga la espera siguiente
+        self.ceiling = DOWNLOAD_WORKERS_MAX
+        self.ceiling_until = 0.0
+        self.cooldown = CONTROL_COOLDOWN_SECONDS
+
+    # --- Medida ---
+
+    def read(self):
+        return {
+            'time': time.monotonic(),
+            'counts': {pool: self.gate.counts(pool) for pool in BOUNDS},
+            'rate_limited': self.limiter.snapshot()['rate_limited_events'] if self.limiter else 0,
+            'cpu': cpu_times(),
+            'disk': disk_weighted_ms(),
+        }
+
+    def sample(self):
+        """Señales de la última ventana"""
+        cur, prev = self.read(), self.last
+        self.last = cur
+        if prev is None:
+            return None
+        dt = max(1e-6, cur['time'] - prev['time'])
+        cpu = None
+        if cur['cpu'] and prev['cpu'] and cur['cpu'][1] > prev['cpu'][1]:
+            cpu = (cur['cpu'][0] - prev['cpu'][0]) / (cur['cpu'][1] - prev['cpu'][1])
+        elif hasattr(os, 'getloadavg'):
+            cpu = os.getloadavg()[0] / (os.cpu_count() or 1)
+        try:
+            backlog = self.backlog() if self.backlog else None
+        except NotImplementedError:  # Queue.qsize en macOS
+            backlog = None
+        return {
+            'now': time.time(),
+            'throughput': {pool: (cur['counts'][pool][1] - prev['counts'][pool][1]) / dt for pool in BOUNDS},
+            'busy': {pool: cur['counts'][pool][0] >= self.gate.limit(pool) for pool in BOUNDS},
+            'rate_limited': cur['rate_limited'] - prev['rate_limited'],
+            'backoff': self.limiter.snapshot()['backoff_remaining'] if self.limiter else 0.0,
+            'cpu': cpu,
+            'disk': (cur['disk'] - prev['disk']) / (dt * 1000) if cur['disk'] is not None and prev['disk'] is not None else None,
+            'backlog': backlog,
+        }
+
+    # --- Decisión ---
+
+    def change(self, pool, n, reason):
+        low, high = BOUNDS[pool]
+        n = max(low, min(high, n))
+        old = self.gate.limit(pool)
+        if pool == DOWNLOAD:
+            self.window = []
+        self.votes[pool] = []
+        if n == old:
+            return
+        self.gate.set_limit(pool, n)
+        incr('concurrency_change')
+        get_logger().info(f"⚙️ {POOL_NAMES[pool]}: {old} → {n} ({reason})")
+
+    def vote(self, pool, direction):
+        """Histéresis: True cuando la misma decisión se ha repetido CONTROL_PATIENCE ventanas seguidas"""
+        votes = self.votes[pool]
+        if votes and votes[-1] != direction:
+            votes.clear()
+        votes.append(direction)
+        return len(votes) >= CONTROL_PATIENCE
+
+    def climb(self, throughput, limit, high):
+        """Búsqueda del nivel de descargas de uno en uno: hacia arriba mientras el ritmo mejore y hacia abajo
+        mientras no empeore (el mismo ritmo con menos conexiones está más lejos de los 429)"""
+        self.window.append(throughput)
+        if len(self.window) < CONTROL_PATIENCE:
+            return
+        rate = sum(self.window) / len(self.window)
+        if self.probe is not None:
+            before, before_rate = self.probe
+            self.probe = None
+            up = limit > before
+            if rate < before_rate * (1 + CONTROL_MIN_GAIN if up else 1 - CONTROL_MIN_GAIN):
+                # Vuelta atrás; cada prueba fallida seguida duplica la espera hasta la siguiente
+                self.hold = CONTROL_HOLD * 2 ** min(self.fails, 3)
+                self.fails += 1
+                self.direction = -1 if up else 1
+                return self.change(DOWNLOAD, before, f"con {limit} {'no mejora' if up else 'empeora'}: "
+                                                     f"{rate:.2f} frente a {before_rate:.2f} tareas/s")
+            self.fails = 0
+        if self.hold:
+            self.hold -= 1
+            self.window = []
+            return
+        if not DOWNLOAD_WORKERS_MIN <= limit + self.direction <= high:
+            self.direction = -self.direction
+        if DOWNLOAD_WORKERS_MIN <= limit + self.direction <= high:
+            self.probe = (limit, rate)
+            self.change(DOWNLOAD, limit + self.direction, f"probando: {rate:.2f} tareas/s")
+        else:
+            self.window = []
+
+    def step(self, sample):
+        """Aplica una muestra de sample() a los límites de gate"""
+        now = sample['now']
+
+        # Descargas
+        limit = self.gate.limit(DOWNLOAD)
+        if sample['rate_limited']:
+            if self.ceiling < DOWNLOAD_WORKERS_MAX:
+                self.cooldown = min(self.cooldown * 2, CONTROL_COOLDOWN_SECONDS * 8)
+            self.ceiling = max(DOWNLOAD_WORKERS_MIN, limit - 1)
+            self.ceiling_until = now + self.cooldown
+            self.probe, self.hold, self.direction = None, 0, 1
+            self.change(DOWNLOAD, min(limit // 2, self.ceiling), f"{sample['rate_limited']} rate limit")
+        elif self.ceiling < DOWNLOAD_WORKERS_MAX and now >= self.ceiling_until:
+            # Sin 429 durante el enfriamiento: el techo sube un nivel y se vuelve a probar con cuidado
+            self.ceiling += 1
+            self.ceiling_until = now + self.cooldown
+        if not sample['rate_limited']:
+            disk_full = sample['disk'] is not None and sample['disk'] > DISK_QUEUE_HIGH
+            if disk_full or limit > self.ceiling:
+                if self.vote(DOWNLOAD, -1):
+                    self.probe = None
+                    self.change(DOWNLOAD, limit - 1, f"cola de disco {sample['disk']:.1f}" if disk_full else "techo por 429")
+            elif sample['backoff'] > 0 or not sample['busy'][DOWNLOAD]:
+                # En espera por un 429 o con workers libres: medir ahora no dice nada del nivel
+                self.window = []
+            else:
+                self.votes[DOWNLOAD] = []
+                self.climb(sample['throughput'][DOWNLOAD], limit, min(DOWNLOAD_WORKERS_MAX, self.ceiling))
+
+        # Conversiones: manda la CPU (ffmpeg)
+        cpu, limit = sample['cpu'], self.gate.limit(TRANSCODE)
+        if cpu is None:
+            return
+        if cpu > CPU_HIGH and limit > TRANSCODE_WORKERS_MIN:
+            if self.vote(TRANSCODE, -1):
+                self.change(TRANSCODE, limit - 1, f"CPU al {cpu:.0%}")
+        elif cpu < CPU_LOW and sample['busy'][TRANSCODE] and sample['backlog'] != 0 and limit < TRANSCODE_CONCURRENCY:
+            # Sin medida de la cola (backlog None) basta con que todas las plazas estén ocupadas
+            if self.vote(TRANSCODE, 1):
+                self.change(TRANSCODE, limit + 1, f"CPU al {cpu:.0%}")
+        else:
+            self.votes[TRANSCODE] = []
+
+    # --- Bucle ---
+
+    def run(self):
+        self.sample()
+        while not self.stop_event.wait(self.interval):
+            sample = self.sample()
+            if sample:
+                self.step(sample)
+
+    def start(self):
+        self.thread = Thread(target=self.run, daemon=True, name='concurrency')
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+    def gauges(self):
+        return {'download_workers': self.gate.limit(DOWNLOAD), 'transcode_workers': self.gate.limit(TRANSCODE)}
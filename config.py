@@ -1,4 +1,3 @@
-import stem, stem.control
 import os
 
 # config.py
@@ -13,10 +12,114 @@ EXPORT_DIR = "exportify"
 EXPORT_RESULT_DIR = "exports"
 DOWNLOADS_DIR = 'downloads'
 LOGS_DIR = 'logs'
+CACHE_DIR = 'cache'
+CACHE_DB = os.path.join(CACHE_DIR, 'results.sqlite3')
+MANIFEST_DB = os.path.join(CACHE_DIR, 'manifest.sqlite3')
+QUEUE_DB = os.path.join(CACHE_DIR, 'queue.sqlite3')
+# Almacén columnar de la biblioteca resuelta (derivado de CACHE_DB, ver columnar.py)
+COLUMNS_DIR = os.path.join(CACHE_DIR, 'results.columns')
 FFMPEG_PATH = r"/usr/bin/ffmpeg"
+# ffprobe junto a ffmpeg (ffmpeg.exe -> ffprobe.exe en Windows)
+FFPROBE_PATH = os.path.join(os.path.dirname(FFMPEG_PATH), os.path.basename(FFMPEG_PATH).replace("ffmpeg", "ffprobe"))
 
 DEBUG_MODE = False
 
+# Número de búsquedas simultáneas en finder (cada una con su propio YoutubeDL)
+SEARCH_CONCURRENCY = 8
+
+# Segundos tras los que un NOT FOUND cacheado se vuelve a buscar
+NOT_FOUND_TTL = 7 * 24 * 3600
+
+# Escribir también los CSV por playlist en exports/. Son una vista: la fuente es la caché y
+# `python columnar.py` los regenera
+RESULT_CSV_EXPORT = True
+
+# Durabilidad de los CSV de resultados: 'row' (fsync por fila), 'batch' (cada WRITE_BATCH_ROWS filas),
+# 'interval' (cada WRITE_INTERVAL_MS ms) o 'shutdown' (solo al cerrar)
+WRITE_DURABILITY = 'batch'
+WRITE_BATCH_ROWS = 50
+WRITE_INTERVAL_MS = 1000
+
+# Limitador de peticiones compartido (peticiones/s) con subida aditiva y bajada a la mitad en cada 429
+RATE_LIMIT_INITIAL = 5.0
+RATE_LIMIT_MIN = 0.2
+RATE_LIMIT_MAX = 20.0
+RATE_LIMIT_INCREASE = 0.1
+# Espera tras un 429: exponencial desde BASE hasta MAX segundos, con jitter
+RATE_LIMIT_BACKOFF_BASE = 5
+RATE_LIMIT_BACKOFF_MAX = 120
+
+# Conversión tras la descarga: 'mp3' (recodifica a MP3_BITRATE) o 'passthrough' (mantiene opus/m4a nativo)
+TRANSCODE_MODE = 'mp3'
+MP3_BITRATE = '192k'
+# Procesos de conversión (CPU), independientes del número de descargas simultáneas (red). Es el máximo:
+# concurrency.py baja los activos si ffmpeg satura la CPU
+TRANSCODE_CONCURRENCY = os.cpu_count() or 1
+TRANSCODE_WORKERS_MIN = 1
+
+# Concurrencia adaptativa (concurrency.py): descargas activas entre MIN y MAX, empezando en INITIAL
+DOWNLOAD_WORKERS_MIN = 1
+DOWNLOAD_WORKERS_INITIAL = 5
+DOWNLOAD_WORKERS_MAX = 10
+CONTROL_SECONDS = 5             # ventana de medida entre ajustes
+CONTROL_PATIENCE = 2            # ventanas seguidas que tiene que repetirse una decisión (histéresis)
+CONTROL_MIN_GAIN = 0.05         # mejora mínima del ritmo para dar por bueno un paso hacia arriba
+CONTROL_HOLD = 6                # ventanas sin volver a subir tras un paso que no mejoró
+CONTROL_COOLDOWN_SECONDS = 300  # tiempo sin pasar del nivel que provocó un 429
+CPU_HIGH = 0.90                 # por encima, menos conversiones a la vez
+CPU_LOW = 0.70                  # por debajo (y con cola), más
+DISK_QUEUE_HIGH = 8.0           # profundidad media de la cola del disco a partir de la que se baja
+
+# Verificación de la biblioteca (cli.py verify)
+VERIFY_CONCURRENCY = os.cpu_count() or 1    # procesos decodificando a la vez
+VERIFY_REPORT = os.path.join(LOGS_DIR, 'verify.jsonl')
+VERIFY_REPAIR_PRIORITY = 1000               # las reparaciones salen de la cola antes que el resto
+
+# Almacén de pistas por id de vídeo: una descarga por vídeo, enlazada (hardlink) en cada playlist
+STORE_DIR = os.path.join(DOWNLOADS_DIR, '.store')
+# Descargas en bruto: solo la conversión terminada deja <id>.<ext> en STORE_DIR
+INCOMING_DIR = os.path.join(STORE_DIR, '.incoming')
+# True: copia por playlist con su propio álbum en los metadatos (más disco). False: un único fichero enlazado
+STORE_PER_PLAYLIST_TAGS = False
+
+# Descargas por tramos (HTTP Range) en paralelo; 1 = una sola conexión como yt_dlp
+DOWNLOAD_SEGMENTS = 4
+SEGMENT_MIN_BYTES = 512 * 1024   # no se parten ficheros en tramos más pequeños que esto
+SEGMENT_STATE_BYTES = 256 * 1024  # cada cuánto se guarda el progreso para poder reanudar
+
+# Cola persistente de descargas: segundos que un worker retiene una tarea y reintentos antes de darla por fallida
+QUEUE_LEASE_SECONDS = 600
+QUEUE_MAX_ATTEMPTS = 3
+
+# Métricas: eventos JSONL por etapa/contador y snapshot en formato textfile de Prometheus
+METRICS_ENABLED = True
+METRICS_EVENTS = os.path.join(LOGS_DIR, 'metrics.jsonl')
+METRICS_PROM = os.path.join(LOGS_DIR, 'spotify_dl.prom')
+METRICS_FLUSH_EVENTS = 200  # eventos acumulados por proceso antes de escribir
+METRICS_SNAPSHOT_SECONDS = 10
+
+# Logs: todos los procesos mandan los registros por una cola a un único listener (logqueue.py)
+LOG_CONSOLE_RATE = 20       # líneas por segundo como mucho en consola; el resto solo va a los ficheros
+LOG_FLUSH_SECONDS = 1       # los ficheros de log se escriben por lotes, como mucho con este retraso
+LOG_MAX_OPEN_FILES = 64     # ficheros por playlist abiertos a la vez
+
+# Tamaño de las colas entre etapas del pipeline búsqueda -> descarga -> metadatos
+PIPELINE_QUEUE_SIZE = 32
+
+# Cada cuánto se revisa exportify/ en modo vigilancia (finder, opción 'w')
+INPUT_WATCH_SECONDS = 30
+# Filas por bloque al leer exports y al recorrer las pendientes: la memoria depende de esto, no del tamaño de la biblioteca
+INPUT_CHUNK_ROWS = 5000
+
+# Modo servicio (daemon.py): API HTTP local y cuántos trabajos terminados se recuerdan
+DAEMON_HOST = '127.0.0.1'
+DAEMON_PORT = 8765
+DAEMON_JOB_HISTORY = 100
+
+# Búsqueda escalonada: primero pocos resultados y, solo si ninguno es aceptable, más
+SEARCH_WIDTHS = (3, 10)
+DURATION_TOLERANCE = 3  # segundos de diferencia admitidos con la duración de Spotify
+
 # --- yt_dlp settings ---
 ydl_opts = {
     'quiet': True,
@@ -33,11 +136,17 @@ if DEBUG_MODE:
         ydl_opts['verbose'] = True
 
 def renew_tor_ip():
+    # Import diferido: stem solo hace falta con USE_TORSOCKS
+    import stem
+    import stem.control
     with stem.control.Controller.from_port(port=9051) as controller:
         controller.authenticate()
         controller.signal(stem.Signal.NEWNYM)
         
 # --- Configuración de carpetas ---
-os.makedirs(EXPORT_RESULT_DIR, exist_ok=True)
-os.makedirs(EXPORT_DIR, exist_ok=True)
-os.makedirs(LOGS_DIR, exist_ok=True)
+# No se crean al importar: cada punto de entrada llama a ensure_dirs() antes de trabajar
+def ensure_dirs():
+    os.makedirs(EXPORT_RESULT_DIR, exist_ok=True)
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    os.makedirs(LOGS_DIR, exist_ok=True)
+    os.makedirs(CACHE_DIR, exist_ok=True)
@@ -0,0 +1,306 @@
+import os
+import json
+import itertools
+import traceback
+from collections import deque
+from queue import Queue
+from threading import Thread, Lock
+from time import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.request import Request, urlopen
+
+from cache import ResultCache, make_key, video_link, video_id_from_link
+from columnar import ColumnStore
+from concurrency import DOWNLOAD, TRANSCODE, Controller, Gate
+from inputs import InputIndex
+from finder import new_ydl_pool, normalize_export, process
+from download_v2 import (WarmDownloader, already_valid, download_opts, fetch_task, group_by_video,
+                         link_task, pascal_to_title_case, transcode_task)
+from logqueue import get_logger
+from metrics import incr, write_snapshot
+from ratelimit import get_limiter
+from store import stored_path
+from config import ensure_dirs, DAEMON_HOST, DAEMON_PORT, DAEMON_JOB_HISTORY, DOWNLOADS_DIR, DOWNLOAD_WORKERS_MAX, EXPORT_DIR, \
+    EXPORT_RESULT_DIR, INCOMING_DIR, TRANSCODE_CONCURRENCY
+
+# daemon.py
+# Modo servicio: un proceso que se queda en marcha con todo caliente (caché SQLite abierta, índice de
+# exports, almacén columnar, instancias de YoutubeDL para buscar y para descargar, pools de hilos) y
+# recibe trabajos por una API HTTP local. Los trabajos se ejecutan de uno en uno, en orden de llegada.
+#
+#   python daemon.py                                   -> arranca el servicio en DAEMON_HOST:DAEMON_PORT
+#   POST /resolve   {"playlist": "MiPlaylist", "download": true}   (sin playlist = todas)
+#   POST /download  {"playlist": "MiPlaylist"}
+#   GET  /status    |  GET /jobs/<id>  |  POST /shutdown
+
+class Job:
+    _ids = itertools.count(1)
+
+    def __init__(self, kind, params):
+        self.id = next(self._ids)
+        self.kind = kind
+        self.params = params
+        self.state = 'queued'
+        self.submitted = time()
+        self.started = self.finished = None
+        self.progress = {}
+        self.error = None
+        self.lock = Lock()
+
+    def count(self, key, n=1):
+        with self.lock:
+            self.progress[key] = self.progress.get(key, 0) + n
+
+    def to_dict(self):
+        with self.lock:
+            progress = dict(self.progress)
+        return {
+            'id': self.id, 'kind': self.kind, 'params': self.params, 'state': self.state,
+            'submitted': self.submitted, 'started': self.started, 'finished': self.finished,
+            'progress': progress, 'error': self.error,
+        }
+
+class Daemon:
+    def __init__(self):
+        self.cache = ResultCache()
+        self.index = InputIndex(self.cache)
+        self.library = ColumnStore()
+        os.makedirs(INCOMING_DIR, exist_ok=True)
+
+        # Instancias calientes: YoutubeDL de búsqueda y descargadores, reutilizados entre trabajos
+        self.ydl_pool = new_ydl_pool()
+        self.downloaders = Queue()
+        for _ in range(DOWNLOAD_WORKERS_MAX):
+            self.downloaders.put(WarmDownloader(download_opts()))
+        # Pools al máximo; el controlador decide cuántos hilos descargan o convierten a la vez
+        self.download_pool = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS_MAX, thread_name_prefix='download')
+        self.transcode_pool = ThreadPoolExecutor(max_workers=TRANSCODE_CONCURRENCY, thread_name_prefix='transcode')
+        self.gate = Gate()
+        self.controller = Controller(self.gate, get_limiter()).start()
+
+        self.jobs = {}
+        self.history = deque(maxlen=DAEMON_JOB_HISTORY)
+        self.lock = Lock()
+        self.queue = Queue()
+        self.runner = Thread(target=self._run_jobs, daemon=True)
+        self.runner.start()
+
+    # --- Trabajos ---
+
+    def submit(self, kind, params):
+        if kind not in ('resolve', 'download'):
+            raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+        job = Job(kind, params)
+        with self.lock:
+            self.jobs[job.id] = job
+            if len(self.history) == self.history.maxlen:
+                self.jobs.pop(self.history[0], None)
+            self.history.append(job.id)
+        self.queue.put(job)
+        return job
+
+    def _run_jobs(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            job.state = 'running'
+            job.started = time()
+            try:
+                if job.kind == 'resolve':
+                    self.resolve(job)
+                    if job.params.get('download'):
+                        self.download(job)
+                else:
+                    self.download(job)
+                job.state = 'done'
+            except Exception as e:
+                job.state = 'failed'
+                job.error = f"{e}\n{traceback.format_exc()}"
+            job.finished = time()
+            write_snapshot(gauges={'rate_limit_current': get_limiter().current_rate(), **self.controller.gauges()})
+
+    def resolve(self, job):
+        """Busca las canciones pendientes de una playlist (o de todas) en exportify/"""
+        changes = self.index.sync(EXPORT_DIR, normalize_export)
+        playlist = job.params.get('playlist')
+        total = self.index.pending_total(playlist)
+        with job.lock:
+            job.progress.update({'changed_files': len(changes), 'to_resolve': total})
+        if total:
+            process(self.index.iter_pending(playlist), self.cache, name_override='daemon', ydl_pool=self.ydl_pool,
+                    total=total)
+
+    def download(self, job):
+        """Descarga lo resuelto de una playlist (o de todas) con los descargadores calientes"""
+        self.cache.sync_csvs(EXPORT_RESULT_DIR)
+        self.library.sync(self.cache)
+        df = self.library.load(['source_file', 'artist', 'title', 'video_id', 'video_title', 'duration'])
+        playlist = job.params.get('playlist')
+        if playlist:
+            df = df[df['source_file'] == playlist]
+
+        tags = self.index.tags()
+        tasks = []
+        for source_file, artist, title, video_id, video_title, duration in zip(
+                df['source_file'], df['artist'], df['title'], df['video_id'], df['video_title'], df['duration']):
+            outdir = os.path.join(DOWNLOADS_DIR, pascal_to_title_case(source_file))
+            tasks.append((artist, title, video_link(video_id), video_title or title,
+                          None if duration < 0 else int(duration), outdir,
+                          tags.get((source_file, make_key(artist, title)), {})))
+        for outdir in {task[5] for task in tasks}:
+            os.makedirs(outdir, exist_ok=True)
+
+        groups = group_by_video(tasks)
+        with job.lock:
+            job.progress.update({'videos': len(groups), 'skipped': 0, 'linked': 0, 'downloaded': 0, 'failed': 0})
+
+        # Las descargas devuelven, si hace falta convertir, el Future de la conversión
+        downloads = [self.download_pool.submit(self._download_group, group, job) for group in groups]
+        wait(downloads)
+        # Un vídeo que falla cuenta como fallido y el trabajo sigue: las conversiones ya lanzadas se esperan
+        transcodes = []
+        for f in downloads:
+            try:
+                result = f.result()
+            except Exception as e:
+                get_logger().error(f"❌ Error descargando: {e}")
+                job.count('failed')
+                continue
+            if isinstance(result, Future):
+                transcodes.append(result)
+        for f in transcodes:
+            try:
+                ok, _ = f.result()
+            except Exception as e:
+                get_logger().error(f"❌ Error convirtiendo: {e}")
+                ok = False
+            job.count('downloaded' if ok else 'failed')
+
+    def _download_group(self, group, job):
+        pending = [task for task in group if not already_valid(task[5], task[3], task[4])]
+        if not pending:
+            incr('skip')
+            job.count('skipped')
+            return None
+
+        stored = stored_path(video_id_from_link(pending[0][2]))
+        if stored:
+            link_task(pending, stored)
+            job.count('linked')
+            return None
+
+        downloader = self.downloaders.get()
+        try:
+            with self.gate.slot(DOWNLOAD):
+                src, _ = fetch_task(downloader, pending[0])
+        finally:
+            self.downloaders.put(downloader)
+        if src is None:
+            job.count('failed')
+            return None
+        self.gate.done(DOWNLOAD)
+        return self.transcode_pool.submit(self._transcode, pending, src)
+
+    def _transcode(self, tasks, src):
+        with self.gate.slot(TRANSCODE):
+            ok, msg = transcode_task(tasks, src)
+        if ok:
+            self.gate.done(TRANSCODE)
+        return ok, msg
+
+    # --- Estado ---
+
+    def status(self):
+        with self.lock:
+            jobs = [self.jobs[i].to_dict() for i in self.history]
+        return {
+            'queued': sum(job['state'] == 'queued' for job in jobs),
+            'running': [job['id'] for job in jobs if job['state'] == 'running'],
+            'jobs': jobs,
+            'limiter': get_limiter().snapshot(),
+            'workers': self.controller.gauges(),
+            'library_rows': len(self.library),
+        }
+
+    def job(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+        return job.to_dict() if job else None
+
+    def close(self):
+        self.queue.put(None)
+        self.runner.join()
+        self.controller.stop()
+        self.download_pool.shutdown()
+        self.transcode_pool.shutdown()
+        while not self.downloaders.empty():
+            self.downloaders.get_nowait().reset()
+        while not self.ydl_pool.empty():
+            self.ydl_pool.get_nowait().close()
+        self.cache.close()
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        daemon = self.server.service
+        if self.path == '/status':
+            return self.reply(200, daemon.status())
+        if self.path.startswith('/jobs/'):
+            job = daemon.job(int(self.path.rsplit('/', 1)[1])) if self.path.rsplit('/', 1)[1].isdigit() else None
+            return self.reply(200, job) if job else self.reply(404, {'error': 'trabajo no encontrado'})
+        self.reply(404, {'error': 'ruta desconocida'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            params = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self.reply(400, {'error': 'JSON no válido'})
+
+        if self.path == '/shutdown':
+            self.reply(200, {'ok': True})
+            Thread(target=self.server.shutdown).start()
+            return
+        try:
+            job = self.server.service.submit(self.path.strip('/'), params)
+        except ValueError as e:
+            return self.reply(404, {'error': str(e)})
+        self.reply(202, job.to_dict())
+
+    def reply(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def serve(host=DAEMON_HOST, port=DAEMON_PORT):
+    ensure_dirs()
+    daemon = Daemon()
+    server = ThreadingHTTPServer((host, port), DaemonHandler)
+    server.service = daemon
+    print(f"🛰️ Servicio escuchando en http://{host}:{port} (Ctrl+C para salir)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.close()
+        print("👋 Servicio detenido.")
+
+def call(method, path, body=None, host=DAEMON_HOST, port=DAEMON_PORT):
+    """Cliente mínimo de la API (para scripts)"""
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = Request(f"http://{host}:{port}{path}", data=data, method=method,
+                  headers={'Content-Type': 'application/json'})
+    with urlopen(req) as resp:
+        return json.loads(resp.read())
+
+if __name__ == '__main__':
+    serve()
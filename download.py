@@ -1,69 +1,34 @@
 import os
-import sys
-import pandas as pd
 from yt_dlp import YoutubeDL
-import subprocess
-from multiprocessing import Process
+from multiprocessing import Process, Queue
 from datetime import datetime
-from mutagen.easyid3 import EasyID3
-from mutagen.mp3 import MP3
-import time
-
-from config import USE_TORSOCKS, TOR_PROXY, FFMPEG_PATH, LOGS_DIR, EXPORT_RESULT_DIR, renew_tor_ip
-
-def set_mp3_metadata(filepath, title, artist, album):
-    try:
-        audio = MP3(filepath, ID3=EasyID3)
-        audio['title'] = title
-        audio['artist'] = artist
-        audio['album'] = album
-        audio.save()
-        return True
-    except Exception as e:
-        print(f"⚠️ No se pudieron asignar metadatos a {filepath}: {e}")
-        return False
-
-# === Logging duplicado (consola + archivo) ===
-class Tee:
-    def __init__(self, logfile_path):
-        self.terminal = sys.stdout
-        self.log = open(logfile_path, "a", encoding="utf-8")
-
-    def write(self, message):
-        self.terminal.write(message)
-        self.log.write(message)
-
-    def flush(self):
-        self.terminal.flush()
-        self.log.flush()
-
-# === Obtener duración real de archivo MP3 ===
-def get_audio_duration(path):
-    try:
-        result = subprocess.run([
-            FFMPEG_PATH.replace("ffmpeg.exe", "ffprobe.exe"),
-            '-v', 'error', '-show_entries',
-            'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1',
-            path
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        return float(result.stdout.strip())
-    except:
-        return None
+
+from cache import ResultCache, make_key, video_link
+from concurrency import DOWNLOAD, Controller, Gate
+from inputs import InputIndex
+from logqueue import YdlLogger, attach, get_logger, log_queue
+from media import get_audio_duration
+from ratelimit import get_limiter, set_limiter
+from transcode import metadata_args, output_path
+from config import ensure_dirs, DOWNLOAD_WORKERS_MAX, DURATION_TOLERANCE, USE_TORSOCKS, TOR_PROXY, FFMPEG_PATH, EXPORT_RESULT_DIR
+
+# Opciones de FFmpegExtractAudio; las etiquetas de cada pista se añaden aquí para escribirlas al convertir
+POSTPROCESSOR_ARGS = ['-ar', '44100', '-ac', '2']
 
 # === Función principal para un CSV ===
-def process_csv(file_name, max_retries=3):
+def process_csv(file_name, gate, max_retries=3):
     name_without_ext = os.path.splitext(file_name)[0]
     download_path = os.path.join(EXPORT_RESULT_DIR, name_without_ext)
     os.makedirs(download_path, exist_ok=True)
 
-    # Redirigir consola a log
-    log_path = os.path.join(LOGS_DIR, f"{name_without_ext}.log")
-    sys.stdout = Tee(log_path)
-    sys.stderr = sys.stdout  # Capturar también errores
+    # Consola y logs/<playlist>.log a través del listener del proceso principal
+    log = get_logger(name_without_ext)
 
-    # Leer CSV
-    df = pd.read_csv(os.path.join(export_dir, file_name))
-    df_valid = df[df['YouTube Link'].notna() & (df['YouTube Link'] != 'NOT FOUND')]
+    # Leer resultados de la caché (cada proceso abre su propia conexión)
+    cache = ResultCache()
+    results = cache.playlist_results(name_without_ext)
+    tags = InputIndex(cache).tags(name_without_ext)
+    cache.close()
 
     ydl_opts = {
         'format': 'bestaudio/best',
@@ -73,78 +38,77 @@ def process_csv(file_name, max_retries=3):
             'preferredcodec': 'mp3',
             'preferredquality': '192',
         }],
-        'postprocessor_args': ['-ar', '44100', '-ac', '2'],
+        'postprocessor_args': POSTPROCESSOR_ARGS,
         'prefer_ffmpeg': True,
         'ffmpeg_location': FFMPEG_PATH,
         'quiet': False,
         'no_warnings': True,
+        'logger': YdlLogger(log),
     }
     
     if USE_TORSOCKS:
         ydl_opts['proxy'] = TOR_PROXY
 
-    print(f"\n--- Procesando {file_name} ({len(df_valid)} canciones) ---")
-    print(f"Hora de inicio: {datetime.now()}\n")
+    log.info(f"--- Procesando {file_name} ({len(results)} canciones) ---")
+    log.info(f"Hora de inicio: {datetime.now()}")
 
     with YoutubeDL(ydl_opts) as ydl:
-        for idx, row in df_valid.iterrows():
-            artist = row['Artist']
-            title = row['Title']
-            video_title = row.get('Video Title', '')
-            expected_duration = row.get('Duration (s)', None)
-            url = row['YouTube Link']
+        for idx, result in enumerate(results):
+            artist = result['artist']
+            title = result['title']
+            video_title = result['video_title'] or ''
+            expected_duration = result['duration']
+            url = video_link(result['video_id'])
             
             query = f"{artist} - {title}"
 
             if isinstance(video_title, str) and video_title.strip():
-                filename = os.path.join(download_path, f"{video_title}.mp3")
+                filename = output_path(download_path, video_title, '.mp3')
             else:
                 filename = None
 
             if filename and os.path.exists(filename) and expected_duration:
                 actual_duration = get_audio_duration(filename)
-                if actual_duration and abs(actual_duration - expected_duration) <= 3:
-                    print(f"[{idx+1}] ⏩ Ya válido: {artist} - {title}")
+                if actual_duration and abs(actual_duration - expected_duration) <= DURATION_TOLERANCE:
+                    log.info(f"[{idx+1}] ⏩ Ya válido: {artist} - {title}")
                     continue
                 else:
-                    print(f"[{idx+1}] 🔁 Duración incorrecta. Se re-descarga.")
-
-            print(f"[{idx+1}] ⬇️ Descargando: {artist} - {title}")
-            
-            attempt = 0
-            while attempt < max_retries:
-                try:
-                    ydl.download([url])
-                    
-                    # Buscar archivo MP3 generado (basado en título del video)
-                    mp3_path = os.path.join(download_path, f"{video_title}.mp3")
-                    if os.path.exists(mp3_path):
-                        set_mp3_metadata(
-                            filepath=mp3_path,
-                            title=title,
-                            artist=artist,
-                            album=name_without_ext
-                        )
-                    
-                    break
-                except Exception as e:
-                    msg = str(e).lower()
-                    if "429" in msg or "rate limit" in msg and USE_TORSOCKS:
-                        attempt += 1
-                        print(f"❌ Error intento {attempt}: {e} - {query}")
-                        print("🔁 Rate limited, cambiando IP con Tor...")
-                        renew_tor_ip()
-                        time.sleep(5)
-                        ydl.download([url])  # intento 2
-                    else:
-                        print(f"❌ Error al descargar {url}: {e} - {query}")
-                        break
-
-    print(f"\n✅ Finalizado: {file_name} — {datetime.now()}\n")
+                    log.info(f"[{idx+1}] 🔁 Duración incorrecta. Se re-descarga.")
+
+            log.info(f"[{idx+1}] ⬇️ Descargando: {artist} - {title}")
+
+            # El postprocesador lee sus argumentos en cada ejecución: el mp3 sale ya etiquetado
+            track_tags = {'title': title, 'artist': artist, 'album': name_without_ext,
+                          **tags.get((name_without_ext, make_key(artist, title)), {})}
+            ydl.params['postprocessor_args'] = POSTPROCESSOR_ARGS + metadata_args(track_tags, '.mp3')
+
+            try:
+                with gate.slot(DOWNLOAD):
+                    get_limiter().run(lambda: ydl.download([url]), max_retries, log=log.warning)
+                gate.done(DOWNLOAD)
+            except Exception as e:
+                log.error(f"❌ Error al descargar {url}: {e} - {query}")
+                continue
+
+    log.info(f"✅ Finalizado: {file_name} — {datetime.now()}")
+
+# Cada proceso va tomando CSV de la cola hasta vaciarla: nunca hay más de DOWNLOAD_WORKERS_MAX procesos
+def csv_worker(files_q, limiter, gate, log_q):
+    set_limiter(limiter)
+    attach(log_q)
+    while True:
+        file_name = files_q.get()
+        if file_name is None:
+            break
+        process_csv(file_name, gate)
 
 # === PROCESAMIENTO PARALELO POR CSV ===
 if __name__ == "__main__":
-    export_dir = 'exports'
+    ensure_dirs()
+    export_dir = EXPORT_RESULT_DIR
+    cache = ResultCache()
+    cache.sync_csvs(export_dir)
+    cache.close()
     csv_files = [f for f in os.listdir(export_dir) if f.endswith('.csv')]
 
     if not csv_files:
@@ -152,13 +116,22 @@ if __name__ == "__main__":
         exit()
 
     processes = []
-
+    limiter = get_limiter()  # compartido por todos los procesos
+    log_q = log_queue()      # un único listener escribe los logs de todos
+    gate = Gate()            # descargas a la vez, las que decida el controlador
+    files_q = Queue()
     for file in csv_files:
-        p = Process(target=process_csv, args=(file,))
+        files_q.put(file)
+
+    for _ in range(min(len(csv_files), DOWNLOAD_WORKERS_MAX)):
+        files_q.put(None)
+        p = Process(target=csv_worker, args=(files_q, limiter, gate, log_q))
         p.start()
         processes.append(p)
 
+    controller = Controller(gate, limiter).start()
     for p in processes:
         p.join()
+    controller.stop()
 
     print("\n🎉 Todos los archivos han sido procesados en paralelo.")
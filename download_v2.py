@@ -1,86 +1,38 @@
 import os
-import pandas as pd
-import subprocess
 from multiprocessing import Queue, Process, current_process
-from mutagen.easyid3 import EasyID3
-from mutagen.mp3 import MP3
 from yt_dlp import YoutubeDL
 from tqdm import tqdm
-from time import sleep, time
+from time import time
 from threading import Thread
 import re
-import logging
-from logging import Logger
-from collections import defaultdict
 
-from config import USE_TORSOCKS, TOR_PROXY, DOWNLOADS_DIR, EXPORT_RESULT_DIR, FFMPEG_PATH, LOGS_DIR, renew_tor_ip
-
-CONCURRENCY = 5  # máximo de descargas simultáneas
-
-# loggers = defaultdict(Logger)
-
-# @todo: add logging to tqdm
-# def setup_logger(out_name):
-#     log_path = os.path.join(LOGS_DIR, f"{out_name}.log")
-    
-#     logger = logging.getLogger(log_path)
-#     logger.setLevel(logging.INFO)
-
-#     if not logger.handlers:
-#         # Archivo
-#         file_handler = logging.FileHandler(log_path, encoding='utf-8')
-#         file_handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s: %(message)s'))
-
-#         # Consola
-#         console_handler = logging.StreamHandler()
-#         console_handler.setFormatter(logging.Formatter('%(message)s'))
-
-#         logger.addHandler(file_handler)
-#         logger.addHandler(console_handler)
+from cache import ResultCache, make_key, video_link, video_id_from_link
+import segmented
+from columnar import ColumnStore
+from concurrency import DOWNLOAD, TRANSCODE, Controller, Gate
+from inputs import InputIndex
+from logqueue import attach, get_logger, log_queue
+from media import get_audio_duration
+from metrics import flush, incr, span, write_snapshot
+from ratelimit import get_limiter, set_limiter
+from store import publish, stored_path
+from transcode import find_existing, finish
+from workqueue import STOP, WorkQueue
+from config import ensure_dirs, USE_TORSOCKS, TOR_PROXY, DOWNLOAD_SEGMENTS, DOWNLOAD_WORKERS_MAX, DOWNLOADS_DIR, DURATION_TOLERANCE, EXPORT_RESULT_DIR, FFMPEG_PATH, INCOMING_DIR, METRICS_SNAPSHOT_SECONDS, STORE_DIR, TRANSCODE_CONCURRENCY
 
 def pascal_to_title_case(text):
     # Inserta espacio antes de cada mayúscula (excepto al inicio), luego capitaliza cada palabra
     spaced = re.sub(r'(?<!^)(?=[A-Z])', ' ', text).replace("_", " ")
     return spaced.title()
 
-# Función para obtener la duración real de un archivo
-def get_audio_duration(path):
-    try:
-        result = subprocess.run([
-            FFMPEG_PATH.replace("ffmpeg.exe", "ffprobe.exe"),
-            '-v', 'error', '-show_entries',
-            'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1',
-            path
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        return float(result.stdout.strip())
-    except:
-        return None
-
-# Establece metadatos ID3 al archivo mp3
-def set_mp3_metadata(filepath, title, artist, album):
-    try:
-        audio = MP3(filepath, ID3=EasyID3)
-        audio['title'] = title
-        audio['artist'] = artist
-        audio['album'] = album
-        audio.save()
-    except Exception as e:
-        print(f"[{filepath}] ⚠️ Error asignando metadatos: {e}")
-
-# Worker para descargar en paralelo
-def download_worker(q, progress_q, idx, max_retries=3):
+# Opciones de descarga comunes a todos los workers
+def download_opts():
     ydl_opts = {
         # 'cookiesfrombrowser': ('firefox', None, None, None),
         'cookiefile': 'cookies.txt',
         'format': 'bestaudio/best',
         'outtmpl': None,  # se asigna por tarea
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }],
-        'postprocessor_args': ['-ar', '44100', '-ac', '2'],
-        'prefer_ffmpeg': True,
+        # Sin postprocesado: se descarga el audio nativo y la conversión la hace el pool de transcode
         'ffmpeg_location': FFMPEG_PATH,
         'quiet': True,
         'no_warnings': True,
@@ -89,127 +41,300 @@ def download_worker(q, progress_q, idx, max_retries=3):
     if USE_TORSOCKS:
         ydl_opts['proxy'] = TOR_PROXY
 
-    while not q.empty():
-        try:
-            task = q.get_nowait()
-        except:
-            break
-
-        artist, title, url, video_title, expected_duration, outdir = task
-        query = f"{artist} - {title}"
-        filename = f"{video_title}.mp3"
-        filepath = os.path.join(outdir, filename)
+    return ydl_opts
+
+# Mantiene un YoutubeDL "caliente" por worker: extractores, cookies y conexiones HTTP se reutilizan
+# entre tareas. Solo se reconstruye tras un error fatal o tras rotar la IP.
+class WarmDownloader:
+    def __init__(self, ydl_opts):
+        self.ydl_opts = ydl_opts
+        self.ydl = None
+
+    def download(self, url, outdir):
+        """Descarga el audio nativo en outdir como <id>.<ext> y devuelve su ruta"""
+        if self.ydl is None:
+            self.ydl = YoutubeDL(self.ydl_opts)
+        # Cambiar la plantilla de salida sin recrear la instancia
+        self.ydl.params['outtmpl']['default'] = os.path.join(outdir, '%(id)s.%(ext)s')
+        if DOWNLOAD_SEGMENTS > 1:
+            path, info = self.download_segmented(url)
+            if path:
+                return path
+            # Se descarga desde la info ya extraída: repetir la extracción es justo lo que limita YouTube
+            info = self.ydl.process_ie_result(info, download=True)
+        else:
+            info = self.ydl.extract_info(url, download=True)
+        downloads = info.get('requested_downloads') or []
+        return downloads[0]['filepath'] if downloads else self.ydl.prepare_filename(info)
+
+    def download_segmented(self, url):
+        """Baja el formato elegido por tramos en paralelo (segmented.py). Devuelve (ruta o None, info): ruta
+        None si no es un formato HTTP directo o el servidor no acepta rangos, y entonces descarga yt_dlp
+        con la misma info"""
+        info = self.ydl.extract_info(url, download=False)
+        if info.get('protocol') not in ('http', 'https') or not info.get('url'):
+            return None, info
+        path = self.ydl.prepare_filename(info)
+        if segmented.download(info['url'], path, info.get('http_headers'), self.ydl_opts.get('proxy')):
+            return path, info
+        return None, info
+
+    def reset(self):
+        if self.ydl is not None:
+            self.ydl.close()
+            self.ydl = None
+
+# Comprueba si el fichero final ya existe con la duración esperada (±3 s)
+def already_valid(outdir, video_title, expected_duration):
+    filepath = find_existing(outdir, video_title)
+    if filepath and expected_duration:
+        actual_duration = get_audio_duration(filepath)
+        return bool(actual_duration and abs(actual_duration - expected_duration) <= DURATION_TOLERANCE)
+    return False
+
+# Descarga una tarea en INCOMING_DIR con reintentos. Devuelve (ruta del audio nativo o None, mensaje de progreso)
+def fetch_task(downloader, task, max_retries=3):
+    artist, title, url, video_title, expected_duration, outdir, tags = task
+    query = f"{artist} - {title}"
+    log = get_logger(os.path.basename(outdir))
 
-        # Validación previa
-        if os.path.exists(filepath) and expected_duration:
-            actual_duration = get_audio_duration(filepath)
-            if actual_duration and abs(actual_duration - expected_duration) <= 3:
+    try:
+        # Tras un rate limit la instancia queda ligada a la IP anterior: se reconstruye antes de reintentar
+        with span('download'):
+            src = get_limiter().run(lambda: downloader.download(url, INCOMING_DIR), max_retries,
+                                    log=log.warning, on_retry=downloader.reset)
+        return src, f"⬇️ {title}"
+    except Exception as e:
+        log.error(f"❌ Error: {e} - {query}")
+        downloader.reset()
+        return None, f"❌ Error: {e}"
+
+# Conversión (o passthrough) al almacén y publicación en cada playlist que comparte el vídeo.
+# Devuelve (ok, mensaje de progreso)
+def transcode_task(tasks, src):
+    artist, title, url, video_title, expected_duration, outdir, tags = tasks[0]
+    try:
+        # Sin álbum en el export, el nombre de la playlist hace de álbum
+        tags = {'title': title, 'artist': artist, 'album': os.path.basename(outdir), **tags}
+        stored = finish(src, STORE_DIR, video_id_from_link(url), tags)
+        return True, link_task(tasks, stored)
+    except Exception as e:
+        get_logger(os.path.basename(outdir)).error(f"❌ Error convirtiendo {src}: {e}")
+        return False, f"❌ Error: {e}"
+
+def link_task(tasks, stored):
+    for task in tasks:
+        publish(stored, task)
+        incr('store_link')
+    return f"🎵 {tasks[0][1]}" + (f" (x{len(tasks)})" if len(tasks) > 1 else "")
+
+# Agrupa las tareas por vídeo: cada vídeo se descarga una vez aunque esté en varias playlists
+def group_by_video(tasks):
+    groups = {}
+    for task in tasks:
+        groups.setdefault(video_id_from_link(task[2]), []).append(task)
+    return list(groups.values())
+
+# Worker para descargar en paralelo (solo red: la conversión va a transcode_q)
+def download_worker(transcode_q, progress_q, idx, limiter, gate, log_q, max_retries=3):
+    set_limiter(limiter)
+    attach(log_q)
+    wq = WorkQueue()
+    wq.keepalive()  # el lease dura lo que la descarga y la espera en transcode_q
+    downloader = WarmDownloader(download_opts())
+
+    while True:
+        # Solo trabajan a la vez los que deja el controlador; el resto espera plaza aquí
+        with gate.slot(DOWNLOAD):
+            item = wq.get()
+            if item is STOP:
+                break
+            task_id, group = item
+            # Las tareas encoladas por versiones anteriores no traen etiquetas
+            group = [tuple(t) + ({},) * (7 - len(t)) for t in group]
+
+            # Validación previa de cada playlist
+            pending = [t for t in group if not already_valid(t[5], t[3], t[4])]
+            title = group[0][1]
+            if not pending:
+                wq.done(task_id)
+                incr('skip')
                 progress_q.put((idx, f"✅ Ya existe: {title}"))
                 continue
 
-        # Asignar plantilla de salida al worker
-        ydl_opts['outtmpl'] = os.path.join(outdir, '%(title)s.%(ext)s')
+            # Ya descargado para otra playlist: solo enlazar
+            stored = stored_path(video_id_from_link(group[0][2]))
+            if stored:
+                msg = link_task(pending, stored)
+                wq.done(task_id)
+                progress_q.put((idx, f"🔗 {msg}"))
+                continue
 
-        attempt = 0
-        while attempt < max_retries:
-            try:
-                with YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([url])
-                break
-            except Exception as e:
-                msg = str(e).lower()
-                print(f"❌ Error intento {attempt}: {e} - {query}")
-                if "429" in msg or "rate limit" in msg and USE_TORSOCKS:
-                    attempt += 1
-                    print("🔁 Rate limited, cambiando IP con Tor...")
-                    renew_tor_ip()
-                    time.sleep(5)
-                    ydl.download([url])  # intento 2
-                else:
-                    progress_q.put((idx, f"❌ Error: {e}"))
-                    break
-
-        # Metadatos
-        final_path = os.path.join(outdir, f"{video_title}.mp3")
-        if os.path.exists(final_path):
-            set_mp3_metadata(final_path, title, artist, os.path.basename(outdir))
-
-        progress_q.put((idx, f"⬇️ {title}"))
-
-# Monitor para mostrar barras de progreso
-def progress_monitor(total_tasks, progress_q):
-    bars = [tqdm(total=0, position=i, leave=False, bar_format="{l_bar}{bar} {r_bar}") for i in range(CONCURRENCY)]
-    overall = tqdm(total=total_tasks, desc="Progreso total", position=CONCURRENCY, bar_format="{l_bar}{bar} {r_bar}")
-
-    counters = [0] * CONCURRENCY
+            src, msg = fetch_task(downloader, pending[0], max_retries)
+            if src is None:
+                wq.fail(task_id, msg)
+                progress_q.put((idx, msg))
+            else:
+                gate.done(DOWNLOAD)
+                # La tarea sigue reservada hasta que el transcoder la marque como hecha
+                transcode_q.put((idx, task_id, pending, src))
+
+    downloader.reset()
+    wq.close()
+    flush()  # los procesos de multiprocessing no ejecutan atexit
+
+# Worker de CPU: convierte lo que van dejando los workers de descarga
+def transcode_worker(transcode_q, progress_q, gate, log_q):
+    attach(log_q)
+    wq = WorkQueue()
+    wq.keepalive()
+    while True:
+        item = transcode_q.get()
+        if item is None:
+            break
+        idx, task_id, tasks, src = item
+        wq.claim(task_id)
+        with gate.slot(TRANSCODE):
+            ok, msg = transcode_task(tasks, src)
+        if ok:
+            gate.done(TRANSCODE)
+            wq.done(task_id)
+        else:
+            wq.fail(task_id, msg)
+        progress_q.put((idx, msg))
+    wq.close()
+    flush()
+
+# Monitor para mostrar barras de progreso. Las barras por worker siguen sus mensajes; la total sale del
+# estado de las tareas en la cola (una tarea reintentada o recogida por otro worker no cuenta dos veces).
+# done_before: tareas ya terminadas al empezar
+def progress_monitor(total_tasks, progress_q, procs, controller, done_before):
+    bars = [tqdm(total=0, position=i, leave=False, bar_format="{l_bar}{bar} {r_bar}") for i in range(DOWNLOAD_WORKERS_MAX)]
+    overall = tqdm(total=total_tasks, desc="Progreso total", position=DOWNLOAD_WORKERS_MAX, bar_format="{l_bar}{bar} {r_bar}")
+
+    counters = [0] * DOWNLOAD_WORKERS_MAX
     start_time = time()
-
-    while overall.n < total_tasks:
+    snapshot = None
+    last_snapshot = start_time
+    wq = WorkQueue()
+    last_count = 0.0
+
+    def update_overall():
+        counts = wq.counts()
+        overall.n = max(0, min(total_tasks, counts.get('done', 0) - done_before + counts.get('failed', 0)))
+        overall.refresh()
+
+    # Termina cuando todos los workers han salido (aunque alguno muera antes de tiempo)
+    while True:
         try:
             idx, msg = progress_q.get(timeout=0.1)
         except:
-            sleep(0.05)
+            if not any(p.is_alive() for p in procs):
+                break
             continue
+        finally:
+            if time() - last_count >= 0.5:
+                update_overall()
+                last_count = time()
+            # Snapshot periódico de métricas para vigilar el ritmo en ejecuciones largas
+            if time() - last_snapshot >= METRICS_SNAPSHOT_SECONDS:
+                snapshot = write_snapshot(snapshot, {'rate_limit_current': get_limiter().current_rate(),
+                                                     **controller.gauges()})
+                last_snapshot = time()
 
         counters[idx] += 1
         bars[idx].total = counters[idx]
         bars[idx].update(1)
         bars[idx].set_description(f"Worker {idx+1}")
         bars[idx].set_postfix_str(msg)
-        overall.update(1)
 
+    update_overall()
+    wq.close()
+    write_snapshot(snapshot, {'rate_limit_current': get_limiter().current_rate(), **controller.gauges()})
     elapsed = time() - start_time
     overall.set_postfix_str(f"✅ Tiempo total: {elapsed:.1f}s")
     for bar in bars:
         bar.close()
     overall.close()
 
+# Tareas de toda la biblioteca resuelta: [(artist, title, url, video_title, duración, outdir, tags)]
+def library_tasks():
+    # Las tareas salen de la caché de resultados (re-importando solo los CSV modificados), leídas
+    # desde el almacén columnar, que solo trae lo que ha cambiado desde la última vez
+    cache = ResultCache()
+    cache.sync_csvs(EXPORT_RESULT_DIR)
+    library = ColumnStore()
+    library.sync(cache)
+    tags = InputIndex(cache).tags()
+    cache.close()
+
+    df = library.load(['source_file', 'artist', 'title', 'video_id', 'video_title', 'duration'])
+    outdirs = {source_file: os.path.join(DOWNLOADS_DIR, pascal_to_title_case(source_file))
+               for source_file in df['source_file'].cat.categories}
+    return [
+        (artist, title, video_link(video_id), video_title or title, None if duration < 0 else int(duration),
+         outdirs[source_file], tags.get((source_file, make_key(artist, title)), {}))
+        for source_file, artist, title, video_id, video_title, duration in zip(
+            df['source_file'], df['artist'], df['title'], df['video_id'], df['video_title'], df['duration'])
+    ]
+
 # Main
 def main():
-    csv_files = [f for f in os.listdir(EXPORT_RESULT_DIR) if f.endswith('.csv')]
-    tasks = []
+    ensure_dirs()
+    tasks = library_tasks()
+    for outdir in {task[5] for task in tasks}:
+        os.makedirs(outdir, exist_ok=True)
 
-    for file in csv_files:
-        df = pd.read_csv(os.path.join(EXPORT_RESULT_DIR, file))
-        df_valid = df[df['YouTube Link'].notna() & (df['YouTube Link'] != 'NOT FOUND')]
+    groups = group_by_video(tasks)
+    os.makedirs(INCOMING_DIR, exist_ok=True)
 
-        filename = os.path.splitext(file)[0]
-        filename = pascal_to_title_case(filename)
-        outdir = os.path.join(DOWNLOADS_DIR, filename)
-        os.makedirs(outdir, exist_ok=True)
-        
-        # logger = setup_logger(filename)
-        # loggers[filename].add(logger)
-
-        for _, row in df_valid.iterrows():
-            artist = row['Artist']
-            title = row['Title']
-            url = row['YouTube Link']
-            video_title = row.get('Video Title', f"{title}")
-            duration = row.get('Duration (s)', None)
-            tasks.append((artist, title, url, video_title, duration, outdir))
-
-    task_q = Queue()
-    progress_q = Queue()
+    # Cola persistente: lo ya terminado en ejecuciones anteriores no se vuelve a encolar ni a comprobar
+    wq = WorkQueue()
+    wq.release_leases()
+    wq.retry_failed()
+    wq.put_many([(video_id_from_link(group[0][2]), group, len(group)) for group in groups])
+    counts = wq.counts()
+    total = sum(n for state, n in counts.items() if state != 'done')
+    wq.close()
 
-    for t in tasks:
-        task_q.put(t)
+    transcode_q = Queue()
+    progress_q = Queue()
 
-    # Lanzar procesos de descarga
+    # Lanzar procesos de descarga (todos comparten el mismo limitador de peticiones). Se lanza el máximo
+    # de cada pool; el controlador decide cuántos trabajan a la vez
+    limiter = get_limiter()
+    log_q = log_queue()
+    gate = Gate()
+    controller = Controller(gate, limiter, backlog=transcode_q.qsize)
     workers = []
-    for i in range(CONCURRENCY):
-        p = Process(target=download_worker, args=(task_q, progress_q, i))
+    for i in range(DOWNLOAD_WORKERS_MAX):
+        p = Process(target=download_worker, args=(transcode_q, progress_q, i, limiter, gate, log_q))
         p.start()
         workers.append(p)
 
+    # Pool de conversión, dimensionado por núcleos y no por conexiones
+    transcoders = []
+    for _ in range(TRANSCODE_CONCURRENCY):
+        p = Process(target=transcode_worker, args=(transcode_q, progress_q, gate, log_q))
+        p.start()
+        transcoders.append(p)
+
+    controller.start()
+
     # Iniciar monitor de progreso
-    monitor = Thread(target=progress_monitor, args=(len(tasks), progress_q))
+    monitor = Thread(target=progress_monitor, args=(total, progress_q, workers + transcoders, controller,
+                                                     counts.get('done', 0)))
     monitor.start()
 
-    # Esperar a que terminen
+    # Esperar a que terminen: primero las descargas, luego se vacía la cola de conversión
     for p in workers:
         p.join()
+    for _ in transcoders:
+        transcode_q.put(None)
+    for p in transcoders:
+        p.join()
     monitor.join()
+    controller.stop()
 
     print("\n✅ Todas las descargas finalizadas.")
 
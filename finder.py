@@ -5,217 +5,273 @@ from yt_dlp import YoutubeDL
 
 from tqdm import tqdm
 
-import time
-import logging
-
-import csv
+from functools import partial
+from itertools import repeat
 from collections import defaultdict
-
-from config import LOGS_DIR, EXPORT_DIR, EXPORT_RESULT_DIR, USE_TORSOCKS, renew_tor_ip, ydl_opts
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from queue import Queue
+
+import scoring
+from cache import ResultCache, video_link
+from inputs import EXPORT_COLUMNS, EXPORT_DTYPES, InputIndex
+from writer import ResultWriter
+from logqueue import get_logger
+from metrics import incr, span, write_snapshot
+from trackkey import canonical_key
+from ratelimit import get_limiter, is_rate_limited
+from config import ensure_dirs, EXPORT_DIR, INPUT_CHUNK_ROWS, INPUT_WATCH_SECONDS, EXPORT_RESULT_DIR, RESULT_CSV_EXPORT, SEARCH_CONCURRENCY, SEARCH_WIDTHS, ydl_opts
 
 # import sys
 # import traceback
 # from datetime import datetime
 
 
-# Mapeo de source_file -> (file_handle, csv_writer)
+# Separador para construir claves artista/título en las operaciones vectorizadas
+KEY_SEP = '\x1f'
+
+# Mapeo de source_file -> ResultWriter. Solo se escribe desde el hilo principal
 open_writers = {}
 written_rows = defaultdict(set)
 
 def setup_logger(out_name):
-    log_path = os.path.join(LOGS_DIR, f"{out_name}.log")
-    
-    logger = logging.getLogger(log_path)
-    logger.setLevel(logging.INFO)
-
-    if not logger.handlers:
-        # Archivo
-        file_handler = logging.FileHandler(log_path, encoding='utf-8')
-        file_handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s: %(message)s'))
-
-        # Consola
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(logging.Formatter('%(message)s'))
-
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
-
-    return logger
-
-def choose_best_video(results, expected_duration=None):
-    best = None
-    for entry in results:
-        title = entry.get('title', '').lower()
-        channel = entry.get('uploader', '').lower()
-        duration = entry.get('duration')
-
-        if not duration:
-            continue
-
-        # Penalizar ciertos patrones
-        if any(skip in title for skip in ['live', 'lyric', 'cover', 'remix', 'nightcore', 'sped up']):
-            continue
-
-        is_official = (
-            any(kw in title for kw in ['official', 'audio', 'video']) or
-            'vevo' in channel or 'topic' in channel
-        )
-
-        is_duration_ok = (
-            expected_duration is None or
-            abs(duration - expected_duration) <= 3
-        )
-
-        if is_official and is_duration_ok:
-            return entry  # match ideal
-
-        if not best and is_duration_ok:
-            best = entry  # fallback si nada mejor
-
-    return best or results[0]  # si nada cumple, se queda con algo
-
-def process(file_or_df, name_override=None, max_retries=3):
-    df = pd.DataFrame()
-    out_name = ""
-    is_combined = False
-    source_file = ""
-    
-    if isinstance(file_or_df, str):
-        df = pd.read_csv(file_or_df)
-        out_name = os.path.splitext(os.path.basename(file_or_df))[0]
+    """Logger de logs/<out_name>.log (y consola). Los hilos de búsqueda solo encolan: ver logqueue.py"""
+    return get_logger(out_name)
+
+def choose_best_video(results, expected_duration=None, artist='', title=''):
+    """Mejor candidato según scoring; si ninguno es válido, se queda con el primero"""
+    entry, _ = scoring.best(results, artist, title, expected_duration)
+    return entry or results[0]
+
+def open_writer(source_file, cache):
+    """Abre (si no existe ya) el escritor CSV de resultados para source_file. Las filas cuentan como
+    escritas en la caché (playlist_tracks) cuando el escritor las lleva al disco, no antes"""
+    if source_file not in open_writers:
+        output_path = os.path.join(EXPORT_RESULT_DIR, f"{source_file}.csv")
+        open_writers[source_file] = ResultWriter(
+            output_path, on_flush=partial(cache.add_to_playlist, source_file)) if RESULT_CSV_EXPORT else None
+    return open_writers[source_file]
+
+def search_worker(ydl_pool, query, duration, logger, max_retries=3, artist='', title=''):
+    """Busca query con una instancia del pool. Devuelve el vídeo elegido o None si no se encontró.
+    Empieza con pocos resultados y amplía (SEARCH_WIDTHS) solo si ninguno es aceptable.
+    Si se agotan los reintentos por rate limit, relanza la última excepción."""
+    ydl = ydl_pool.get()
+    try:
+        fallback = None
+        for width in SEARCH_WIDTHS:
+            if width != SEARCH_WIDTHS[0]:
+                incr('search_widen')
+            url = f"ytsearch{width}:{query}"
+            with span('search', width=width):
+                info = get_limiter().run(lambda: ydl.extract_info(url, download=False), max_retries, log=logger.warning)
+            entries = info.get('entries')
+            if entries is None:
+                return info
+            if not entries:
+                continue
+            with span('select'):
+                entry, acceptable = scoring.best(entries, artist, title, duration)
+            if acceptable:
+                return entry
+            fallback = fallback or entry or entries[0]
+            if len(entries) < width:
+                break  # YouTube no tiene más resultados: ampliar no aporta nada
+        return fallback
+    except Exception as e:
+        logger.error(f"❌ Error: {e} - {query}")
+        if is_rate_limited(e):
+            raise
+        return None
+    finally:
+        ydl_pool.put(ydl)
+
+def write_result(future, cache, query, waiters, logger, on_result=None):
+    """Guarda en la caché el resultado de una búsqueda terminada y lo escribe en el CSV de cada
+    playlist que la esperaba (solo desde el hilo principal)"""
+    try:
+        video = future.result()
+    except Exception as e:
+        logger.error(f"❌ Rate limit persistente, se omite: {query} ({e})")
+        return
+
+    # Cada grafía que esperaba esta búsqueda queda en la caché con su propia clave exacta
+    for artist, title, canonical in {waiter[1:] for waiter in waiters}:
+        cache.put(artist, title, video, canonical=canonical)
+    if video is None:
+        incr('not_found')
+    for source_file, artist, title, _ in waiters:
+        if video is None:
+            write_row(cache, source_file, artist, title, None)
+        else:
+            write_row(cache, source_file, artist, title, video['id'], video.get('title', ''),
+                      video.get('uploader', ''), video.get('duration', ''))
+        if on_result and video is not None:
+            on_result(source_file, artist, title, video['id'], video.get('title', ''), video.get('duration'))
+
+def write_row(cache, source_file, artist, title, video_id, video_title='', uploader='', duration=''):
+    writer = open_writers[source_file]
+    if writer is None:
+        # Sin vista CSV: el resultado ya está en la caché y basta con apuntarlo en la playlist
+        cache.add_to_playlist(source_file, [(artist, title)])
+        return
+    if video_id is None:
+        writer.writerow([artist, title, 'NOT FOUND', '', '', ''], (artist, title))
+        return
+
+    writer.writerow([
+        artist,
+        title,
+        video_link(video_id),
+        video_title,
+        uploader,
+        duration
+    ], (artist, title))
+
+def new_ydl_pool(size=SEARCH_CONCURRENCY):
+    ydl_pool = Queue()
+    for _ in range(size):
+        ydl_pool.put(YoutubeDL(ydl_opts))
+    return ydl_pool
+
+def read_export(path, chunk_rows=INPUT_CHUNK_ROWS):
+    """Un export de Exportify por bloques, con solo las columnas que usa la búsqueda"""
+    return pd.read_csv(path, usecols=EXPORT_COLUMNS, dtype={c: EXPORT_DTYPES[c] for c in EXPORT_COLUMNS},
+                       chunksize=chunk_rows)
+
+def process(source, cache, name_override=None, max_retries=3, on_result=None, ydl_pool=None, total=None):
+    """Busca en YouTube las canciones pendientes y escribe los resultados por playlist.
+    source: ruta de un export (se lee por bloques), DataFrame con el formato de InputIndex.pending o
+    iterable de DataFrames (InputIndex.iter_pending); total solo sirve para la barra de progreso.
+    on_result(source_file, artist, title, video_id, video_title, duration) se llama desde el hilo
+    principal por cada canción encontrada; si bloquea, frena las búsquedas (backpressure).
+    ydl_pool: Queue de YoutubeDL ya creadas (modo daemon); si no se pasa, se crea y se cierra aquí."""
+    if isinstance(source, str):
+        out_name = os.path.splitext(os.path.basename(source))[0]
         source_file = out_name
+        is_combined = False
+        chunks = read_export(source)
     else:
-        df = file_or_df
         out_name = name_override or "combined"
         is_combined = True
-        
-    logger = setup_logger(out_name)
-    
-    # --- Cargar CSV original ---
-    if 'Artist' not in df.columns:
-        df = df[['Artist Name(s)', 'Track Name', 'Duration (ms)']].drop_duplicates()
-
-    # Normalización de columnas clave
-    df['Artist'] = df.apply(infer_artist, axis=1)
-    df['Artist'] = df['Artist'].fillna('').str.strip().str.lower()
-    df['Track Name'] = df['Track Name'].fillna('').str.strip().str.lower()
+        chunks = [source] if isinstance(source, pd.DataFrame) else source
+        if total is None and isinstance(source, pd.DataFrame):
+            total = len(source)
 
+    logger = setup_logger(out_name)
     output_csv = os.path.join(EXPORT_RESULT_DIR, f"{out_name}.csv")
 
-    already_done = set()
-    if os.path.exists(output_csv):
-        df_done = pd.read_csv(output_csv)
-        df_done['Artist'] = df_done['Artist'].fillna('').str.strip().str.lower()
-        df_done['Title'] = df_done['Title'].fillna('').str.strip().str.lower()
-        already_done = set(zip(df_done['Artist'], df_done['Title']))
+    # En modo combinado el índice de entradas ya filtró lo escrito en cada playlist
+    already_done = set() if is_combined else cache.playlist_keys(source_file)
 
-    to_process = df[~df.apply(lambda r: (r['Artist'], r['Track Name']) in already_done, axis=1)]
+    logger.info(f"🔍 Buscando {total if total is not None else 'las'} canciones pendientes "
+                f"({SEARCH_CONCURRENCY} búsquedas a la vez)...\n")
+    read = new = 0
 
-    logger.info(f"🔍 Encontradas {len(to_process)} canciones nuevas para buscar (de {len(df)} totales).\n")
-    logger.info(f"🔍 Buscando {len(to_process)} canciones una por una...\n")
+    # Pool de instancias YoutubeDL, una por búsqueda en vuelo
+    owns_pool = ydl_pool is None
+    if owns_pool:
+        ydl_pool = new_ydl_pool()
+
+    # Máximo de búsquedas encoladas a la vez (acota memoria con exports grandes)
+    max_in_flight = SEARCH_CONCURRENCY * 2
+    in_flight = {}
+    # clave canónica -> [(source_file, artist, title, clave canónica)] de las playlists que esperan esa
+    # búsqueda: dos grafías de la misma canción comparten una sola búsqueda
+    waiting = defaultdict(list)
 
     try:
-        with YoutubeDL(ydl_opts) as ydl:
-            for _, row in tqdm(to_process.iterrows(), total=len(to_process)):
-                artist = row['Artist']
-                title = row['Track Name']
-                query = f"{artist} - {title}"
-                
-                # ensure if we don't combine all the logs that at least, we have duration set
-                row['Expected Duration (s)'] = row['Duration (ms)'] / 1000
-                duration = row['Expected Duration (s)']
-                
-                if is_combined:
-                    source_file = row['Source File']
-                    
-                output_path = os.path.join(EXPORT_RESULT_DIR, f"{source_file}.csv")
-                
-                # Abrir escritor si no existe
-                if source_file not in open_writers:
-                    f = open(output_path, mode='a', newline='', encoding='utf-8')
-                    writer = csv.writer(f)
-                    
-                    # Escribir cabecera solo si el archivo está vacío
-                    if os.stat(output_path).st_size == 0:
-                        writer.writerow(['Artist', 'Title', 'YouTube Link', 'Video Title', 'Uploader', 'Duration (s)'])
-                    open_writers[source_file] = (f, writer)
-
-                attempt = 0
-                while attempt < max_retries:
-                    try:
-                        if query in written_rows[source_file]:
-                            break  # Ya se escribió, evitar duplicado. Salir del while
-                        
-                        written_rows[source_file].add(query)
-                        
-                        info = ydl.extract_info(query, download=False)
-                        if 'entries' in info:
-                            video = choose_best_video(info['entries'], duration)
-                        else:
-                            video = info
-                            
-                        video_link = f"https://www.youtube.com/watch?v={video['id']}"
-
-                        open_writers[source_file][1].writerow([
-                            artist,
-                            title,
-                            video_link,
-                            video.get('title', ''),
-                            video.get('uploader', ''),
-                            video.get('duration', '')
-                        ])
-                        
-                        f = open_writers[source_file][0]
-                        f.flush()
-                        os.fsync(f.fileno())
-                        open_writers[source_file][0].flush()  # flush al file handle
-                        break
-                    except Exception as e:
-                        # print(e)
-                        # traceback.print_exc() 
-                        # sys.exit(1)
-                        
-                        msg = str(e).lower()
-                        logger.error(f"❌ Error intento {attempt}: {e} - {query}")
-                        if "429" in msg or "rate limit" in msg and USE_TORSOCKS:
-                            logger.warning("🔁 Rate limited, cambiando IP con Tor...")
-                            renew_tor_ip()
-                            time.sleep(5)
-                            attempt += 1
+        with ThreadPoolExecutor(max_workers=SEARCH_CONCURRENCY) as executor, \
+                tqdm(total=total) as bar:
+            for chunk in chunks:
+                # Normalización de columnas clave (los bloques del índice ya vienen normalizados)
+                if 'Artist' not in chunk.columns:
+                    chunk = normalize_export(chunk.drop_duplicates())
+                read += len(chunk)
+                chunk = drop_done(chunk, already_done)
+                new += len(chunk)
+                sources = chunk['Source File'] if is_combined else repeat(source_file)
+
+                for artists, artist, title, duration_ms, source_file in zip(
+                        chunk['Artist Name(s)'], chunk['Artist'], chunk['Track Name'], chunk['Duration (ms)'], sources):
+                    query = f"{artist} - {title}"
+                    duration = duration_ms / 1000
+                    # Con todos los artistas del export si los hay; si no, el inferido
+                    canonical = canonical_key(artists if isinstance(artists, str) and artists.strip() else artist,
+                                              title)
+
+                    open_writer(source_file, cache)
+
+                    # La deduplicación se decide aquí, en el hilo principal, antes de lanzar la búsqueda
+                    if query in written_rows[source_file]:
+                        bar.update(1)
+                        continue  # Ya se escribió, evitar duplicado
+                    written_rows[source_file].add(query)
+
+                    # Ya resuelta para otra playlist (o con otra grafía): se copia de la caché sin buscar
+                    cached = cache.get(artist, title)
+                    if cached is None:
+                        cached = cache.find_canonical(canonical)
+                        if cached is not None:
+                            incr('canonical_hit')
+                            cache.put(artist, title, {'id': cached['video_id'], 'title': cached['video_title'],
+                                                      'uploader': cached['uploader'], 'duration': cached['duration']},
+                                      cached['looked_up_at'], canonical)
+                    if cached is not None:
+                        incr('cache_hit')
+                        if cached['not_found']:
+                            write_row(cache, source_file, artist, title, None)
                         else:
-                            key = (artist, title)
-                        
-                            if key in written_rows[source_file]:
-                                break  # Ya se escribió, evitar duplicado. Salir del while
-                            
-                            written_rows[source_file].add(key)
-                            
-                            open_writers[source_file][1].writerow([
-                                artist, title, 'NOT FOUND', '', '', ''
-                            ])
-                            break
-                        break
+                            write_row(cache, source_file, artist, title, cached['video_id'], cached['video_title'],
+                                      cached['uploader'], _format_duration(cached['duration']))
+                            if on_result:
+                                on_result(source_file, artist, title, cached['video_id'],
+                                          cached['video_title'], cached['duration'])
+                        bar.update(1)
+                        continue
+
+                    # La misma canción ya se está buscando para otra playlist
+                    if canonical in waiting:
+                        waiting[canonical].append((source_file, artist, title, canonical))
+                        bar.update(1)
+                        continue
+
+                    waiting[canonical].append((source_file, artist, title, canonical))
+                    future = executor.submit(search_worker, ydl_pool, query, duration, logger, max_retries, artist, title)
+                    in_flight[future] = (query, canonical)
+
+                    if len(in_flight) >= max_in_flight:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for finished in done:
+                            query, key = in_flight.pop(finished)
+                            write_result(finished, cache, query, waiting.pop(key), logger, on_result)
+                            bar.update(1)
+
+            for finished in as_completed(list(in_flight)):
+                query, key = in_flight.pop(finished)
+                write_result(finished, cache, query, waiting.pop(key), logger, on_result)
+                bar.update(1)
     finally:
-        # ✅ Cerrar todos los ficheros
-        for f, _ in open_writers.values():
-            f.close()
+        # ✅ Cerrar todos los ficheros (vuelca el último lote pendiente)
+        for writer in open_writers.values():
+            if writer:
+                writer.close()
+        open_writers.clear()
+        # Lo ya escrito queda en la caché; así una siguiente pasada (modo vigilancia) reintenta lo omitido
+        written_rows.clear()
 
+        while owns_pool and not ydl_pool.empty():
+            ydl_pool.get_nowait().close()
+
+        write_snapshot(gauges={'rate_limit_current': get_limiter().current_rate()})
+
+    logger.info(f"🔍 {new} canciones nuevas (de {read} leídas).")
     logger.info(f"\n✅ Resultados actualizados en: {output_csv}")
 
-def get_cached_pairs():
-    """Lee todos los archivos en EXPORT_RESULT_DIR y devuelve un set de (artist, title) normalizado"""
-    cached = set()
-    for f in os.listdir(EXPORT_RESULT_DIR):
-        if not f.endswith('.csv') or f.startswith("_"):
-            continue
-        df = pd.read_csv(os.path.join(EXPORT_RESULT_DIR, f))
-        if 'Artist' not in df.columns or 'Title' not in df.columns:
-            continue  # Saltar si no es un CSV de resultados válidos
-        df['Artist'] = df['Artist'].fillna('').str.strip().str.lower()
-        df['Title'] = df['Title'].fillna('').str.strip().str.lower()
-        for _, row in df.iterrows():
-            cached.add((row['Artist'], row['Title']))
-    return cached
+def _format_duration(duration):
+    """Duración tal y como la escribe yt_dlp en el CSV (entero si no tiene decimales)"""
+    if duration is None:
+        return ''
+    return int(duration) if float(duration).is_integer() else duration
 
 def infer_artist(row):
     if pd.notna(row['Artist Name(s)']) and row['Artist Name(s)'].strip():
@@ -225,65 +281,96 @@ def infer_artist(row):
     else:
         return 'unknown'
 
-def concatenate_all_exports(cached_pairs):
-    dfs = []
-    for file in os.listdir(EXPORT_DIR):
-        if not file.endswith('.csv') or file.startswith("_"):
-            continue
-
-        df = pd.read_csv(os.path.join(EXPORT_DIR, file))
-        df = df[['Artist Name(s)', 'Track Name', 'Duration (ms)']].drop_duplicates()
-        df["Source File"] = os.path.splitext(file)[0]
-        df['Artist'] = df.apply(infer_artist, axis=1)
-        df['Expected Duration (s)'] = df['Duration (ms)'] / 1000
-
-        # Normalizar para la clave
-        df['Artist'] = df['Artist'].fillna('').str.strip().str.lower()
-        df['Track Name'] = df['Track Name'].fillna('').str.strip().str.lower()
-
-        df['__key__'] = list(zip(df['Artist'], df['Track Name']))
-        df = df[~df['__key__'].isin(cached_pairs)].drop(columns='__key__')
-
-        if not df.empty:
-            dfs.append(df)
-
-    if not dfs:
-        return pd.DataFrame()
+def infer_artist_series(df):
+    """Versión vectorizada de infer_artist sobre todo el DataFrame (mismo resultado, sin bucle por fila)"""
+    artists = df['Artist Name(s)'].astype('string')
+    tracks = df['Track Name'].astype('string')
+
+    has_artist = artists.str.strip().fillna('').ne('').astype(bool)
+    # El prefijo del título solo se calcula donde hace falta (sin artista)
+    use_dash = ~has_artist & tracks.str.contains('-', regex=False).fillna(False).astype(bool)
+
+    # Equivale a split(sep)[0]: se descarta desde el primer separador (regex sin listas intermedias)
+    first_artist = artists[has_artist].str.replace(r'(?s),.*', '', regex=True).str.strip().str.lower()
+    dash_prefix = tracks[use_dash].str.replace(r'(?s)-.*', '', regex=True).str.strip().str.lower()
+
+    # Prioridad: primer artista > prefijo antes del "-" del título > 'unknown'
+    result = pd.Series('unknown', index=df.index, dtype=object)
+    result[has_artist] = first_artist.astype(object)
+    result[use_dash] = dash_prefix.astype(object)
+    return result
+
+def drop_done(df, done_pairs, artist_col='Artist', title_col='Track Name'):
+    """Anti-join: quita las filas cuyo (artista, título) ya está en done_pairs"""
+    if df.empty or not done_pairs:
+        return df
+    # Clave única por fila para que el isin sea un lookup de hash sobre strings
+    keys = df[artist_col].astype(str) + KEY_SEP + df[title_col].astype(str)
+    done_keys = pd.Index([f"{artist}{KEY_SEP}{title}" for artist, title in done_pairs])
+    return df[~keys.isin(done_keys)]
+
+def normalize_export(df):
+    """Columnas clave normalizadas: 'Artist' (inferido) y 'Track Name' en minúsculas y sin espacios"""
+    df['Artist'] = infer_artist_series(df)
+    df['Artist'] = df['Artist'].fillna('').str.strip().str.lower()
+    df['Track Name'] = df['Track Name'].fillna('').str.strip().str.lower()
+    return df
 
-    return pd.concat(dfs, ignore_index=True)
+def pending_exports(cache, source_file=None):
+    """(bloques, total) de las canciones pendientes de todos los exports (o de uno), para pasárselos
+    a process(). Solo se leen los CSV que han cambiado desde la última vez (ver inputs.InputIndex); el
+    resto sale del índice, y los bloques se van pidiendo según avanza la búsqueda"""
+    index = InputIndex(cache)
+    index.sync(EXPORT_DIR, normalize_export)
+    return index.iter_pending(source_file), index.pending_total(source_file)
 
 def main():
+    ensure_dirs()
+    cache = ResultCache()
     while True:
-        files = [f for f in os.listdir(EXPORT_DIR) if f.endswith('.csv') and not f.startswith('_all_combined_filtered')]
+        files = [f for f in os.listdir(EXPORT_DIR) if f.endswith('.csv') and not f.startswith('_')]
         if not files:
             print("❌ No se encontraron archivos CSV en la carpeta 'spotify/'.")
             return
 
-        # Guardar archivo temporal para procesar
-        temp_path = os.path.join(EXPORT_DIR, "_all_combined_filtered.csv")
-        
         print("Opciones disponibles:")
         print("0. 🔄 Procesar todos los CSV")
+        print("p. ⏩ Procesar todos y descargar a la vez (pipeline)")
+        print("w. 👀 Vigilar la carpeta y procesar los exports nuevos según llegan")
         for i, file in enumerate(files, 1):
             print(f"{i}. {file}")
 
         choice = input("Selecciona una opción: ")
 
-        cached_pairs = get_cached_pairs()
+        # Solo se re-importan los CSV de resultados que han cambiado desde la última vez
+        cache.sync_csvs(EXPORT_RESULT_DIR)
         
         if choice == 'q':
                 print("👋 Saliendo del programa.")
                 break
+        elif choice == 'p':
+            # Import diferido: pipeline importa finder
+            import pipeline
+            chunks, total = pending_exports(cache)
+            if not total:
+                print("✅ Todo ya está procesado según la caché.")
+                return
+            pipeline.run(chunks, cache, total)
+
         elif choice == '0':
-            df_all = concatenate_all_exports(cached_pairs)
+            chunks, total = pending_exports(cache)
 
-            if df_all.empty:
+            if not total:
                 print("✅ Todo ya está procesado según la caché.")
                 return
-            
-            df_all.to_csv(temp_path, index=False)
-            process(df_all, name_override="combined")
-            os.remove(temp_path)
+
+            process(chunks, cache, name_override="combined", total=total)
+
+        elif choice == 'w':
+            print(f"👀 Vigilando {EXPORT_DIR} cada {INPUT_WATCH_SECONDS}s (Ctrl+C para salir)")
+            InputIndex(cache).watch(EXPORT_DIR, normalize_export,
+                                    lambda chunks, total: process(chunks, cache, name_override="combined",
+                                                                  total=total))
 
         else:
             try:
@@ -291,7 +378,7 @@ def main():
                 if idx < 1 or idx > len(files):
                     raise ValueError
                 selected = files[idx - 1]
-                process(os.path.join(EXPORT_DIR, selected))
+                process(os.path.join(EXPORT_DIR, selected), cache)
             except (IndexError, ValueError):
                 print("❌ Selección inválida.")
 
@@ -0,0 +1,274 @@
+import os
+import time
+import hashlib
+
+from cache import make_key
+from trackkey import canonical_key
+from config import INPUT_CHUNK_ROWS, INPUT_WATCH_SECONDS
+
+# inputs.py
+# Índice de los exports de Exportify (exportify/) guardado junto a la caché de resultados. Por fichero
+# guarda tamaño, mtime y hash del contenido; por fila, una huella de sus columnas. Un fichero sin cambios
+# cuesta un stat; uno cambiado se lee y solo se insertan/borran las filas cuya huella cambia. Las
+# canciones pendientes salen de una consulta (filas del índice que aún no están en playlist_tracks o que
+# están como NOT FOUND caducado), sin volver a leer ningún CSV. También guarda los campos de Exportify que
+# van a las etiquetas del fichero final (álbum, número de pista, fecha, ISRC). Los CSV se leen por bloques
+# de INPUT_CHUNK_ROWS filas y las pendientes se devuelven también por bloques, así que la memoria no crece
+# con el número de playlists. pandas se importa solo al leer o devolver filas, para que `cli.py status`
+# pueda consultar el índice sin cargarlo.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS input_files (
+    name   TEXT PRIMARY KEY,
+    size   INTEGER NOT NULL,
+    mtime  REAL NOT NULL,
+    sha1   TEXT NOT NULL
+);
+
+-- Filas normalizadas de cada export; fingerprint = hash de las columnas originales
+CREATE TABLE IF NOT EXISTS input_rows (
+    source_file TEXT NOT NULL,
+    fingerprint INTEGER NOT NULL,
+    artists     TEXT NOT NULL,
+    artist      TEXT NOT NULL,
+    title       TEXT NOT NULL,
+    duration_ms REAL,
+    query_key   TEXT NOT NULL,
+    album       TEXT,
+    track       TEXT,
+    date        TEXT,
+    isrc        TEXT,
+    PRIMARY KEY (source_file, fingerprint)
+);
+"""
+
+EXPORT_COLUMNS = ['Artist Name(s)', 'Track Name', 'Duration (ms)']
+# Columnas opcionales de Exportify -> etiqueta (las versiones antiguas llaman a la fecha 'Album Release Date')
+TAG_COLUMNS = {'Album Name': 'album', 'Track Number': 'track', 'Release Date': 'date',
+               'Album Release Date': 'date', 'ISRC': 'isrc'}
+TAG_FIELDS = ('album', 'track', 'date', 'isrc')
+# Todo como texto salvo la duración: sin inferencia de tipos por bloque (un bloque podría salir int y
+# otro float y cambiar las huellas) y el número de pista se guarda tal cual viene
+EXPORT_DTYPES = {**{c: 'object' for c in EXPORT_COLUMNS + list(TAG_COLUMNS)}, 'Duration (ms)': 'float64'}
+
+# Pendiente: aún no está en el CSV de su playlist, o lo está como NOT FOUND ya caducado (NOT_FOUND_TTL)
+PENDING_FROM = """
+    FROM input_rows r
+    LEFT JOIN playlist_tracks p ON p.source_file = r.source_file AND p.query_key = r.query_key
+    LEFT JOIN results res ON res.query_key = p.query_key
+    WHERE (p.query_key IS NULL OR (res.not_found = 1 AND res.looked_up_at < ?))
+"""
+PENDING_SQL = "SELECT r.artists, r.title, r.duration_ms, r.source_file, r.artist, r.fingerprint" + PENDING_FROM
+PENDING_COLUMNS = ['Artist Name(s)', 'Track Name', 'Duration (ms)', 'Source File', 'Artist']
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def fingerprints(df):
+    """Huella de 64 bits por fila (vectorizada), como entero con signo para SQLite"""
+    import pandas as pd
+    columns = EXPORT_COLUMNS + [c for c in TAG_COLUMNS if c in df.columns]
+    return pd.util.hash_pandas_object(df[columns], index=False).astype('int64')
+
+def tag_value(value):
+    """Valor de etiqueta como texto; None si falta (los números enteros que pandas lee como float sin '.0')"""
+    if value is None or value != value:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+class InputIndex:
+    """Comparte conexión y lock con ResultCache para poder cruzar con playlist_tracks"""
+
+    def __init__(self, cache):
+        self.conn = cache.conn
+        self.lock = cache.lock
+        self.not_found_ttl = cache.not_found_ttl
+        with self.lock:
+            self.conn.executescript(SCHEMA)
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(input_rows)")}
+            if 'isrc' not in columns:
+                # Índice de una versión sin etiquetas: se rehace en el próximo sync. Las canciones ya
+                # resueltas siguen fuera de pending() porque eso sale de playlist_tracks
+                with self.conn:
+                    for field in TAG_FIELDS:
+                        self.conn.execute(f"ALTER TABLE input_rows ADD COLUMN {field} TEXT")
+                    self.conn.execute("DELETE FROM input_rows")
+                    self.conn.execute("DELETE FROM input_files")
+
+    def sync(self, directory, normalize):
+        """Pone el índice al día con los CSV de directory. normalize(df) añade las columnas 'Artist' y
+        'Track Name' normalizadas. Devuelve {source_file: (añadidas, borradas)} de los ficheros cambiados"""
+        with self.lock:
+            known = {row['name']: row for row in self.conn.execute("SELECT * FROM input_files")}
+
+        changes = {}
+        present = set()
+        for f in os.listdir(directory):
+            if not f.endswith('.csv') or f.startswith('_'):
+                continue
+            present.add(f)
+            path = os.path.join(directory, f)
+            st = os.stat(path)
+            row = known.get(f)
+            if row and row['size'] == st.st_size and row['mtime'] == st.st_mtime:
+                continue
+
+            # Cambió el mtime pero quizá no el contenido (copia, touch, re-export idéntico)
+            sha1 = file_sha1(path)
+            if not row or row['sha1'] != sha1:
+                changes[os.path.splitext(f)[0]] = self._sync_file(path, normalize)
+            with self.lock, self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO input_files (name, size, mtime, sha1) VALUES (?, ?, ?, ?)",
+                                  (f, st.st_size, st.st_mtime, sha1))
+
+        # Exports borrados: sus filas dejan de estar pendientes
+        for f in set(known) - present:
+            source_file = os.path.splitext(f)[0]
+            with self.lock, self.conn:
+                removed = self.conn.execute("DELETE FROM input_rows WHERE source_file = ?", (source_file,)).rowcount
+                self.conn.execute("DELETE FROM input_files WHERE name = ?", (f,))
+            changes[source_file] = (0, removed)
+        return changes
+
+    def _sync_file(self, path, normalize):
+        import pandas as pd
+        source_file = os.path.splitext(os.path.basename(path))[0]
+        with self.lock:
+            old = {r[0] for r in self.conn.execute(
+                "SELECT fingerprint FROM input_rows WHERE source_file = ?", (source_file,))}
+
+        # Por bloques: solo se guardan las huellas vistas; las filas nuevas se escriben bloque a bloque
+        current = set()
+        added_count = 0
+        reader = pd.read_csv(path, usecols=lambda c: c in EXPORT_COLUMNS or c in TAG_COLUMNS,
+                             dtype=EXPORT_DTYPES, chunksize=INPUT_CHUNK_ROWS)
+        for chunk in reader:
+            chunk['fingerprint'] = fingerprints(chunk)
+            chunk = chunk.drop_duplicates('fingerprint')
+            chunk = chunk[~chunk['fingerprint'].isin(current)]
+            current.update(chunk['fingerprint'])
+            added_count += self._insert_rows(source_file, chunk[~chunk['fingerprint'].isin(old)], normalize)
+
+        removed = old - current
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM input_rows WHERE source_file = ? AND fingerprint = ?",
+                                  [(source_file, fp) for fp in removed])
+        return added_count, len(removed)
+
+    def _insert_rows(self, source_file, added, normalize):
+        import pandas as pd
+        if added.empty:
+            return 0
+        # Solo se normalizan las filas nuevas
+        added = normalize(added.copy())
+        # Una columna por campo de etiqueta (la primera que traiga el export), o None si no hay ninguna
+        tag_columns = []
+        for field in TAG_FIELDS:
+            column = next((c for c, f in TAG_COLUMNS.items() if f == field and c in added.columns), None)
+            tag_columns.append(added[column] if column else [None] * len(added))
+        rows = [
+            (source_file, int(fp), artists if isinstance(artists, str) else '', artist, title,
+             None if pd.isna(ms) else float(ms), make_key(artist, title), *map(tag_value, tags))
+            for fp, artists, artist, title, ms, *tags in zip(added['fingerprint'], added['Artist Name(s)'],
+                                                             added['Artist'], added['Track Name'],
+                                                             added['Duration (ms)'], *tag_columns)
+        ]
+        # Resultados importados o migrados antes de indexar su export: su clave canónica salió del artista
+        # inferido y se rehace con todos, la misma que calcula finder
+        canonical = [(canonical_key(row[2], row[4]), row[6]) for row in rows if row[2].strip()]
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO input_rows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.conn.executemany("UPDATE results SET canonical_key = ?1 WHERE query_key = ?2 AND canonical_key IS NOT ?1",
+                                  canonical)
+        return len(rows)
+
+    def stale_files(self, directory):
+        """Exports nuevos, modificados (por tamaño/mtime) o borrados desde el último sync, sin leerlos"""
+        with self.lock:
+            known = {row['name']: (row['size'], row['mtime']) for row in self.conn.execute("SELECT * FROM input_files")}
+        present = [f for f in os.listdir(directory) if f.endswith('.csv') and not f.startswith('_')]
+        stale = []
+        for f in present:
+            st = os.stat(os.path.join(directory, f))
+            if known.get(f) != (st.st_size, st.st_mtime):
+                stale.append(f)
+        return stale + sorted(set(known) - set(present))
+
+    def _expired_before(self):
+        return time.time() - self.not_found_ttl
+
+    def pending_counts(self):
+        """{source_file: canciones pendientes} según el índice"""
+        with self.lock:
+            rows = self.conn.execute("SELECT r.source_file, COUNT(*)" + PENDING_FROM + "GROUP BY r.source_file",
+                                     (self._expired_before(),)).fetchall()
+        return {r[0]: r[1] for r in rows}
+
+    def pending(self, source_file=None):
+        """Canciones de los exports que aún no se han escrito en el CSV de su playlist, con las
+        columnas que espera finder.process, en un único DataFrame"""
+        import pandas as pd
+        chunks = list(self.iter_pending(source_file))
+        return pd.concat(chunks, ignore_index=True) if chunks else self._pending_frame([])
+
+    def iter_pending(self, source_file=None, chunk_rows=INPUT_CHUNK_ROWS):
+        """Como pending(), pero en bloques de chunk_rows filas. Cada bloque es una consulta nueva que sigue
+        a la anterior por clave primaria, así que se puede escribir en la caché mientras se recorre"""
+        last = ('', -(1 << 63))
+        while True:
+            query = PENDING_SQL + " AND (r.source_file, r.fingerprint) > (?, ?)"
+            params = (self._expired_before(),) + last
+            if source_file is not None:
+                query += " AND r.source_file = ?"
+                params += (source_file,)
+            with self.lock:
+                rows = self.conn.execute(query + " ORDER BY r.source_file, r.fingerprint LIMIT ?",
+                                         params + (chunk_rows,)).fetchall()
+            if not rows:
+                return
+            last = (rows[-1]['source_file'], rows[-1]['fingerprint'])
+            yield self._pending_frame(rows)
+
+    def _pending_frame(self, rows):
+        import pandas as pd
+        df = pd.DataFrame([tuple(r)[:len(PENDING_COLUMNS)] for r in rows], columns=PENDING_COLUMNS)
+        df['Expected Duration (s)'] = df['Duration (ms)'] / 1000
+        return df
+
+    def pending_total(self, source_file=None):
+        counts = self.pending_counts()
+        return counts.get(source_file, 0) if source_file is not None else sum(counts.values())
+
+    def tags(self, source_file=None):
+        """{(source_file, query_key): {campo: valor}} con los campos de Exportify que traen valor, para
+        etiquetar las descargas"""
+        query = f"SELECT source_file, query_key, {', '.join(TAG_FIELDS)} FROM input_rows"
+        params = ()
+        if source_file is not None:
+            query += " WHERE source_file = ?"
+            params = (source_file,)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return {(row['source_file'], row['query_key']): {field: row[field] for field in TAG_FIELDS if row[field]}
+                for row in rows}
+
+    def watch(self, directory, normalize, on_pending, interval=INPUT_WATCH_SECONDS):
+        """Comprueba directory cada interval segundos y llama a on_pending(bloques, total) cuando hay
+        canciones pendientes (bloques = iter_pending()). Termina con Ctrl+C"""
+        try:
+            while True:
+                changes = self.sync(directory, normalize)
+                for source_file, (added, removed) in changes.items():
+                    print(f"📥 {source_file}: {added} filas nuevas, {removed} eliminadas")
+                total = self.pending_total()
+                if total:
+                    on_pending(self.iter_pending(), total)
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("👋 Fin de la vigilancia.")
@@ -0,0 +1,181 @@
+import os
+import sys
+import queue
+import atexit
+import logging
+import multiprocessing
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+from time import monotonic
+
+from config import LOGS_DIR, LOG_CONSOLE_RATE, LOG_FLUSH_SECONDS, LOG_MAX_OPEN_FILES
+
+# logqueue.py
+# Logs de todos los procesos y hilos por una sola cola. Quien registra solo formatea y encola (no toca
+# disco ni consola); un listener en el proceso principal escribe por lotes un fichero por playlist
+# (logs/<playlist>.log, o logs/spotify_dl.log si el registro no es de ninguna) y saca por consola, sin
+# romper las barras de tqdm, como mucho LOG_CONSOLE_RATE líneas por segundo.
+#
+#   log = get_logger('MiPlaylist'); log.info("...")    -> arranca el listener si hace falta
+#   Process(target=worker, args=(..., log_queue()))   -> en el hijo: attach(q)
+
+LOGGER_NAME = 'spotify_dl'
+DEFAULT_FILE = 'spotify_dl'
+
+_queue = None
+_listener = None
+
+class PlaylistFileHandler(logging.Handler):
+    """Un fichero por playlist (atributo 'playlist' del registro) con buffer; se vuelca cada
+    LOG_FLUSH_SECONDS o cuando la cola se queda vacía"""
+
+    def __init__(self, directory=LOGS_DIR, max_open=LOG_MAX_OPEN_FILES):
+        super().__init__()
+        self.directory = directory
+        self.max_open = max_open
+        self.files = OrderedDict()
+        self.last_flush = monotonic()
+        self.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s: %(message)s'))
+
+    def _file(self, name):
+        f = self.files.pop(name, None)
+        if f is None:
+            if len(self.files) >= self.max_open:
+                self.files.popitem(last=False)[1].close()
+            os.makedirs(self.directory, exist_ok=True)
+            f = open(os.path.join(self.directory, f"{name}.log"), 'a', encoding='utf-8', buffering=1 << 16)
+        self.files[name] = f  # al final: el menos usado es el primero en cerrarse
+        return f
+
+    def emit(self, record):
+        try:
+            self._file(getattr(record, 'playlist', None) or DEFAULT_FILE).write(self.format(record) + '\n')
+            if monotonic() - self.last_flush >= LOG_FLUSH_SECONDS:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        for f in self.files.values():
+            f.flush()
+        self.last_flush = monotonic()
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files.clear()
+        super().close()
+
+class ConsoleHandler(logging.Handler):
+    """Consola con límite de líneas por segundo (token bucket). Usa tqdm.write si hay barras activas"""
+
+    def __init__(self, rate=LOG_CONSOLE_RATE):
+        super().__init__()
+        self.rate = rate
+        self.tokens = rate
+        self.last = monotonic()
+        self.dropped = 0
+        self.setFormatter(logging.Formatter('%(message)s'))
+
+    def write(self, line):
+        tqdm = sys.modules.get('tqdm')
+        if tqdm is not None:
+            tqdm.tqdm.write(line)
+        else:
+            print(line, flush=True)
+
+    def emit(self, record):
+        now = monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens < 1:
+            self.dropped += 1
+            return
+        self.tokens -= 1
+        if self.dropped:
+            self.write(f"… {self.dropped} mensajes más (solo en {LOGS_DIR}/)")
+            self.dropped = 0
+        self.write(self.format(record))
+
+    def close(self):
+        if self.dropped:
+            self.write(f"… {self.dropped} mensajes más (solo en {LOGS_DIR}/)")
+            self.dropped = 0
+        super().close()
+
+class Listener(QueueListener):
+    """QueueListener que aprovecha los huecos sin registros para volcar los ficheros"""
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(timeout=LOG_FLUSH_SECONDS)
+            except queue.Empty:
+                for handler in self.handlers:
+                    handler.flush()
+
+def _configure(q):
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(QueueHandler(q))
+
+def start(console=True):
+    """Arranca el listener en este proceso (una vez) y devuelve la cola"""
+    global _queue, _listener
+    if _listener is not None:
+        return _queue
+    _queue = multiprocessing.Queue()
+    handlers = [PlaylistFileHandler()] + ([ConsoleHandler()] if console else [])
+    _listener = Listener(_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    _configure(_queue)
+    atexit.register(stop)
+    return _queue
+
+def stop():
+    """Vacía la cola, cierra los ficheros y para el listener"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+def log_queue():
+    """Cola para pasar a los procesos hijos"""
+    return start() if _queue is None else _queue
+
+def attach(q):
+    """En un proceso hijo: manda sus registros a la cola del listener del principal"""
+    global _queue
+    _queue = q
+    _configure(q)
+
+def get_logger(playlist=None):
+    """Logger que etiqueta sus registros con la playlist (decide el fichero de log)"""
+    if _queue is None:
+        start()
+    return logging.LoggerAdapter(logging.getLogger(LOGGER_NAME), {'playlist': playlist})
+
+class YdlLogger:
+    """Adaptador para el parámetro 'logger' de yt_dlp: su salida normal (progreso) se descarta y los
+    avisos y errores van al log de la playlist"""
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def debug(self, msg):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def warning(self, msg):
+        self.logger.warning(msg)
+
+    def error(self, msg):
+        self.logger.error(msg)
@@ -0,0 +1,95 @@
+import os
+import sqlite3
+import subprocess
+from threading import Lock
+
+import mutagen
+
+from metrics import incr, span
+from config import FFPROBE_PATH, MANIFEST_DB
+
+# media.py
+# Duración de los ficheros de audio ya descargados. Se lee la cabecera en el propio proceso con
+# mutagen (ffprobe solo como último recurso) y se guarda en un manifiesto indexado por
+# (ruta, tamaño, mtime): un fichero que no ha cambiado no se vuelve a abrir.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS manifest (
+    path     TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    mtime    REAL NOT NULL,
+    duration REAL
+);
+"""
+
+def probe_duration(path):
+    """Duración en segundos leyendo la cabecera con mutagen; ffprobe si mutagen no sabe leerla"""
+    try:
+        audio = mutagen.File(path)
+        if audio is not None and audio.info and audio.info.length:
+            return float(audio.info.length)
+    except Exception:
+        pass
+    return ffprobe_duration(path)
+
+def ffprobe_duration(path):
+    try:
+        result = subprocess.run([
+            FFPROBE_PATH,
+            '-v', 'error', '-show_entries',
+            'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1',
+            path
+        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        return float(result.stdout.strip())
+    except:
+        return None
+
+class DurationManifest:
+    def __init__(self, path=MANIFEST_DB):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = Lock()
+        # Varios procesos de descarga comparten el manifiesto: WAL y espera si está bloqueado
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def duration(self, path):
+        """Duración de path, o None si no existe o no se puede leer"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        key = os.path.abspath(path)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime, duration FROM manifest WHERE path = ?", (key,)
+            ).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime:
+            incr('manifest_hit')
+            return row[2]
+
+        with span('probe'):
+            duration = probe_duration(path)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO manifest (path, size, mtime, duration) VALUES (?, ?, ?, ?)",
+                (key, st.st_size, st.st_mtime, duration)
+            )
+        return duration
+
+# Manifiesto por proceso, abierto bajo demanda (una conexión SQLite no sobrevive a un fork)
+_manifest = None
+_manifest_pid = None
+
+def get_audio_duration(path):
+    global _manifest, _manifest_pid
+    if _manifest is None or _manifest_pid != os.getpid():
+        _manifest = DurationManifest()
+        _manifest_pid = os.getpid()
+    return _manifest.duration(path)
@@ -0,0 +1,168 @@
+import os
+import json
+import time
+from threading import Lock
+from contextlib import contextmanager
+
+from config import METRICS_ENABLED, METRICS_EVENTS, METRICS_PROM, METRICS_FLUSH_EVENTS
+
+# metrics.py
+# Instrumentación: tramos con tiempo (span) por etapa y contadores. Cada proceso acumula eventos en
+# memoria y los vuelca por lotes a un JSONL compartido (append de líneas completas). snapshot() agrega
+# ese JSONL en un fichero de texto de Prometheus (textfile collector) que se puede vigilar o alertar.
+
+# Etapas instrumentadas: search, select, download, download_segments, transcode, probe, csv_write, verify_decode
+# Contadores: cache_hit, canonical_hit, skip, not_found, retry, ip_rotation, store_link, search_widen,
+#   manifest_hit, download_resume, concurrency_change, verify_cache_hit
+
+BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+
+class Metrics:
+    def __init__(self, events_path=METRICS_EVENTS, flush_events=METRICS_FLUSH_EVENTS):
+        self.events_path = events_path
+        self.flush_events = flush_events
+        self.pid = os.getpid()
+        self.buffer = []
+        self.lock = Lock()
+
+    def emit(self, event):
+        event['ts'] = time.time()
+        event['pid'] = self.pid
+        with self.lock:
+            self.buffer.append(event)
+            if len(self.buffer) >= self.flush_events:
+                self._flush_locked()
+
+    @contextmanager
+    def span(self, stage, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.emit({'type': 'span', 'stage': stage, 'seconds': time.perf_counter() - start, **labels})
+
+    def incr(self, counter, n=1, **labels):
+        self.emit({'type': 'counter', 'counter': counter, 'value': n, **labels})
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.buffer:
+            return
+        os.makedirs(os.path.dirname(self.events_path) or '.', exist_ok=True)
+        data = ''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in self.buffer)
+        with open(self.events_path, 'a', encoding='utf-8') as f:
+            f.write(data)
+        self.buffer.clear()
+
+class Snapshot:
+    """Agrega el JSONL de eventos de forma incremental (solo lee lo añadido desde la última vez)"""
+
+    def __init__(self, events_path=METRICS_EVENTS, prom_path=METRICS_PROM):
+        self.events_path = events_path
+        self.prom_path = prom_path
+        self.offset = 0
+        self.counters = {}
+        self.spans = {}
+
+    def update(self):
+        if not os.path.exists(self.events_path):
+            return
+        if os.path.getsize(self.events_path) < self.offset:
+            # El JSONL se ha borrado o rotado: se agrega de nuevo desde el principio
+            self.offset = 0
+            self.counters = {}
+            self.spans = {}
+        with open(self.events_path, 'rb') as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # línea a medio escribir: se lee en la próxima
+                self.offset += len(line)
+                event = json.loads(line)
+                if event['type'] == 'counter':
+                    name = event['counter']
+                    self.counters[name] = self.counters.get(name, 0) + event['value']
+                elif event['type'] == 'span':
+                    hist = self.spans.setdefault(event['stage'], {'count': 0, 'sum': 0.0, 'buckets': [0] * len(BUCKETS)})
+                    hist['count'] += 1
+                    hist['sum'] += event['seconds']
+                    for i, le in enumerate(BUCKETS):
+                        if event['seconds'] <= le:
+                            hist['buckets'][i] += 1
+
+    def write(self, gauges=None):
+        """Escribe el fichero .prom (rename atómico para que el collector nunca lea uno a medias)"""
+        self.update()
+        lines = [
+            '# HELP spotify_dl_stage_seconds Duración de cada etapa',
+            '# TYPE spotify_dl_stage_seconds histogram',
+        ]
+        for stage, hist in sorted(self.spans.items()):
+            for le, n in zip(BUCKETS, hist['buckets']):
+                le = '+Inf' if le == float('inf') else repr(le)
+                lines.append(f'spotify_dl_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {n}')
+            lines.append(f'spotify_dl_stage_seconds_sum{{stage="{stage}"}} {hist["sum"]}')
+            lines.append(f'spotify_dl_stage_seconds_count{{stage="{stage}"}} {hist["count"]}')
+
+        lines += ['# HELP spotify_dl_events_total Contadores de eventos', '# TYPE spotify_dl_events_total counter']
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'spotify_dl_events_total{{event="{name}"}} {value}')
+
+        for name, value in sorted((gauges or {}).items()):
+            lines += [f'# TYPE spotify_dl_{name} gauge', f'spotify_dl_{name} {value}']
+        lines += ['# TYPE spotify_dl_last_update_timestamp gauge', f'spotify_dl_last_update_timestamp {time.time()}']
+
+        tmp = self.prom_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp, self.prom_path)
+
+class NullMetrics:
+    """Sustituto cuando METRICS_ENABLED = False"""
+
+    @contextmanager
+    def span(self, stage, **labels):
+        yield
+
+    def incr(self, counter, n=1, **labels):
+        pass
+
+    def flush(self):
+        pass
+
+# Instancia por proceso (se recrea tras un fork para no mezclar buffers)
+_metrics = None
+# Agregado del JSONL compartido por las llamadas a write_snapshot de este proceso: cada una lee solo lo nuevo
+_snapshot = None
+
+def get_metrics():
+    global _metrics
+    if _metrics is None or (METRICS_ENABLED and _metrics.pid != os.getpid()):
+        _metrics = Metrics() if METRICS_ENABLED else NullMetrics()
+    return _metrics
+
+def span(stage, **labels):
+    return get_metrics().span(stage, **labels)
+
+def incr(counter, n=1, **labels):
+    get_metrics().incr(counter, n, **labels)
+
+def flush():
+    get_metrics().flush()
+
+def write_snapshot(snapshot=None, gauges=None):
+    """Vuelca los eventos de este proceso y regenera el .prom. Sin snapshot usa el del proceso, que
+    sigue leyendo el JSONL desde donde se quedó. Devuelve el Snapshot usado"""
+    global _snapshot
+    if not METRICS_ENABLED:
+        return snapshot
+    flush()
+    if snapshot is None:
+        if _snapshot is None:
+            _snapshot = Snapshot()
+        snapshot = _snapshot
+    snapshot.write(gauges)
+    return snapshot
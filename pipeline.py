@@ -0,0 +1,163 @@
+import os
+from queue import Queue
+from threading import Thread, Lock
+from time import time
+
+from cache import ResultCache, make_key, video_link, video_id_from_link
+from concurrency import DOWNLOAD, TRANSCODE, Controller, Gate
+from config import ensure_dirs, DOWNLOADS_DIR, DOWNLOAD_WORKERS_MAX, EXPORT_RESULT_DIR, PIPELINE_QUEUE_SIZE, INCOMING_DIR, \
+    TRANSCODE_CONCURRENCY
+from download_v2 import (WarmDownloader, already_valid, download_opts, fetch_task, link_task,
+                         pascal_to_title_case, transcode_task)
+from metrics import write_snapshot
+from ratelimit import get_limiter
+from store import stored_path
+from finder import pending_exports, process
+from logqueue import get_logger
+from inputs import InputIndex
+
+# pipeline.py
+# Modo en streaming: cada enlace que resuelve finder pasa directamente a la etapa de descarga
+# (red) y de ahí a la de conversión + metadatos (CPU). Las colas entre etapas están acotadas,
+# así que si las descargas van por detrás, las búsquedas esperan (backpressure).
+
+STOP = None  # centinela de fin para cada etapa
+
+def fail_waiters(video_id, inflight, stats, error):
+    """Da por fallidas todas las tareas que esperaban video_id. La primera ya la registró fetch_task o
+    transcode_task; el resto se registra aquí, cada una en el log de su playlist"""
+    with inflight['lock']:
+        tasks = inflight.pop(video_id)
+    for artist, title, url, video_title, expected_duration, outdir, tags in tasks[1:]:
+        get_logger(os.path.basename(outdir)).error(f"❌ Error: {error} - {artist} - {title}")
+    with stats['lock']:
+        stats['failed'] += len(tasks)
+
+def download_stage(download_q, transcode_q, inflight, stats, gate):
+    downloader = WarmDownloader(download_opts())
+    while True:
+        task = download_q.get()
+        if task is STOP:
+            break
+
+        artist, title, url, video_title, expected_duration, outdir, tags = task
+        if already_valid(outdir, video_title, expected_duration):
+            get_logger(os.path.basename(outdir)).info(f"✅ Ya existe: {title}")
+            continue
+
+        # Si otro hilo ya está descargando este vídeo, esta playlist se publica cuando termine
+        video_id = video_id_from_link(url)
+        with inflight['lock']:
+            if video_id in inflight:
+                inflight[video_id].append(task)
+                continue
+            inflight[video_id] = [task]
+
+        stored = stored_path(video_id)
+        if stored:
+            transcode_q.put((video_id, None, stored))
+            continue
+
+        # Los errores ya los registra fetch_task
+        with gate.slot(DOWNLOAD):
+            src, _ = fetch_task(downloader, task)
+        if src is not None:
+            gate.done(DOWNLOAD)
+            transcode_q.put((video_id, src, None))
+        else:
+            fail_waiters(video_id, inflight, stats, "descarga fallida")
+    downloader.reset()
+
+def transcode_stage(transcode_q, inflight, stats, gate):
+    while True:
+        item = transcode_q.get()
+        if item is STOP:
+            break
+
+        video_id, src, stored = item
+        if stored is None:
+            with inflight['lock']:
+                first = inflight[video_id][0]
+            with gate.slot(TRANSCODE):
+                ok, _ = transcode_task([first], src)
+            if not ok:
+                fail_waiters(video_id, inflight, stats, "conversión fallida")
+                continue
+            gate.done(TRANSCODE)
+            with inflight['lock']:
+                rest = inflight.pop(video_id)[1:]
+        else:
+            with inflight['lock']:
+                rest = inflight.pop(video_id)
+
+        stored = stored_path(video_id)
+        if stored and rest:
+            link_task(rest, stored)
+
+        with stats['lock']:
+            stats['done'] += 1
+            if stats['first_file'] is None:
+                stats['first_file'] = time() - stats['start']
+                get_logger().info(f"🎵 Primer fichero listo en {stats['first_file']:.1f}s")
+
+def run(source, cache, total=None):
+    """Busca y descarga source (bloques de pending_exports, o lo que acepte finder.process) en un único
+    pase encadenado"""
+    download_q = Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    transcode_q = Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    stats = {'start': time(), 'first_file': None, 'done': 0, 'failed': 0, 'lock': Lock()}
+    # video_id -> tareas (playlists) que esperan ese vídeo; 'lock' protege el dict
+    inflight = {'lock': Lock()}
+    os.makedirs(INCOMING_DIR, exist_ok=True)
+
+    # ffmpeg corre en su propio proceso, así que bastan hilos para la etapa de CPU. Hilos hasta el máximo
+    # de cada etapa; el controlador decide cuántos descargan o convierten a la vez
+    gate = Gate()
+    controller = Controller(gate, get_limiter(), backlog=transcode_q.qsize).start()
+    downloaders = [Thread(target=download_stage, args=(download_q, transcode_q, inflight, stats, gate))
+                   for _ in range(DOWNLOAD_WORKERS_MAX)]
+    transcoders = [Thread(target=transcode_stage, args=(transcode_q, inflight, stats, gate))
+                   for _ in range(TRANSCODE_CONCURRENCY)]
+    for t in downloaders + transcoders:
+        t.start()
+    tags = InputIndex(cache).tags()
+
+    def on_result(source_file, artist, title, video_id, video_title, duration):
+        outdir = os.path.join(DOWNLOADS_DIR, pascal_to_title_case(source_file))
+        os.makedirs(outdir, exist_ok=True)
+        # Bloquea si la etapa de descarga está llena
+        download_q.put((artist, title, video_link(video_id), video_title or title, duration, outdir,
+                        tags.get((source_file, make_key(artist, title)), {})))
+
+    try:
+        process(source, cache, name_override="combined", on_result=on_result, total=total)
+    finally:
+        for _ in downloaders:
+            download_q.put(STOP)
+        for t in downloaders:
+            t.join()
+        for _ in transcoders:
+            transcode_q.put(STOP)
+        for t in transcoders:
+            t.join()
+        controller.stop()
+
+    write_snapshot(gauges={'rate_limit_current': get_limiter().current_rate(), **controller.gauges()})
+    elapsed = time() - stats['start']
+    failed = f", {stats['failed']} canciones fallidas" if stats['failed'] else ""
+    print(f"\n✅ Pipeline terminado: {stats['done']} ficheros en {elapsed:.1f}s{failed}")
+
+def main():
+    ensure_dirs()
+    cache = ResultCache()
+    cache.sync_csvs(EXPORT_RESULT_DIR)
+
+    chunks, total = pending_exports(cache)
+    if not total:
+        print("✅ Todo ya está procesado según la caché.")
+        return
+
+    run(chunks, cache, total)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+import time
+import random
+import multiprocessing
+
+from logqueue import get_logger
+from metrics import incr
+from config import (USE_TORSOCKS, RATE_LIMIT_INITIAL, RATE_LIMIT_MIN, RATE_LIMIT_MAX, RATE_LIMIT_INCREASE,
+                    RATE_LIMIT_BACKOFF_BASE, RATE_LIMIT_BACKOFF_MAX, renew_tor_ip)
+
+# ratelimit.py
+# Limitador de peticiones compartido entre hilos y procesos (finder, download, download_v2).
+# Token bucket con AIMD: cada éxito sube el ritmo un poco, cada 429 lo divide a la mitad y abre
+# una ventana de espera exponencial con jitter. Solo el primer 429 de cada "generación" rota la IP;
+# los 429 de peticiones lanzadas antes de esa rotación no vuelven a rotarla.
+
+# Posiciones en el array compartido
+RATE, TOKENS, LAST_REFILL, BACKOFF_UNTIL, GENERATION, STRIKES, ROTATIONS, EVENTS = range(8)
+
+def is_rate_limited(e):
+    msg = str(e).lower()
+    return "429" in msg or "rate limit" in msg or "too many requests" in msg
+
+class RateLimiter:
+    def __init__(self, rate=RATE_LIMIT_INITIAL, min_rate=RATE_LIMIT_MIN, max_rate=RATE_LIMIT_MAX,
+                 increase=RATE_LIMIT_INCREASE, backoff_base=RATE_LIMIT_BACKOFF_BASE,
+                 backoff_max=RATE_LIMIT_BACKOFF_MAX, rotate=None):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rotate = rotate
+
+        # Memoria compartida: se hereda al pasar el limitador como argumento de un Process
+        self.lock = multiprocessing.Lock()
+        self.state = multiprocessing.RawArray('d', 8)
+        self.state[RATE] = rate
+        self.state[TOKENS] = 1
+        self.state[LAST_REFILL] = time.time()
+
+    def acquire(self):
+        """Espera a tener un token. Devuelve la generación actual (para pasarla a on_rate_limited)"""
+        while True:
+            with self.lock:
+                now = time.time()
+                s = self.state
+                if now < s[BACKOFF_UNTIL]:
+                    wait = s[BACKOFF_UNTIL] - now
+                else:
+                    burst = max(1.0, s[RATE])
+                    s[TOKENS] = min(burst, s[TOKENS] + (now - s[LAST_REFILL]) * s[RATE])
+                    s[LAST_REFILL] = now
+                    if s[TOKENS] >= 1:
+                        s[TOKENS] -= 1
+                        return int(s[GENERATION])
+                    wait = (1 - s[TOKENS]) / s[RATE]
+            time.sleep(wait)
+
+    def on_success(self):
+        with self.lock:
+            self.state[RATE] = min(self.max_rate, self.state[RATE] + self.increase)
+            self.state[STRIKES] = 0
+
+    def on_rate_limited(self, generation):
+        """Registra un 429. Devuelve True si esta llamada ha rotado la IP"""
+        with self.lock:
+            s = self.state
+            s[EVENTS] += 1
+            if generation != int(s[GENERATION]):
+                return False  # Ya gestionado por otro worker tras esta petición
+
+            s[GENERATION] += 1
+            s[STRIKES] += 1
+            s[RATE] = max(self.min_rate, s[RATE] / 2)
+            s[TOKENS] = 0
+
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (s[STRIKES] - 1))
+            s[BACKOFF_UNTIL] = time.time() + random.uniform(delay / 2, delay)
+
+            rotate = self.rotate is not None
+            if rotate:
+                s[ROTATIONS] += 1
+
+        if rotate:
+            incr('ip_rotation')
+            try:
+                self.rotate()
+            except Exception as e:
+                get_logger().warning(f"⚠️ No se pudo rotar la IP: {e}")
+        return rotate
+
+    def run(self, fn, max_retries=3, log=None, on_retry=None):
+        """Ejecuta fn() respetando el límite. Reintenta solo los rate limit, hasta max_retries veces"""
+        log = log or get_logger().warning
+        attempt = 0
+        while True:
+            generation = self.acquire()
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_rate_limited(e):
+                    raise
+                attempt += 1
+                if self.on_rate_limited(generation):
+                    log("🔁 Rate limited, cambiando IP con Tor...")
+                if attempt >= max_retries:
+                    raise
+                incr('retry')
+                if on_retry:
+                    on_retry()
+                continue
+            self.on_success()
+            return result
+
+    def current_rate(self):
+        return self.state[RATE]
+
+    def snapshot(self):
+        with self.lock:
+            s = self.state
+            return {
+                'rate': s[RATE],
+                'rate_limited_events': int(s[EVENTS]),
+                'ip_rotations': int(s[ROTATIONS]),
+                'backoff_remaining': max(0.0, s[BACKOFF_UNTIL] - time.time()),
+            }
+
+# Limitador del proceso actual. Los procesos hijos reciben el del padre y lo instalan con set_limiter
+_limiter = None
+
+def get_limiter():
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter(rotate=renew_tor_ip if USE_TORSOCKS else None)
+    return _limiter
+
+def set_limiter(limiter):
+    global _limiter
+    _limiter = limiter
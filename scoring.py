@@ -0,0 +1,123 @@
+import re
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+from trackkey import fold
+from config import DURATION_TOLERANCE
+
+# scoring.py
+# Puntuación de candidatos de YouTube para una canción. En lugar de quedarse con el primer resultado
+# "oficial", puntúa todos con una tabla de patrones precompilada, la cercanía de duración y la
+# similitud de artista/título, y devuelve el mejor. Las normalizaciones se memorizan, así que sirve
+# igual para una búsqueda suelta que para puntuar miles de canciones seguidas (best_many).
+
+# Variantes que casi nunca son la canción original (salvo que el propio título las pida)
+SKIP_TERMS = ('live', 'lyric', 'lyrics', 'cover', 'remix', 'nightcore', 'sped up', 'slowed',
+              'karaoke', 'instrumental', '8d', 'reverb', 'acoustic')
+OFFICIAL_TITLE_RE = re.compile(r'\b(official|audio|video)\b')
+OFFICIAL_CHANNEL_RE = re.compile(r'(vevo|- topic|\btopic\b)')
+SKIP_RE = re.compile(r'\b(' + '|'.join(re.escape(term) for term in SKIP_TERMS) + r')\b')
+TOKEN_RE = re.compile(r'[^\W_]+')
+
+# Pesos de cada componente
+W_DURATION = 2.0
+W_TITLE = 1.5
+W_ARTIST = 1.0
+W_OFFICIAL = 0.5
+W_SKIP = 2.0
+
+# Similitud de título mínima para aceptar un candidato sin seguir buscando
+ACCEPT_TITLE = 0.6
+
+# Minúsculas, sin acentos y NFKC: la misma normalización que la clave canónica (memorizada allí)
+normalize = fold
+
+@lru_cache(maxsize=65536)
+def tokens(text):
+    return frozenset(TOKEN_RE.findall(normalize(text)))
+
+@lru_cache(maxsize=65536)
+def skip_terms(text):
+    return frozenset(SKIP_RE.findall(text))
+
+class Wanted:
+    """Lo que se busca, preparado una vez por canción y reutilizado para cada candidato.
+    difflib analiza seq2 al fijarla, así que el texto buscado va ahí y el candidato en seq1."""
+
+    def __init__(self, text):
+        self.text = normalize(text)
+        self.tokens = tokens(text)
+        self.matcher = SequenceMatcher(None, autojunk=False)
+        self.matcher.set_seq2(self.text)
+
+    def similarity(self, found):
+        """0..1: fracción de palabras buscadas presentes en found, o el ratio de difflib si es mayor
+        (cubre erratas y palabras pegadas)"""
+        if not self.tokens:
+            return 1.0
+        coverage = len(self.tokens & tokens(found)) / len(self.tokens)
+        if coverage == 1.0:
+            return coverage
+        self.matcher.set_seq1(found)
+        # Cotas baratas primero: si ni siquiera pueden superar la cobertura, no hace falta el ratio
+        if self.matcher.real_quick_ratio() <= coverage or self.matcher.quick_ratio() <= coverage:
+            return coverage
+        return max(coverage, self.matcher.ratio())
+
+def similarity(wanted, found):
+    return Wanted(wanted).similarity(normalize(found))
+
+def duration_score(duration, expected_duration, tolerance=DURATION_TOLERANCE):
+    """1 dentro de la tolerancia; cae linealmente hasta 0 a 30 s fuera de ella"""
+    if expected_duration is None:
+        return 1.0
+    diff = abs(duration - expected_duration)
+    if diff <= tolerance:
+        return 1.0
+    return max(0.0, 1 - (diff - tolerance) / 30)
+
+def score(entry, artist, title, expected_duration=None):
+    """Devuelve (puntuación, aceptable) o None si el candidato no sirve (sin duración).
+    artist y title son Wanted (ver rank)"""
+    duration = entry.get('duration')
+    if not duration:
+        return None
+
+    found_title = normalize(entry.get('title') or '')
+    channel = normalize(entry.get('uploader') or '')
+
+    skipped = bool(skip_terms(found_title) - skip_terms(title.text))
+    official = bool(OFFICIAL_TITLE_RE.search(found_title) or OFFICIAL_CHANNEL_RE.search(channel))
+    dur = duration_score(duration, expected_duration)
+    title_sim = title.similarity(found_title)
+    artist_sim = artist.similarity(f"{found_title} {channel}")
+
+    total = (W_DURATION * dur + W_TITLE * title_sim + W_ARTIST * artist_sim +
+             W_OFFICIAL * official - W_SKIP * skipped)
+    acceptable = dur == 1.0 and not skipped and title_sim >= ACCEPT_TITLE and (official or artist_sim >= 0.5)
+    return total, acceptable
+
+def rank(entries, artist='', title='', expected_duration=None):
+    """Candidatos válidos ordenados de mejor a peor, como [(puntuación, aceptable, entry)]: primero los
+    aceptables y, dentro de cada grupo, por puntuación"""
+    artist, title = Wanted(artist), Wanted(title)
+    scored = []
+    for entry in entries:
+        result = score(entry, artist, title, expected_duration)
+        if result is not None:
+            scored.append((*result, entry))
+    scored.sort(key=lambda s: (s[1], s[0]), reverse=True)
+    return scored
+
+def best(entries, artist='', title='', expected_duration=None):
+    """Devuelve (mejor entry o None, aceptable). Si alguno es aceptable, el aceptable de más puntuación"""
+    ranked = rank(entries, artist, title, expected_duration)
+    if not ranked:
+        return None, False
+    _, acceptable, entry = ranked[0]
+    return entry, acceptable
+
+def best_many(items):
+    """items: iterable de (entries, artist, title, expected_duration). Genera (entry, aceptable) por canción"""
+    for entries, artist, title, expected_duration in items:
+        yield best(entries, artist, title, expected_duration)
@@ -0,0 +1,126 @@
+import os
+import json
+import urllib.request
+from threading import Event, Lock
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+
+from metrics import incr, span
+from config import DOWNLOAD_SEGMENTS, SEGMENT_MIN_BYTES, SEGMENT_STATE_BYTES
+
+# segmented.py
+# Descarga de un fichero en varios tramos con peticiones HTTP Range en paralelo, útil cuando una sola
+# conexión TCP limita el ritmo (latencia alta, Tor). El progreso se guarda en <destino>.part.json junto al
+# .part: si el proceso muere o un 429 corta la descarga, el siguiente intento sigue cada tramo desde donde
+# se quedó en lugar de empezar de cero. Si el servidor no acepta rangos, download() devuelve False y
+# quien llama descarga como siempre.
+
+CHUNK = 64 * 1024
+
+def make_opener(proxy=None):
+    handlers = [urllib.request.ProxyHandler({'http': proxy, 'https': proxy})] if proxy else []
+    return urllib.request.build_opener(*handlers)
+
+def probe(opener, url, headers):
+    """Tamaño total y si el servidor responde a rangos (pide solo el primer byte)"""
+    req = urllib.request.Request(url, headers={**headers, 'Range': 'bytes=0-0'})
+    with opener.open(req) as resp:
+        if resp.status == 206:
+            total = resp.headers.get('Content-Range', '').rsplit('/', 1)[-1]
+            return (int(total), True) if total.isdigit() else (0, False)
+        return int(resp.headers.get('Content-Length') or 0), False
+
+def split(size, segments, min_bytes=SEGMENT_MIN_BYTES):
+    """Tramos [inicio, fin, bytes_hechos] que cubren size (fin inclusivo, como en Range)"""
+    n = max(1, min(segments, size // max(1, min_bytes)))
+    step = -(-size // n)
+    return [[start, min(size, start + step) - 1, 0] for start in range(0, size, step)]
+
+class Download:
+    def __init__(self, url, dst, headers=None, proxy=None, segments=DOWNLOAD_SEGMENTS):
+        self.url = url
+        self.dst = dst
+        self.part = dst + '.part'
+        self.state_path = dst + '.part.json'
+        self.headers = headers or {}
+        self.opener = make_opener(proxy)
+        self.segments = segments
+        self.state = None
+        self.lock = Lock()
+        self.stop = Event()
+        self.unsaved = 0
+
+    def load_state(self, size):
+        """Progreso de un intento anterior, si corresponde al mismo fichero"""
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if state.get('size') != size or not os.path.exists(self.part) or os.path.getsize(self.part) != size:
+            return None
+        return state
+
+    def save_state(self):
+        tmp = self.state_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.state_path)
+
+    def run(self):
+        size, ranged = probe(self.opener, self.url, self.headers)
+        if not ranged or not size:
+            return False
+
+        self.state = self.load_state(size)
+        if self.state is None:
+            self.state = {'size': size, 'segments': split(size, self.segments)}
+            with open(self.part, 'wb') as f:
+                f.truncate(size)  # fichero disperso: cada tramo escribe en su posición
+            self.save_state()
+        else:
+            incr('download_resume')
+
+        pending = [seg for seg in self.state['segments'] if seg[0] + seg[2] <= seg[1]]
+        try:
+            with span('download_segments', segments=len(pending)), \
+                    ThreadPoolExecutor(max_workers=max(1, len(pending))) as pool:
+                futures = [pool.submit(self.fetch, seg) for seg in pending]
+                done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+                # Al primer error se para el resto; el progreso queda guardado para el reintento
+                if any(f.exception() for f in done):
+                    self.stop.set()
+                for f in futures:
+                    f.result()
+        finally:
+            with self.lock:
+                self.save_state()
+
+        os.replace(self.part, self.dst)
+        os.remove(self.state_path)
+        return True
+
+    def fetch(self, seg):
+        start, end, _ = seg
+        req = urllib.request.Request(self.url, headers={**self.headers, 'Range': f"bytes={start + seg[2]}-{end}"})
+        # Sin buffer: lo que cuenta seg[2] ya está en el fichero cuando otro hilo guarda el estado
+        with self.opener.open(req) as resp, open(self.part, 'r+b', buffering=0) as f:
+            if resp.status != 206:
+                raise IOError(f"El servidor dejó de aceptar rangos (HTTP {resp.status})")
+            f.seek(start + seg[2])
+            while not self.stop.is_set():
+                chunk = resp.read(min(CHUNK, end - start - seg[2] + 1))
+                if not chunk:
+                    break
+                f.write(chunk)
+                with self.lock:
+                    seg[2] += len(chunk)
+                    self.unsaved += len(chunk)
+                    if self.unsaved >= SEGMENT_STATE_BYTES:
+                        self.save_state()
+                        self.unsaved = 0
+        if not self.stop.is_set() and start + seg[2] <= end:
+            raise IOError(f"Tramo incompleto: {start + seg[2]}-{end}")
+
+def download(url, dst, headers=None, proxy=None, segments=DOWNLOAD_SEGMENTS):
+    """Descarga url en dst por tramos. Devuelve False si el servidor no acepta rangos (no se ha escrito nada)"""
+    return Download(url, dst, headers, proxy, segments).run()
@@ -0,0 +1,44 @@
+import os
+import shutil
+
+from config import STORE_DIR, STORE_PER_PLAYLIST_TAGS
+from transcode import find_existing, output_path, remux
+
+# store.py
+# Almacén de pistas direccionado por id de vídeo: cada vídeo se descarga y convierte una sola vez
+# (downloads/.store/<id>.<ext>) y se enlaza en la carpeta de cada playlist que lo contiene.
+
+def stored_path(video_id):
+    """Fichero ya convertido de video_id en el almacén, o None"""
+    return find_existing(STORE_DIR, video_id)
+
+def link_into(src, dst):
+    """Hardlink de src en dst; si el sistema de ficheros no lo permite, symlink y, en último caso, copia"""
+    if os.path.exists(dst):
+        if os.path.samefile(src, dst):
+            return
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        try:
+            os.symlink(os.path.abspath(src), dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+def publish(stored, task, per_playlist_tags=STORE_PER_PLAYLIST_TAGS):
+    """Coloca la pista del almacén en la carpeta de la playlist de task. Devuelve la ruta final.
+
+    Los enlaces comparten los metadatos del fichero del almacén (los de la primera playlist).
+    Con per_playlist_tags se hace una copia con las etiquetas de cada playlist (su nombre como álbum si el export
+    no trae álbum) a cambio de más disco."""
+    artist, title, url, video_title, expected_duration, outdir, tags = task
+    os.makedirs(outdir, exist_ok=True)
+    dst = output_path(outdir, video_title, os.path.splitext(stored)[1])
+
+    if per_playlist_tags:
+        # Copia y etiquetas en una sola escritura, con la misma precedencia que transcode_task
+        remux(stored, dst, {'title': title, 'artist': artist, 'album': os.path.basename(outdir), **tags})
+    else:
+        link_into(stored, dst)
+    return dst
@@ -0,0 +1,68 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+# trackkey.py
+# Clave canónica de una canción, para reconocer como la misma canción variantes que la clave exacta
+# (make_key: artista y título en minúsculas) separa: "Song (feat. X)", "Song - Remastered 2011",
+# caracteres de ancho completo, acentos o los artistas en otro orden. La clave exacta sigue siendo la
+# de la caché y las playlists; la canónica se guarda a su lado y sirve para no volver a buscar (ni a
+# descargar: el vídeo es el mismo) lo que ya se resolvió con otra grafía.
+
+# Artistas invitados dentro del título: "(feat. X)", "[ft. X & Y]", "feat. X" al final
+FEAT_RE = re.compile(r'\s*[\(\[]\s*(?:feat|ft|featuring|with)\.?\s+([^\)\]]*)[\)\]]'
+                     r'|\s+(?:feat|ft|featuring)\.?\s+(.*)$')
+# Sufijos de edición que no cambian la canción (remix, live, acoustic... sí la cambian y se quedan)
+VERSION_TERMS = (r'(?:\d{4}\s+)?(?:digital(?:ly)?\s+)?remaster(?:ed)?(?:\s+(?:version|edition))?(?:\s+\d{4})?'
+                 r'|(?:single|album|original|stereo|mono)\s+version'
+                 r'|bonus\s+track|explicit|clean|deluxe(?:\s+edition)?')
+VERSION_RE = re.compile(rf'\s*-\s+(?:{VERSION_TERMS})\s*$|\s*[\(\[]\s*(?:{VERSION_TERMS})\s*[\)\]]')
+# Separadores entre artistas en 'Artist Name(s)'. En los invitados del título también "x", "and" e "y"
+# ("feat. A x B"); en los nombres no, que son parte de ellos ("Malcolm X", "Hall and Oates")
+ARTIST_SEP_RE = re.compile(r'\s*[,;&]\s*')
+GUEST_SEP_RE = re.compile(r'\s*(?:,|;|&|\bx\b|\band\b|\by\b)\s*')
+PUNCT_RE = re.compile(r'[^\w\s]')
+SPACE_RE = re.compile(r'\s+')
+
+@lru_cache(maxsize=65536)
+def fold(text):
+    """NFKC (ancho completo, ligaduras), minúsculas, sin acentos y con los espacios colapsados"""
+    text = text or ''
+    if text.isascii():
+        return SPACE_RE.sub(' ', text.lower()).strip()
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return SPACE_RE.sub(' ', text).strip()
+
+def _clean(text):
+    return SPACE_RE.sub(' ', PUNCT_RE.sub(' ', text)).strip()
+
+@lru_cache(maxsize=65536)
+def split_title(title):
+    """(título sin invitados ni sufijos de edición, invitados encontrados en el título)"""
+    title = fold(title)
+    guests = []
+    for match in FEAT_RE.finditer(title):
+        guests += [g for g in GUEST_SEP_RE.split(match.group(1) or match.group(2) or '') if g]
+    title = FEAT_RE.sub('', title)
+    # "Song (Remastered) - 2011 Remaster": se quitan de fuera hacia dentro hasta que no queda ninguno
+    while True:
+        stripped = VERSION_RE.sub('', title)
+        if stripped == title:
+            break
+        title = stripped
+    return _clean(title), tuple(guests)
+
+@lru_cache(maxsize=65536)
+def canonical_artists(artists):
+    """Artistas de 'Artist Name(s)' normalizados, sin repetidos y ordenados"""
+    return tuple(sorted({_clean(a) for a in ARTIST_SEP_RE.split(fold(artists)) if _clean(a)}))
+
+@lru_cache(maxsize=65536)
+def canonical_key(artists, title):
+    """Clave canónica de una canción. artists: 'Artist Name(s)' tal cual o el artista ya inferido.
+    Los invitados del título cuentan como artistas, así "A" + "Song (feat. B)" y "A, B" + "Song" coinciden"""
+    title, guests = split_title(title or '')
+    names = set(canonical_artists(artists or ''))
+    names.update(_clean(g) for g in guests if _clean(g))
+    return f"{', '.join(sorted(names))} - {title}"
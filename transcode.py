@@ -0,0 +1,95 @@
+import os
+import subprocess
+
+from yt_dlp.utils import sanitize_filename
+
+from metrics import span
+from config import FFMPEG_PATH, TRANSCODE_MODE, MP3_BITRATE
+
+# transcode.py
+# Etapa de CPU separada de la descarga: convierte el audio nativo descargado (opus/m4a) a mp3,
+# o en modo 'passthrough' lo deja en su códec original (solo cambia de contenedor si hace falta).
+# Los metadatos se escriben en la misma pasada de ffmpeg, sobre un fichero temporal que se renombra
+# al final: cada pista se escribe en disco una sola vez y nunca queda a medias con el nombre final.
+
+# Contenedor final para cada extensión nativa en modo passthrough
+PASSTHROUGH_EXT = {
+    '.webm': '.opus',  # opus dentro de webm -> ogg/opus (webm no lleva etiquetas de audio)
+    '.opus': '.opus',
+    '.ogg': '.ogg',
+    '.m4a': '.m4a',
+    '.mp4': '.m4a',
+    '.mp3': '.mp3',
+}
+
+def output_exts(mode=TRANSCODE_MODE):
+    return ['.mp3'] if mode == 'mp3' else sorted(set(PASSTHROUGH_EXT.values()))
+
+def output_path(outdir, video_title, ext):
+    """Ruta final de video_title en outdir. El nombre se sanea igual que el %(title)s de yt_dlp
+    ('AC/DC' -> 'AC⧸DC'): todo el que construya o busque una ruta final tiene que pasar por aquí"""
+    return os.path.join(outdir, f"{sanitize_filename(video_title)}{ext}")
+
+def find_existing(outdir, video_title, mode=TRANSCODE_MODE):
+    """Fichero final ya presente para video_title (cualquier extensión válida en este modo) o None"""
+    for ext in output_exts(mode):
+        path = output_path(outdir, video_title, ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+def run_ffmpeg(args):
+    subprocess.run([FFMPEG_PATH, '-y', '-v', 'error', *args], check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+def metadata_args(tags, ext):
+    """Opciones -metadata de ffmpeg para tags ({'title', 'artist', 'album', 'track', 'date', 'isrc'});
+    los campos vacíos se omiten"""
+    args = []
+    for key, value in tags.items():
+        if value in (None, ''):
+            continue
+        if key == 'isrc':
+            # ffmpeg no tiene nombre genérico para el ISRC: trama ID3 en mp3, comentario ISRC en ogg/opus
+            key = 'TSRC' if ext == '.mp3' else 'ISRC'
+        args += ['-metadata', f"{key}={value}"]
+    return args
+
+def staged(dst, args):
+    """Ejecuta ffmpeg escribiendo en un temporal junto a dst y lo renombra a dst al terminar"""
+    root, ext = os.path.splitext(dst)
+    tmp = f"{root}.part{ext}"  # ffmpeg deduce el contenedor de la extensión
+    try:
+        run_ffmpeg([*args, tmp])
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def encode_mp3(src, dst, tags):
+    staged(dst, ['-i', src, '-vn', '-codec:a', 'libmp3lame', '-b:a', MP3_BITRATE, '-ar', '44100', '-ac', '2',
+                 *metadata_args(tags, '.mp3')])
+
+def remux(src, dst, tags):
+    """Copia el audio sin recodificar (cambio de contenedor o solo etiquetas)"""
+    staged(dst, ['-i', src, '-vn', '-codec:a', 'copy', *metadata_args(tags, os.path.splitext(dst)[1].lower())])
+
+def finish(src, outdir, video_title, tags, mode=TRANSCODE_MODE):
+    """Convierte (o no) el fichero descargado src en {video_title}.<ext> dentro de outdir, etiquetado en la
+    misma pasada, y borra src. Devuelve la ruta final."""
+    ext = os.path.splitext(src)[1].lower()
+
+    with span('transcode', mode=mode):
+        if mode == 'passthrough' and ext in PASSTHROUGH_EXT:
+            dst = output_path(outdir, video_title, PASSTHROUGH_EXT[ext])
+            remux(src, dst, tags)
+        else:
+            dst = output_path(outdir, video_title, '.mp3')
+            if ext == '.mp3':
+                remux(src, dst, tags)
+            else:
+                encode_mp3(src, dst, tags)
+        # En el almacén src y dst pueden ser el mismo fichero (<id>.mp3): ya se ha sustituido por el etiquetado
+        if os.path.abspath(src) != os.path.abspath(dst):
+            os.remove(src)
+    return dst
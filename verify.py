@@ -0,0 +1,367 @@
+import os
+import json
+import sqlite3
+import hashlib
+import subprocess
+from time import time
+from concurrent.futures import ProcessPoolExecutor
+
+import mutagen
+from tqdm import tqdm
+
+from cache import video_id_from_link
+from download_v2 import group_by_video, library_tasks, pascal_to_title_case
+from metrics import incr, span
+from transcode import output_exts, output_path
+from workqueue import WorkQueue
+from config import (DOWNLOADS_DIR, DURATION_TOLERANCE, FFMPEG_PATH, INCOMING_DIR, MANIFEST_DB, QUEUE_LEASE_SECONDS, STORE_DIR,
+                    TRANSCODE_MODE, VERIFY_CONCURRENCY, VERIFY_REPAIR_PRIORITY, VERIFY_REPORT)
+
+# verify.py
+# Verificación de downloads/ contra la biblioteca resuelta (cli.py verify). Cada fichero esperado y cada
+# fichero del almacén se decodifica entero con ffmpeg en un pool de procesos (una vez por inodo: los
+# enlaces de varias playlists comparten resultado) y se comprueban su duración frente a la de Spotify y
+# las etiquetas title/artist/album. El resultado se guarda por (ruta, tamaño, mtime), así que una segunda
+# pasada solo abre lo que ha cambiado. Problemas:
+#   corrupt    ffmpeg da errores al decodificar, sale menos audio del que dice la cabecera (truncado)
+#              o no se puede leer la duración
+#   duration   más de DURATION_TOLERANCE segundos de diferencia con la duración esperada
+#   tags       sin title, artist o album
+#   missing    falta el fichero de una canción resuelta (p. ej. cambió su 'Video Title')
+#   renamed    missing, pero el audio está en la misma carpeta con otro nombre (enlace del almacén)
+#   orphan     fichero que no corresponde a ninguna canción resuelta
+#   duplicate  otro nombre para el mismo audio dentro de una playlist
+# Con --repair los ficheros malos se borran y sus vídeos se encolan, con prioridad, en la cola de
+# download_v2 (cli.py download solo baja eso); los renombrados se mueven a su nombre. --prune borra
+# huérfanos y duplicados.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verified (
+    path     TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    mtime    REAL NOT NULL,
+    error    TEXT,          -- errores de ffmpeg al decodificar; NULL si está bien
+    duration REAL,          -- la de la cabecera
+    decoded  REAL,          -- segundos de audio que salen al decodificarlo entero
+    title    TEXT,
+    artist   TEXT,
+    album    TEXT
+);
+"""
+FIELDS = ('error', 'duration', 'decoded', 'title', 'artist', 'album')
+REPAIRABLE = ('corrupt', 'duration', 'tags', 'missing')
+DIGEST_BYTES = 64 * 1024
+
+# --- Comprobación de un fichero (en los procesos del pool) ---
+
+def decode(path):
+    """Decodifica el audio entero sin escribir nada. Devuelve (errores de ffmpeg o None, segundos decodificados)"""
+    result = subprocess.run([FFMPEG_PATH, '-nostdin', '-v', 'error', '-progress', 'pipe:1', '-i', path, '-f', 'null', '-'],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors='replace')
+    # -progress escribe clave=valor; el último out_time_us es lo decodificado en total
+    times = [line[len('out_time_us='):] for line in result.stdout.splitlines() if line.startswith('out_time_us=')]
+    decoded = int(times[-1]) / 1e6 if times and times[-1].isdigit() else None
+    errors = result.stderr.strip()
+    if result.returncode or errors:
+        return errors[-500:] or f"ffmpeg terminó con código {result.returncode}", decoded
+    return None, decoded
+
+def read_header(path):
+    """(duración, title, artist, album) de la cabecera con mutagen"""
+    try:
+        audio = mutagen.File(path, easy=True)
+    except Exception:
+        audio = None
+    if audio is None:
+        return None, None, None, None
+    tags = audio.tags or {}
+    first = lambda key: (tags.get(key) or [None])[0]
+    length = audio.info.length if audio.info and audio.info.length else None
+    return length, first('title'), first('artist'), first('album')
+
+def check_file(path):
+    duration, title, artist, album = read_header(path)
+    error, decoded = decode(path)
+    return {'error': error, 'duration': duration, 'decoded': decoded, 'title': title, 'artist': artist, 'album': album}
+
+def digest(path):
+    """Tamaño y hash del principio y el final: suficiente para reconocer copias del mismo audio"""
+    size = os.path.getsize(path)
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        h.update(f.read(DIGEST_BYTES))
+        if size > DIGEST_BYTES:
+            f.seek(max(DIGEST_BYTES, size - DIGEST_BYTES))
+            h.update(f.read())
+    return size, h.hexdigest()
+
+# --- Caché de resultados ---
+
+class VerifyCache:
+    def __init__(self, path=MANIFEST_DB):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def load(self):
+        """{ruta: (size, mtime, {campo: valor})}"""
+        rows = self.conn.execute(f"SELECT path, size, mtime, {', '.join(FIELDS)} FROM verified")
+        return {row[0]: (row[1], row[2], dict(zip(FIELDS, row[3:]))) for row in rows}
+
+    def save(self, results):
+        """results: [(ruta, os.stat, {campo: valor})]"""
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO verified (path, size, mtime, {', '.join(FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(path, st.st_size, st.st_mtime, *(result[f] for f in FIELDS)) for path, st, result in results])
+
+    def forget(self, paths):
+        with self.conn:
+            self.conn.executemany("DELETE FROM verified WHERE path = ?", [(p,) for p in paths])
+
+# --- Recorrido ---
+
+def scan(directory):
+    """{ruta: os.stat} de los ficheros de directory (sin subcarpetas)"""
+    files = {}
+    if os.path.isdir(directory):
+        for entry in os.scandir(directory):
+            if entry.is_file(follow_symlinks=False) or entry.is_symlink():
+                try:
+                    files[entry.path] = os.stat(entry.path)
+                except OSError:
+                    files[entry.path] = None  # symlink roto
+    return files
+
+def in_flight(path, st):
+    """Temporal de una descarga o conversión que puede seguir en marcha"""
+    return '.part' in os.path.basename(path) and st is not None and time() - st.st_mtime < QUEUE_LEASE_SECONDS
+
+
+def inode(st):
+    return st.st_dev, st.st_ino
+
+def stem(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+def find_expected(files, outdir, video_title):
+    for ext in output_exts(TRANSCODE_MODE):
+        path = output_path(outdir, video_title, ext)
+        if path in files:
+            return path
+    return None
+
+def check_all(paths, stats, cached, workers):
+    """{ruta: resultado}: de la caché si el fichero no ha cambiado; si no, decodificando una ruta por inodo
+    en el pool. Devuelve también las rutas comprobadas de nuevo (para guardarlas)"""
+    by_inode = {}
+    for path in paths:
+        by_inode.setdefault(inode(stats[path]), []).append(path)
+
+    results, todo = {}, []
+    for same in by_inode.values():
+        hit = next((cached[p][2] for p in same if p in cached
+                    and cached[p][:2] == (stats[p].st_size, stats[p].st_mtime)), None)
+        if hit is None:
+            todo.append(same)
+        else:
+            incr('verify_cache_hit', len(same))
+            results.update((p, hit) for p in same)
+
+    if todo:
+        with span('verify_decode', files=len(todo)), ProcessPoolExecutor(max_workers=workers) as pool:
+            checked = pool.map(check_file, [same[0] for same in todo], chunksize=4)
+            for same, result in tqdm(zip(todo, checked), total=len(todo), desc="🔎 Decodificando"):
+                results.update((p, result) for p in same)
+    return results, [p for same in todo for p in same]
+
+def check_audio(results, owner, groups, issue):
+    """Problemas de los ficheros comprobados. owner: ruta -> video_id"""
+    for path, result in results.items():
+        video_id = owner[path]
+        durations = [t[4] for t in groups[video_id] if t[4]]
+        header, decoded = result['duration'], result['decoded']
+        if result['error'] or not header or not decoded:
+            issue('corrupt', path, video_id, result['error'] or "no se puede leer la duración")
+        elif header - decoded > DURATION_TOLERANCE:
+            # Cortado: la cabecera (Xing/Info) sigue diciendo la duración original
+            issue('corrupt', path, video_id, f"truncado: {decoded:.0f}s de {header:.0f}s")
+        elif durations and min(abs(decoded - d) for d in durations) > DURATION_TOLERANCE:
+            issue('duration', path, video_id, f"{decoded:.0f}s, se esperaban {durations[0]}s")
+        else:
+            absent = [field for field in ('title', 'artist', 'album') if not result[field]]
+            if absent:
+                issue('tags', path, video_id, "sin " + ", ".join(absent))
+
+def check_extras(outdir, files, expected, missing, store_ids, issue):
+    """Ficheros de outdir que no son los esperados: renombrados (el enlace del almacén de una canción que
+    falta en la carpeta), duplicados de un esperado (mismo inodo, o mismo tamaño y contenido) o huérfanos.
+    missing: {video_id: tarea} de lo que falta en outdir; se consumen los renombrados. Devuelve
+    [(ruta actual, ruta esperada, video_id)]"""
+    here = sorted(p for p in files if os.path.dirname(p) == outdir)
+    known = {inode(files[p]): p for p in here if p in expected and files[p] is not None}
+    sizes = {}
+    for p in known.values():
+        sizes.setdefault(files[p].st_size, []).append(p)
+    digests = {}
+
+    def same_audio(path):
+        st = files[path]
+        if inode(st) in known:
+            return known[inode(st)]
+        for other in sizes.get(st.st_size, []):
+            for p in (other, path):
+                if p not in digests:
+                    digests[p] = digest(p)
+            if digests[other] == digests[path]:
+                return other
+        return None
+
+    renamed = []
+    for path in here:
+        st = files[path]
+        if path in expected or (st is not None and in_flight(path, st)):
+            continue
+        if st is None:
+            issue('orphan', path, detail="enlace roto")
+            continue
+        video_id = store_ids.get(inode(st))
+        if video_id in missing:
+            task = missing.pop(video_id)
+            dst = output_path(outdir, task[3], os.path.splitext(path)[1])
+            renamed.append((path, dst, video_id))
+            issue('renamed', path, video_id, f"→ {os.path.basename(dst)}")
+            continue
+        same = same_audio(path)
+        if same:
+            issue('duplicate', path, video_id, f"= {os.path.basename(same)}")
+        else:
+            issue('orphan', path, video_id)
+            known[inode(st)] = path
+            sizes.setdefault(st.st_size, []).append(path)
+    return renamed
+
+def repair(issues, groups, renamed, stats):
+    """Borra los ficheros malos, mueve los renombrados y encola lo que falta en la cola de download_v2.
+    Devuelve las rutas borradas"""
+    # Un fichero malo enlazado desde el almacén lo es en todas partes: se borran todos los nombres de su
+    # inodo (incluido el del almacén), si no download_v2 volvería a enlazarlo
+    bad = {i['path'] for i in issues if i['kind'] in ('corrupt', 'duration', 'tags')}
+    bad_inodes = {inode(stats[p]) for p in bad if stats[p] is not None}
+    removed = [p for p, st in stats.items() if (st is None and p in bad) or (st is not None and inode(st) in bad_inodes)]
+    for path in removed:
+        os.remove(path)
+
+    video_ids = {i['video_id'] for i in issues if i['kind'] in REPAIRABLE and i['video_id'] in groups}
+    moved = 0
+    for src, dst, video_id in renamed:
+        if src in removed:
+            video_ids.add(video_id)
+        else:
+            os.replace(src, dst)
+            moved += 1
+
+    video_ids = sorted(video_ids)
+    wq = WorkQueue()
+    wq.requeue([(video_id, groups[video_id], VERIFY_REPAIR_PRIORITY + len(groups[video_id])) for video_id in video_ids])
+    wq.close()
+    print(f"🔧 {moved} renombrados, {len(removed)} ficheros borrados y {len(video_ids)} vídeos en la cola "
+          f"de descargas (cli.py download)")
+    return removed
+
+def verify(playlist=None, repair_files=False, prune=False, workers=VERIFY_CONCURRENCY, report=VERIFY_REPORT):
+    """Verifica downloads/ (o la carpeta de una playlist) contra la biblioteca resuelta. Devuelve
+    {tipo de problema: número}"""
+    tasks = library_tasks()
+    if playlist:
+        outdir = os.path.join(DOWNLOADS_DIR, pascal_to_title_case(playlist))
+        tasks = [t for t in tasks if t[5] == outdir]
+    groups = {video_id_from_link(group[0][2]): group for group in group_by_video(tasks)}
+
+    # Carpetas de las playlists resueltas y, sin --playlist, cualquier otra de downloads/
+    outdirs = {t[5] for t in tasks}
+    if not playlist and os.path.isdir(DOWNLOADS_DIR):
+        outdirs.update(e.path for e in os.scandir(DOWNLOADS_DIR)
+                       if e.is_dir() and os.path.abspath(e.path) != os.path.abspath(STORE_DIR))
+    files = {}
+    for outdir in outdirs:
+        files.update(scan(outdir))
+    store = scan(STORE_DIR)
+    stats = {**files, **store}
+
+    issues = []
+    def issue(kind, path, video_id=None, detail=''):
+        issues.append({'kind': kind, 'path': path, 'video_id': video_id, 'detail': detail})
+
+    # Qué fichero corresponde a cada canción; en el almacén, solo los vídeos resueltos
+    owner, missing = {}, {}
+    for video_id, group in groups.items():
+        for task in group:
+            path = find_expected(files, task[5], task[3])
+            if path is None:
+                missing.setdefault(task[5], {})[video_id] = task
+            else:
+                owner[path] = video_id
+    expected = set(owner)
+    for path, st in store.items():
+        if stem(path) in groups and not in_flight(path, st):
+            owner[path] = stem(path)
+    for path in [p for p in owner if stats[p] is None]:
+        issue('corrupt', path, owner.pop(path), "enlace roto")
+
+    cache = VerifyCache()
+    cached = cache.load()
+    results, checked = check_all(list(owner), stats, cached, workers)
+    cache.save([(p, stats[p], results[p]) for p in checked])
+    if not playlist:
+        cache.forget(set(cached) - set(stats))
+    check_audio(results, owner, groups, issue)
+
+    store_ids = {inode(st): stem(p) for p, st in store.items() if st is not None}
+    renamed = []
+    for outdir in sorted(outdirs):
+        renamed += check_extras(outdir, files, expected, missing.get(outdir, {}), store_ids, issue)
+    for outdir, tasks_missing in missing.items():
+        for video_id, task in tasks_missing.items():
+            issue('missing', output_path(outdir, task[3], ''), video_id)
+    if not playlist:
+        for path, st in store.items():
+            if path not in owner and st is not None and not in_flight(path, st):
+                issue('orphan', path, stem(path))
+        # Descargas en bruto que ninguna conversión llegó a recoger (p. ej. de una ejecución interrumpida)
+        for path, st in scan(INCOMING_DIR).items():
+            if st is None or time() - st.st_mtime >= QUEUE_LEASE_SECONDS:
+                issue('orphan', path, stem(path))
+
+    counts = {}
+    for i in issues:
+        counts[i['kind']] = counts.get(i['kind'], 0) + 1
+    os.makedirs(os.path.dirname(report) or '.', exist_ok=True)
+    with open(report, 'w', encoding='utf-8') as f:
+        for i in issues:
+            f.write(json.dumps(i, ensure_ascii=False) + '\n')
+
+    print(f"🔎 {len(results)} ficheros de audio: {len(checked)} decodificados, {len(results) - len(checked)} sin cambios")
+    print(" | ".join(f"{kind}: {counts.get(kind, 0)}" for kind in
+                     ('corrupt', 'duration', 'tags', 'missing', 'renamed', 'orphan', 'duplicate')))
+    if issues:
+        print(f"📝 Detalle en {report}")
+
+    removed = set()
+    if repair_files:
+        removed = set(repair(issues, groups, renamed, stats))
+        cache.forget(removed)
+    if prune:
+        # repair ya ha borrado todos los nombres de un inodo malo, y alguno puede ser un huérfano o duplicado
+        pruned = [i['path'] for i in issues if i['kind'] in ('orphan', 'duplicate') and i['path'] not in removed]
+        for path in pruned:
+            os.remove(path)
+        cache.forget(pruned)
+        print(f"🧹 {len(pruned)} ficheros huérfanos o duplicados borrados")
+    cache.close()
+    return counts
@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+from threading import Event, Thread
+
+from config import QUEUE_DB, QUEUE_LEASE_SECONDS, QUEUE_MAX_ATTEMPTS
+
+# workqueue.py
+# Cola de trabajo persistente (SQLite) para download_v2. Cada tarea se reparte con un lease a nombre del
+# proceso que la tiene (host:pid). Mientras ese proceso vive, keepalive() renueva sus leases, por larga que
+# sea la descarga o la espera en la cola de conversión; el transcoder que la recoge la pasa a su nombre
+# con claim(). Si el dueño muere, su lease se libera en cuanto se ve que el proceso ya no existe (o, en
+# otro host, cuando caduca) y otro worker la recoge. Las tareas terminadas quedan marcadas como 'done',
+# así que una ejecución interrumpida continúa donde se quedó sin volver a comprobar lo ya hecho.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    key         TEXT NOT NULL UNIQUE,
+    payload     TEXT NOT NULL,
+    priority    INTEGER NOT NULL DEFAULT 0,
+    state       TEXT NOT NULL DEFAULT 'pending',  -- pending | leased | done | failed
+    lease_until REAL,
+    owner       TEXT,                             -- host:pid del proceso con el lease
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    error       TEXT,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_next ON tasks (state, priority DESC, id);
+"""
+
+STOP = None  # lo que devuelve get() cuando ya no queda trabajo
+HOST = socket.gethostname()
+
+def owner_alive(owner):
+    """False si owner (host:pid) es un proceso de este host que ya no existe. En otro host, o en Windows
+    (donde os.kill no sirve para comprobarlo), no se sabe: True y se espera a que caduque el lease"""
+    if not owner:
+        return False  # lease de una versión sin dueño
+    host, _, pid = owner.rpartition(':')
+    if host != HOST or os.name == 'nt':
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        return True
+    return True
+
+class WorkQueue:
+    def __init__(self, path=QUEUE_DB, lease_seconds=QUEUE_LEASE_SECONDS, max_attempts=QUEUE_MAX_ATTEMPTS):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # isolation_level=None: las transacciones se abren a mano con BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        if 'owner' not in {row[1] for row in self.conn.execute("PRAGMA table_info(tasks)")}:
+            self.conn.execute("ALTER TABLE tasks ADD COLUMN owner TEXT")
+        self.path = path
+        self.owner = f"{HOST}:{os.getpid()}"
+        self.heartbeat = None
+
+    def close(self):
+        if self.heartbeat:
+            self.heartbeat.set()
+        self.conn.close()
+
+    def keepalive(self):
+        """Renueva en segundo plano, cada tercio del lease, los leases de este proceso hasta close()"""
+        self.heartbeat = Event()
+        Thread(target=self._renew_loop, args=(self.heartbeat,), daemon=True, name='workqueue').start()
+
+    def _renew_loop(self, stop):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)  # conexión propia del hilo
+        while not stop.wait(self.lease_seconds / 3):
+            conn.execute("UPDATE tasks SET lease_until = ? WHERE state = 'leased' AND owner = ?",
+                         (time.time() + self.lease_seconds, self.owner))
+        conn.close()
+
+    def put_many(self, items):
+        """Encola [(key, payload, priority)]. Una tarea ya terminada con el mismo payload no se repite;
+        si el payload ha cambiado (p. ej. el vídeo aparece en una playlist nueva) vuelve a pendiente."""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for key, payload, priority in items:
+                self.conn.execute("""
+                    INSERT INTO tasks (key, payload, priority, updated_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        payload = excluded.payload, priority = excluded.priority,
+                        state = 'pending', attempts = 0, error = NULL, updated_at = excluded.updated_at
+                    WHERE tasks.payload != excluded.payload
+                """, (key, json.dumps(payload, ensure_ascii=False), priority, now))
+            self.conn.execute("COMMIT")
+        except:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def requeue(self, items):
+        """Encola [(key, payload, priority)] como pendientes aunque ya estuvieran hechas (reparaciones de
+        verify.py: el fichero de una tarea terminada resultó estar mal)"""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for key, payload, priority in items:
+                self.conn.execute("""
+                    INSERT INTO tasks (key, payload, priority, updated_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        payload = excluded.payload, priority = excluded.priority, state = 'pending',
+                        lease_until = NULL, attempts = 0, error = NULL, updated_at = excluded.updated_at
+                """, (key, json.dumps(payload, ensure_ascii=False), priority, now))
+            self.conn.execute("COMMIT")
+        except:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def get(self, poll=1.0):
+        """Reserva la siguiente tarea (mayor prioridad primero). Devuelve (id, payload) o STOP cuando no
+        queda nada pendiente ni reservado. Si solo quedan tareas reservadas por otros, espera por si caducan."""
+        while True:
+            now = time.time()
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("""
+                    SELECT id, payload FROM tasks
+                    WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?)
+                    ORDER BY priority DESC, id LIMIT 1
+                """, (now,)).fetchone()
+                if row:
+                    self.conn.execute(
+                        "UPDATE tasks SET state = 'leased', lease_until = ?, owner = ?, updated_at = ? WHERE id = ?",
+                        (now + self.lease_seconds, self.owner, now, row[0])
+                    )
+                    self.conn.execute("COMMIT")
+                    return row[0], json.loads(row[1])
+                leased = self.conn.execute("SELECT COUNT(*) FROM tasks WHERE state = 'leased'").fetchone()[0]
+                self.conn.execute("COMMIT")
+            except:
+                self.conn.execute("ROLLBACK")
+                raise
+
+            if not leased:
+                return STOP
+            # Las que quedan pueden ser de un worker que ha muerto: se liberan sin esperar a que caduquen
+            if not self.release_leases():
+                time.sleep(poll)
+
+    def claim(self, task_id):
+        """Pasa el lease de task_id a este proceso (el transcoder que recoge una descarga)"""
+        self.conn.execute("UPDATE tasks SET lease_until = ?, owner = ? WHERE id = ? AND state = 'leased'",
+                          (time.time() + self.lease_seconds, self.owner, task_id))
+
+    def done(self, task_id):
+        self.conn.execute("UPDATE tasks SET state = 'done', lease_until = NULL, updated_at = ? WHERE id = ?",
+                          (time.time(), task_id))
+
+    def fail(self, task_id, error):
+        """Devuelve la tarea a pendiente, o la marca como fallida tras max_attempts intentos"""
+        self.conn.execute("""
+            UPDATE tasks SET attempts = attempts + 1, error = ?, lease_until = NULL, updated_at = ?,
+                state = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END
+            WHERE id = ?
+        """, (str(error), time.time(), self.max_attempts, task_id))
+
+    def counts(self):
+        rows = self.conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall()
+        return dict(rows)
+
+    def retry_failed(self):
+        self.conn.execute("UPDATE tasks SET state = 'pending', attempts = 0 WHERE state = 'failed'")
+
+    def release_leases(self):
+        """Devuelve a pendientes las tareas con el lease caducado o cuyo dueño ya no existe (una ejecución o
+        un worker que murió). Los leases de procesos vivos, de esta u otra ejecución, no se tocan.
+        Devuelve cuántas se liberan"""
+        owners = [row[0] for row in self.conn.execute("SELECT DISTINCT owner FROM tasks WHERE state = 'leased'")]
+        dead = [owner for owner in owners if not owner_alive(owner)]
+        released = self.conn.execute(
+            "UPDATE tasks SET state = 'pending', lease_until = NULL, owner = NULL WHERE state = 'leased' AND lease_until < ?",
+            (time.time(),)).rowcount
+        for owner in dead:
+            released += self.conn.execute(
+                "UPDATE tasks SET state = 'pending', lease_until = NULL, owner = NULL WHERE state = 'leased' AND owner IS ?",
+                (owner,)).rowcount
+        return released
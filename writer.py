@@ -0,0 +1,118 @@
+import os
+import io
+import csv
+from threading import Thread, Event, Lock
+
+from metrics import span
+from config import WRITE_DURABILITY, WRITE_BATCH_ROWS, WRITE_INTERVAL_MS
+
+# writer.py
+# Escritor de CSV de resultados con commit agrupado. Las filas se acumulan en memoria y se
+# escriben de golpe (una sola write + fsync por lote), de modo que un corte pierde como mucho
+# el último lote y nunca deja una fila a medias en el CSV. on_flush recibe las etiquetas de las filas
+# ya en disco: finder las marca entonces como escritas en la caché, así lo perdido se vuelve a escribir.
+
+# Modos de durabilidad:
+#   'row'      -> fsync tras cada fila (comportamiento original)
+#   'batch'    -> fsync cada WRITE_BATCH_ROWS filas
+#   'interval' -> fsync cada WRITE_INTERVAL_MS milisegundos desde un hilo en segundo plano
+#   'shutdown' -> solo al cerrar
+DURABILITY_MODES = ('row', 'batch', 'interval', 'shutdown')
+
+RESULT_HEADER = ['Artist', 'Title', 'YouTube Link', 'Video Title', 'Uploader', 'Duration (s)']
+
+def repair_torn_tail(path):
+    """Si el fichero acaba en una línea incompleta (corte a mitad de escritura), la descarta"""
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+    with open(path, 'rb+') as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) == b'\n':
+            return
+        # Buscar el último salto de línea hacia atrás, por bloques
+        pos = size
+        while pos > 0:
+            step = min(4096, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step)
+            nl = chunk.rfind(b'\n')
+            if nl != -1:
+                f.truncate(pos + nl + 1)
+                return
+        f.truncate(0)
+
+class ResultWriter:
+    def __init__(self, path, header=RESULT_HEADER, mode=WRITE_DURABILITY,
+                 batch_rows=WRITE_BATCH_ROWS, interval_ms=WRITE_INTERVAL_MS, on_flush=None):
+        if mode not in DURABILITY_MODES:
+            raise ValueError(f"Modo de durabilidad desconocido: {mode}")
+
+        self.path = path
+        self.mode = mode
+        self.batch_rows = batch_rows if mode == 'batch' else 1
+        self.buffer = []
+        self.tags = []
+        self.on_flush = on_flush
+        self.lock = Lock()
+
+        if os.path.exists(path):
+            repair_torn_tail(path)
+        self.f = open(path, mode='a', newline='', encoding='utf-8')
+
+        # Escribir cabecera solo si el archivo está vacío
+        if os.stat(path).st_size == 0:
+            self.buffer.append(header)
+            self._flush_locked()
+
+        self.stop = Event()
+        self.flusher = None
+        if mode == 'interval':
+            self.flusher = Thread(target=self._flush_loop, args=(interval_ms / 1000,), daemon=True)
+            self.flusher.start()
+
+    def writerow(self, row, tag=None):
+        """tag: lo que se pasa a on_flush cuando la fila llega al disco"""
+        with self.lock:
+            self.buffer.append(row)
+            if tag is not None:
+                self.tags.append(tag)
+            if self.mode in ('row', 'batch') and len(self.buffer) >= self.batch_rows:
+                self._flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def close(self):
+        if self.flusher:
+            self.stop.set()
+            self.flusher.join()
+        with self.lock:
+            self._flush_locked()
+            self.f.close()
+
+    def _flush_loop(self, interval):
+        while not self.stop.wait(interval):
+            self.flush()
+
+    def _flush_locked(self):
+        if not self.buffer:
+            return
+        with span('csv_write'):
+            out = io.StringIO()
+            csv.writer(out).writerows(self.buffer)
+            self.f.write(out.getvalue())
+            self.f.flush()
+            os.fsync(self.f.fileno())
+        self.buffer.clear()
+        tags, self.tags = self.tags, []
+        if self.on_flush and tags:
+            self.on_flush(tags)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()